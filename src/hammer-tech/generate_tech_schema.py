@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  generate_tech_schema.py
+#
+#  Helper script to generate the tech JSON classes in tech_schema.py from schema.json.
+#
+#  See LICENSE for licence details.
+
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, Tuple
+
+# Base class (in schema_object.py) of generated classes which need more than the schema properties.
+BASE_CLASSES = {
+    "Library": "LibraryBase"
+}  # type: Dict[str, str]
+
+HEADER = """#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tech_schema.py
+#  Classes for the hammer technology JSON.
+#  Generated from schema.json by generate_tech_schema.py - do not edit by hand.
+#
+#  See LICENSE for licence details.
+
+from typing import List, Optional
+
+from schema_object import SchemaObject, SchemaProperty, LibraryBase, properties_by_key
+"""
+
+# Python types of the JSON schema types.
+PYTHON_TYPES = {
+    "string": "str",
+    "number": "float",
+    "integer": "int",
+    "boolean": "bool"
+}  # type: Dict[str, str]
+
+
+def get_full_filename(filename: str) -> str:
+    return os.path.join(os.path.dirname(__file__), filename)
+
+
+def attr_name(key: str) -> str:
+    """
+    Get the python attribute name of a JSON key (e.g. "lef file" -> "lef_file").
+    """
+    name = key.replace(" ", "_")
+    if not name.isidentifier():
+        raise ValueError("Cannot make an attribute name for property '{key}'".format(key=key))
+    return name
+
+
+def collect_classes(schema: Dict[str, Any], classes: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """
+    Collect the object schemas in schema, dependencies first.
+    Schemas with the same title (e.g. MinMaxCap) must be identical and produce one class.
+    """
+    if schema.get("type") == "array":
+        collect_classes(schema["items"], classes)
+        return
+    if schema.get("type") != "object":
+        return
+    for prop in schema.get("properties", {}).values():
+        collect_classes(prop, classes)
+    title = schema["title"]
+    for existing_title, existing in classes:
+        if existing_title == title:
+            if existing != schema:
+                raise ValueError("Different object schemas are titled {title}".format(title=title))
+            return
+    classes.append((title, schema))
+
+
+def python_type(schema: Dict[str, Any]) -> str:
+    if schema["type"] == "object":
+        return '"{title}"'.format(title=schema["title"])
+    elif schema["type"] == "array":
+        return "List[{t}]".format(t=python_type(schema["items"]))
+    else:
+        return PYTHON_TYPES[schema["type"]]
+
+
+def generate_class(title: str, schema: Dict[str, Any]) -> str:
+    properties = schema.get("properties", {})  # type: Dict[str, Dict[str, Any]]
+    attrs = list(map(attr_name, properties.keys()))
+
+    lines = [
+        "",
+        "",
+        "class {title}({base}):".format(title=title, base=BASE_CLASSES.get(title, "SchemaObject")),
+        '    """{title} in the technology JSON."""'.format(title=title),
+        "    __slots__ = ({slots})".format(slots=", ".join("'{a}'".format(a=a) for a in attrs) + ("," if len(attrs) == 1 else ""))
+    ]
+
+    lines.append("")
+    lines.append("    _properties = (")
+    for key, prop in properties.items():
+        items = None
+        cls = None
+        if prop["type"] == "object":
+            cls = prop["title"]
+        elif prop["type"] == "array":
+            items = '"{t}"'.format(t=prop["items"]["type"])
+            if prop["items"]["type"] == "object":
+                cls = prop["items"]["title"]
+        lines.append('        SchemaProperty(attr="{attr}", key="{key}", type="{t}", items={items}, cls={cls}),'.format(
+            attr=attr_name(key), key=key, t=prop["type"], items=items, cls=cls))
+    lines.append("    )")
+    lines.append("    _by_key = properties_by_key(_properties)")
+    if schema.get("additionalProperties", True) is False:
+        lines.append("    _additional_properties = False")
+
+    lines.append("")
+    if len(attrs) == 0:
+        lines.append("    def __init__(self) -> None:")
+    else:
+        lines.append("    def __init__(self, *,")
+        for i, (key, prop) in enumerate(properties.items()):
+            end = ") -> None:" if i == len(properties) - 1 else ","
+            lines.append("                 {attr}: Optional[{t}] = None{end}".format(attr=attr_name(key), t=python_type(prop), end=end))
+    lines.append("        super().__init__()")
+    for key, prop in properties.items():
+        lines.append("        self.{attr} = {attr}  # type: Optional[{t}]".format(attr=attr_name(key), t=python_type(prop)))
+    return "\n".join(lines) + "\n"
+
+
+def generate(schema: Dict[str, Any]) -> str:
+    classes = []  # type: List[Tuple[str, Dict[str, Any]]]
+    collect_classes(schema, classes)
+    return HEADER + "".join(generate_class(title, s) for title, s in classes)
+
+
+def main(args) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-d', "--dry_run", action="store_true", required=False,
+                        help="Print the generated code instead of writing tech_schema.py.")
+    parsed_args = parser.parse_args(args[1:])
+
+    with open(get_full_filename("schema.json")) as f:
+        schema = json.load(f)
+    code = generate(schema)
+
+    if parsed_args.dry_run:
+        print(code, end="")
+    else:
+        with open(get_full_filename("tech_schema.py"), "w") as f:
+            f.write(code)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
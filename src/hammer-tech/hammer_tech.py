@@ -8,35 +8,32 @@
 
 import json
 import os
-import subprocess
 from abc import ABCMeta, abstractmethod
-from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Tuple, Dict
+from typing import Any, Callable, Hashable, Iterable, List, NamedTuple, Optional, Set, Tuple, Dict
 from decimal import Decimal
 
 import hammer_config
-import python_jsonschema_objects  # type: ignore
+import tech_schema
 
 from hammer_config import load_yaml
-from hammer_logging import HammerVLSILoggingContext
-from hammer_utils import (LEFUtils, add_lists, deeplist, get_or_else,
+from hammer_logging import HammerTrace, HammerVLSILoggingContext
+from hammer_utils import (LEFSizeCache, LEFUtils, add_lists, deeplist, get_or_else,
                           in_place_unique, optional_map, reduce_list_str,
                           reduce_named, coerce_to_grid)
 
-from library_filter import LibraryFilter
+from library_filter import LibraryFilter, LibraryIndexKey, get_library_index_key, indexed_library_filter
 from filters import LibraryFilterHolder
 from stackup import RoutingDirection, WidthSpacingTuple, Metal, Stackup
+from tarballs import TarballExtraction, extract_tarballs
 
 # Holds the list of pre-implemented filters.
 # Access it like hammer_tech.filters.lef_filter
 filters = LibraryFilterHolder()
 
-builder = python_jsonschema_objects.ObjectBuilder(json.loads(open(os.path.dirname(__file__) + "/schema.json").read()))
-ns = builder.build_classes()
-
-# Pull definitions from the autoconstructed classes.
-TechJSON = ns.Techjson
+# Pull definitions from the classes generated from schema.json (see generate_tech_schema.py).
+TechJSON = tech_schema.TechJSON
 # Semiconductor IP library
-Library = ns.Library
+Library = tech_schema.Library
 
 
 class LibraryPrefix(metaclass=ABCMeta):
@@ -121,49 +118,9 @@ class PathPrefix(LibraryPrefix):
         return os.path.join(self.path, rest_of_path)
 
 
-def _add_extra_prefixes() -> None:
-    # Add extra_prefixes to Library.
-    # Monkey-patch over the autogenerated classes for now.
-    # See https://github.com/ucb-bar/hammer/issues/165
-    # https://stackoverflow.com/a/36158137
-
-    # Define getters and setters
-    def get_extra_prefixes(self: Library) -> List[LibraryPrefix]:
-        internal_list = getattr(self, "__donttouch_extra_prefixes", [])
-        assert isinstance(internal_list, list)
-        return deeplist(internal_list)
-
-    def set_extra_prefixes(self: Library, value: List[LibraryPrefix]) -> None:
-        assert isinstance(value, list)
-        setattr(self, "__donttouch_extra_prefixes", deeplist(value))
-
-    # Set them in the class
-    setattr(Library, 'extra_prefixes', property(get_extra_prefixes, set_extra_prefixes))
-
-    # Autogenerated classes override __setattr__ which prevents the setter above
-    # from working, so we need to special case setattr...
-    # Yes, this is incredibly ugly, and will be replaced when autogenerated classes are gone.
-
-    # Keep a reference to the old __setattr__ (which we will be wrapping)
-    __old_setattr = Library.__setattr__
-
-    # Define a new __setattr__ that calls our setter if users try to set our new property.
-    def __new_setattr(self: Library, name: str, value: Any) -> None:
-        if name == "extra_prefixes":
-            set_extra_prefixes(self, value)
-        else:
-            __old_setattr(self, name, value)
-
-    setattr(Library, "__setattr__", __new_setattr)
-
-
-_add_extra_prefixes()
-
-
-# TODO(edwardw): deprecate these functions once Library is no longer auto-generated.
 def copy_library(lib: Library) -> Library:
     """Perform a deep copy of a Library."""
-    return Library.from_json(lib.serialize())
+    return lib.copy()
 
 
 def library_from_json(json: str) -> Library:
@@ -183,7 +140,10 @@ class ExtraLibrary(NamedTuple('ExtraLibrary', [
     __slots__ = ()
 
     def to_setting(self) -> dict:
-        raise NotImplementedError("No clean implementation for JSON export of library yet")
+        output = {"library": self.library.to_dict()}  # type: Dict[str, Any]
+        if self.prefix is not None:
+            output["prefix"] = self.prefix.to_setting()
+        return output
 
     @staticmethod
     def from_setting(d: dict) -> "ExtraLibrary":
@@ -264,6 +224,103 @@ class MacroSize(NamedTuple('MacroSize', [
         )
 
 
+class LibraryIndex:
+    """
+    Index of all available IP libraries of a technology, built once per
+    version of the settings database (see HammerTechnology.library_index).
+
+    Libraries are parsed once and bucketed on demand for indexed filter
+    functions (see indexed_library_filter), e.g. by MMMC corner. Prefixed
+    paths and existence checks are memoized, so repeated library filter
+    queries (e.g. once per MMMC corner) do not redo any of that work.
+    """
+
+    def __init__(self, libraries: List[Library], supplies_filter: Callable[[Library], bool]) -> None:
+        """
+        Build a new index.
+
+        :param libraries: All available libraries, in order.
+        :param supplies_filter: Function which selects libraries matching the supplies of this run
+                                (HammerTechnology.filter_for_supplies).
+        """
+        self.libraries = libraries  # type: List[Library]
+        self._supplies_filter = supplies_filter  # type: Callable[[Library], bool]
+        self._supplies_matching = None  # type: Optional[List[Library]]
+        self._supplies_matching_ids = None  # type: Optional[Set[int]]
+
+        # Libraries bucketed by the key function of each LibraryIndexKey name, in order.
+        self._buckets = {}  # type: Dict[str, Dict[Hashable, List[Library]]]
+
+        self._prepended_paths = {}  # type: Dict[Tuple[int, str], str]
+        self._existing_files = set()  # type: Set[str]
+        self._existing_dirs = set()  # type: Set[str]
+
+    @property
+    def supplies_matching(self) -> List[Library]:
+        """Get the libraries which pass the default supplies pre-filter."""
+        if self._supplies_matching is None:
+            self._supplies_matching = list(filter(self._supplies_filter, self.libraries))
+        return self._supplies_matching
+
+    def matches_supplies(self, lib: Library) -> bool:
+        """Check if the given library of this index passes the default supplies pre-filter."""
+        if self._supplies_matching_ids is None:
+            self._supplies_matching_ids = set(map(id, self.supplies_matching))
+        return id(lib) in self._supplies_matching_ids
+
+    def lookup(self, key: LibraryIndexKey) -> List[Library]:
+        """
+        Get the libraries selected by an indexed filter function (see indexed_library_filter), in order.
+        The libraries are bucketed the first time a bucketing is used.
+
+        :param key: Index key of the filter function.
+        :return: Libraries for which key.key_func returns key.value.
+        """
+        buckets = self._buckets.get(key.name)
+        if buckets is None:
+            buckets = {}
+            for lib in self.libraries:
+                buckets.setdefault(key.key_func(lib), []).append(lib)
+            self._buckets[key.name] = buckets
+        return buckets.get(key.value, [])
+
+    def prepend_dir_path(self, tech: "HammerTechnology", path: str, lib: Library) -> str:
+        """
+        Memoized version of HammerTechnology.prepend_dir_path for the libraries in this index.
+
+        :param tech: Technology which built this index.
+        :param path: Path to which we should prepend
+        :param lib: Library in this index which produced this path.
+        :return: Prepended path.
+        """
+        # The index holds on to its libraries, so their ids are stable.
+        key = (id(lib), path)
+        prepended = self._prepended_paths.get(key)
+        if prepended is None:
+            prepended = tech.prepend_dir_path(path, lib)
+            self._prepended_paths[key] = prepended
+        return prepended
+
+    def check_path(self, path: str, is_file: bool, description: str) -> str:
+        """
+        Memoized existence check of the given path.
+        Only paths which exist are remembered, so a missing path is checked again next time.
+
+        :param path: Path to check.
+        :param is_file: True to check for a file, False to check for a directory.
+        :param description: Description of the path for the error message.
+        :return: The path, or ValueError if it does not exist.
+        """
+        existing = self._existing_files if is_file else self._existing_dirs
+        if path not in existing:
+            if is_file:
+                HammerTechnology.make_check_isfile(description)(path)
+            else:
+                HammerTechnology.make_check_isdir(description)(path)
+            existing.add(path)
+        return path
+
+
 class HammerTechnology:
     # Properties.
     @property
@@ -284,6 +341,8 @@ class HammerTechnology:
         self._cachedir = value  # type: str
         # Ensure the cache_dir exists.
         os.makedirs(value, exist_ok=True)
+        # Prefixed paths may point into the cache dir.
+        self._library_index = None
 
     # hammer-vlsi properties.
     # TODO: deduplicate/put these into an interface to share with HammerTool?
@@ -312,6 +371,12 @@ class HammerTechnology:
         # Configuration
         self.config = None  # type: TechJSON
 
+        # Library index and the (config, database version) it was built for.
+        self._library_index = None  # type: Optional[Tuple[Tuple[int, int], LibraryIndex]]
+
+        # Tracer which records the settings read by the tool step currently running, if any.
+        self.setting_tracer = None  # type: Optional[hammer_config.SettingAccessTracer]
+
     @classmethod
     def load_from_dir(cls, technology_name: str, path: str) -> Optional["HammerTechnology"]:
         """Load a technology from a given folder.
@@ -341,7 +406,18 @@ class HammerTechnology:
         :param json_str: JSON string to use as the technology JSON
         :param path: Path to set as the technology folder (e.g. foo/bar/technology/saed32)
         """
+        return HammerTechnology.load_from_dict(technology_name, json.loads(json_str), path)
+
+    @classmethod
+    def load_from_dict(cls, technology_name: str, config: dict, path: str, validate: bool = True) -> "HammerTechnology":
+        """Load a technology from an already parsed technology JSON/YAML.
 
+        :param technology_name: Technology name (e.g. "saed32")
+        :param config: Technology JSON/YAML contents
+        :param path: Path to set as the technology folder (e.g. foo/bar/technology/saed32)
+        :param validate: Check the config against the schema. Only skip this for configs which were already checked
+                         (e.g. from a snapshot of a loaded technology).
+        """
         tech = HammerTechnology()
 
         # Name of the technology
@@ -351,7 +427,7 @@ class HammerTechnology:
         tech.path = path
 
         # Configuration
-        tech.config = TechJSON.from_json(json_str)
+        tech.config = TechJSON.from_dict(config, validate)
 
         return tech
 
@@ -363,11 +439,12 @@ class HammerTechnology:
         :param yaml_str: yaml string to use as the technology yaml
         :param path: Path to set as the technology folder (e.g. foo/bar/technology/saed32)
         """
-        return HammerTechnology.load_from_json(technology_name, json.dumps(load_yaml(yaml_str)), path)
+        return HammerTechnology.load_from_dict(technology_name, load_yaml(yaml_str), path)
 
     def set_database(self, database: hammer_config.HammerDatabase) -> None:
         """Set the settings database for use by the tool."""
         self._database = database  # type: hammer_config.HammerDatabase
+        self._library_index = None
 
     def is_database_set(self) -> bool:
         """Return True if the settings database has been set for use by the tool."""
@@ -377,15 +454,25 @@ class HammerTechnology:
         """Get a particular setting from the database.
         """
         try:
-            return self._database.get(key)
+            value = self._database.get(key)
         except AttributeError:
             raise ValueError("Internal error: no database set by hammer-vlsi")
+        if self.setting_tracer is not None:
+            self.setting_tracer.record_get(key, value)
+        return value
 
     def has_setting(self, key: str) -> bool:
         """Check if a setting exists in the database.
         """
+        if self.setting_tracer is not None:
+            self.setting_tracer.record_has(self._database, key)
         return self._database.has_setting(key)
 
+    def _get_optional_setting(self, key: str) -> Any:
+        """Get a setting which might not exist in the database (e.g. without the hammer-vlsi defaults), or None.
+        """
+        return self.get_setting(key) if self.has_setting(key) else None
+
     def get_config(self) -> List[dict]:
         """Get the hammer configuration for this technology. Not to be confused with the ".tech.json" which self.config refers to."""
         return hammer_config.load_config_from_defaults(self.path)
@@ -400,9 +487,7 @@ class HammerTechnology:
         if dont_use_list_raw is None:
             return None
         else:
-            # Work around the weird objects implemented by the jsonschema generator.
-            dont_use_list = list(map(lambda x: str(x), list(dont_use_list_raw)))
-            return dont_use_list
+            return list(dont_use_list_raw)
 
     @property
     def additional_drc_text(self) -> str:
@@ -451,8 +536,7 @@ class HammerTechnology:
         if not isinstance(lib, dict):
             raise TypeError("lib must be a dict")
 
-        # Convert the dict to JSON...
-        return Library.from_json(json.dumps(lib))
+        return Library.from_dict(lib)
 
     @property
     def tech_defined_libraries(self) -> List[Library]:
@@ -505,11 +589,13 @@ class HammerTechnology:
 
         result = []  # type: List[MacroSize]
 
-        for serialized in lef_names_filenames_serialized:
-            lef_filename, name = json.loads(serialized)
-            with open(lef_filename, 'r') as f:
-                lef_file_contents = str(f.read())
-            sizes = LEFUtils.get_sizes(lef_file_contents)
+        # Parsing large LEFs is slow, so remember the sizes of each LEF until its contents change.
+        size_cache = LEFSizeCache(os.path.join(self.cache_dir, "lef-macro-sizes.json"))
+        lefs = [json.loads(serialized) for serialized in lef_names_filenames_serialized]  # type: List[List[str]]
+        sizes_by_lef = self._parse_lef_sizes([lef_filename for lef_filename, name in lefs], size_cache)
+
+        for lef_filename, name in lefs:
+            sizes = sizes_by_lef[lef_filename]
             if len(sizes) == 0:
                 continue
 
@@ -525,8 +611,46 @@ class HammerTechnology:
                     height=s[2]
                 ))
 
+        size_cache.save()
         return result
 
+    def _parse_lef_sizes(self, lef_filenames: List[str],
+                         size_cache: LEFSizeCache) -> Dict[str, List[Tuple[str, float, float]]]:
+        """
+        Get the macro sizes of the given LEF files, parsing the ones which aren't cached in parallel.
+        See vlsi.technology.macro_size_jobs in defaults.yml.
+
+        :param lef_filenames: Paths to the LEF files.
+        :param size_cache: Cache of macro sizes, which is updated with the newly parsed LEF files.
+        :return: Map of LEF path -> list of macro sizes in the form of (macro name, width, height).
+        """
+        sizes_by_lef = {}  # type: Dict[str, List[Tuple[str, float, float]]]
+        to_parse = []  # type: List[str]
+        for lef_filename in dict.fromkeys(lef_filenames):
+            cached = size_cache.lookup(lef_filename)
+            if cached is None:
+                to_parse.append(lef_filename)
+            else:
+                sizes_by_lef[lef_filename] = cached
+
+        jobs = self._get_optional_setting("vlsi.technology.macro_size_jobs")  # type: Optional[int]
+        jobs = min(get_or_else(jobs, os.cpu_count() or 1), len(to_parse))
+        if jobs > 1:
+            import concurrent.futures
+
+            self.logger.debug("Parsing {n} LEF files with {jobs} processes".format(n=len(to_parse), jobs=jobs))
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+                # map() returns the results in order, so the output doesn't depend on scheduling.
+                parsed = list(executor.map(LEFUtils.get_sizes_from_file, to_parse,
+                                           chunksize=max(1, len(to_parse) // (jobs * 4))))
+        else:
+            parsed = list(map(LEFUtils.get_sizes_from_file, to_parse))
+
+        for lef_filename, sizes in zip(to_parse, parsed):
+            size_cache.store(lef_filename, sizes)
+            sizes_by_lef[lef_filename] = sizes
+        return sizes_by_lef
+
     def get_macro_sizes(self) -> List[MacroSize]:
         """
         Get the list of all macro blocks' sizes for export to other tools.
@@ -613,19 +737,22 @@ class HammerTechnology:
         return True
 
     def extract_tarballs(self) -> None:
-        """Extract tarballs to the given cache_dir, or verify that they've been extracted."""
+        """
+        Extract tarballs to the given cache_dir, or verify that they've been extracted.
+        Tarballs are extracted concurrently (see vlsi.technology.extract_tarballs_jobs) and atomically, so an
+        interrupted extraction is redone on the next run.
+        """
+        extracted_dir = self.extracted_tarballs_dir
+        # Tarballs in a user-specified location may have been extracted by hand.
+        user_specified = extracted_dir != os.path.join(self.cache_dir, "extracted")
+        extractions = []  # type: List[TarballExtraction]
         for tarball in self.config.tarballs:
-            target_path = os.path.join(self.extracted_tarballs_dir, tarball.path)
+            target_path = os.path.join(extracted_dir, tarball.path)
             tarball_path = os.path.join(self.get_setting(tarball.base_var), tarball.path)
             self.logger.debug("Extracting/verifying tarball %s" % (tarball_path))
-            if os.path.isdir(target_path):
-                # If the folder already seems to exist, continue
-                continue
-            else:
-                # Else, extract the tarballs.
-                os.makedirs(target_path, exist_ok=True)  # Make sure it exists or tar will not be happy.
-                subprocess.check_call("tar -xf %s -C %s" % (tarball_path, target_path), shell=True)
-                subprocess.check_call("chmod u+rwX -R %s" % (target_path), shell=True)
+            extractions.append(TarballExtraction(tarball_path=tarball_path, target_path=target_path,
+                                                 allow_unmarked=user_specified))
+        extract_tarballs(extractions, self.logger, self.get_setting("vlsi.technology.extract_tarballs_jobs"))
 
     def get_extra_libraries(self) -> List[ExtraLibrary]:
         """
@@ -652,6 +779,20 @@ class HammerTechnology:
         return list(self.tech_defined_libraries) + list(
             map(lambda el: el.store_into_library(), self.get_extra_libraries()))
 
+    @property
+    def library_index(self) -> LibraryIndex:
+        """
+        Get the index of all available IP libraries.
+        The index is rebuilt whenever the settings database or the technology config changes.
+
+        :return: Library index for the current settings.
+        """
+        key = (id(self.config), self._database.version if self.is_database_set() else -1)
+        if self._library_index is None or self._library_index[0] != key:
+            index = LibraryIndex(self.get_available_libraries(), self.filter_for_supplies)
+            self._library_index = (key, index)
+        return self._library_index[1]
+
     def process_library_filter(self,
                                filt: LibraryFilter,
                                pre_filts: List[Callable[[Library], bool]],
@@ -676,12 +817,37 @@ class HammerTechnology:
         :return: Resultant items from the filter and post-processed. (e.g. --timing foo.db --timing bar.db)
         """
 
+        with HammerTrace.span(filt.tag, "library_filter", description=filt.description):
+            return self._process_library_filter(filt, pre_filts, output_func, must_exist, uniquify)
+
+    def _process_library_filter(self,
+                                filt: LibraryFilter,
+                                pre_filts: List[Callable[[Library], bool]],
+                                output_func: Callable[[str, LibraryFilter], List[str]],
+                                must_exist: bool,
+                                uniquify: bool) -> List[str]:
+        """Implementation of process_library_filter (which records it in the trace)."""
+        index = self.library_index
+
         # First, filter the list of available libraries with pre_filts and the library itself.
+        # The default supplies pre-filter and indexed filters (e.g. MMMC corners) are looked up in the index.
         lib_filters = pre_filts + get_or_else(optional_map(filt.filter_func, lambda x: [x]), [])
+        by_supplies = self.filter_for_supplies in lib_filters
+        lib_filters = [f for f in lib_filters if f != self.filter_for_supplies]
+        index_key = next(filter(None, map(get_library_index_key, lib_filters)), None)
+        if index_key is not None:
+            lib_filters = [f for f in lib_filters if get_library_index_key(f) is not index_key]
+            available_libs = index.lookup(index_key)
+            if by_supplies:
+                available_libs = list(filter(index.matches_supplies, available_libs))
+        elif by_supplies:
+            available_libs = index.supplies_matching
+        else:
+            available_libs = index.libraries
 
         filtered_libs = list(reduce_named(
             sequence=lib_filters,
-            initial=self.get_available_libraries(),
+            initial=available_libs,
             function=lambda libs, func: filter(func, libs)
         ))  # type: List[Library]
 
@@ -692,7 +858,7 @@ class HammerTechnology:
         # Next, extract paths and prepend them to get the real paths.
         def get_and_prepend_path(lib: Library) -> Tuple[Library, List[str]]:
             paths = filt.paths_func(lib)
-            full_paths = list(map(lambda path: self.prepend_dir_path(path, lib), paths))
+            full_paths = list(map(lambda path: index.prepend_dir_path(self, path, lib), paths))
             return lib, full_paths
 
         libs_and_paths = list(map(get_and_prepend_path, filtered_libs))  # type: List[Tuple[Library, List[str]]]
@@ -701,9 +867,7 @@ class HammerTechnology:
         def check_lib_and_paths(inp: Tuple[Library, List[str]]) -> Tuple[Library, List[str]]:
             lib = inp[0]  # type: Library
             paths = inp[1]  # type: List[str]
-            existence_check_func = self.make_check_isfile(filt.description) if filt.is_file else self.make_check_isdir(
-                filt.description)
-            paths = list(map(existence_check_func, paths))
+            paths = list(map(lambda path: index.check_path(path, filt.is_file, filt.description), paths))
             return lib, paths
 
         if must_exist:
@@ -7,25 +7,12 @@
 #  See LICENSE for licence details.
 
 from numbers import Number
-from typing import TYPE_CHECKING, Any, Callable, List, NamedTuple, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Any, Callable, Hashable, List, NamedTuple, Optional, Tuple, Union
 
 from hammer_utils import get_or_else, assert_function_type
 
 if TYPE_CHECKING:
-    # grumble grumble, we need a better Library class generator
-    # Here is a stub class for type checking purposes only
-    from hammer_tech import LibraryPrefix
-    class Library:
-        @property
-        def extra_prefixes(self) -> List[LibraryPrefix]: pass
-        @property
-        def ecsm_liberty_file(self) -> Optional[str]: pass
-        @property
-        def gds_file(self) -> Optional[str]: pass
-        @property
-        def spice_file(self) -> Optional[str]: pass
-        @property
-        def verilog_synth(self) -> Optional[str]: pass
+    from tech_schema import Library
 
 PathsFunctionType = Callable[["Library"], List[str]]
 
@@ -54,6 +41,41 @@ def check_filter_func(func: Callable[["Library"], bool]) -> None:
     assert_function_type(func, ["Library"], bool)  # type: ignore
 
 
+# Key under which the libraries matched by an indexed filter function can be
+# looked up in a LibraryIndex (see indexed_library_filter).
+LibraryIndexKey = NamedTuple('LibraryIndexKey', [
+    # Name of the bucketing; key_func must be the same for the same name.
+    ('name', str),
+    # Function which computes the bucket of a library.
+    ('key_func', Callable[["Library"], Hashable]),
+    # Bucket of the libraries which the filter function selects.
+    ('value', Hashable)
+])
+
+
+def indexed_library_filter(name: str, key_func: Callable[["Library"], Hashable],
+                           value: Hashable) -> Callable[["Library"], bool]:
+    """
+    Create a filter function which selects the libraries for which key_func returns value.
+    HammerTechnology.process_library_filter looks such filters up in the library index instead of calling them
+    on every library.
+
+    :param name: Name of the bucketing (e.g. "mmmc_corner"); key_func must be the same for the same name.
+    :param key_func: Function which computes the bucket of a library. Must return a hashable value.
+    :param value: Bucket to select.
+    :return: Filter function.
+    """
+    def filter_func(lib: "Library") -> bool:
+        return key_func(lib) == value
+    setattr(filter_func, "library_index_key", LibraryIndexKey(name, key_func, value))
+    return filter_func
+
+
+def get_library_index_key(func: Callable[["Library"], bool]) -> Optional[LibraryIndexKey]:
+    """Get the index key of a filter function created by indexed_library_filter, or None for other functions."""
+    return getattr(func, "library_index_key", None)
+
+
 class LibraryFilter(NamedTuple('LibraryFilter', [
     ('tag', str),
     ('description', str),
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  schema_object.py
+#  Base classes for the classes generated from schema.json by generate_tech_schema.py.
+#
+#  See LICENSE for licence details.
+
+import copy
+import json
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Type, TypeVar
+
+# A property of a schema object.
+# attr: Python attribute name (e.g. "lef_file")
+# key: JSON key (e.g. "lef file")
+# type: JSON schema type of the property ("string", "number", "integer", "boolean", "array" or "object")
+# items: JSON schema type of the array items if type is "array"
+# cls: Generated class of the property (type "object") or of the array items (items "object")
+SchemaProperty = NamedTuple('SchemaProperty', [
+    ('attr', str),
+    ('key', str),
+    ('type', str),
+    ('items', Optional[str]),
+    ('cls', Optional[type])
+])
+
+_T = TypeVar('_T', bound='SchemaObject')
+
+
+def properties_by_key(properties: Iterable[SchemaProperty]) -> Dict[str, SchemaProperty]:
+    """
+    Index the given properties by both their JSON key and their attribute name.
+    """
+    by_key = {}  # type: Dict[str, SchemaProperty]
+    for prop in properties:
+        by_key[prop.attr] = prop
+        by_key[prop.key] = prop
+    return by_key
+
+
+def _check_type(path: str, value: Any, schema_type: str) -> None:
+    """
+    Check that the given JSON value has the given JSON schema type.
+    :param path: Path of the value in the document, for error messages
+    """
+    if schema_type == "string":
+        ok = isinstance(value, str)
+    elif schema_type == "number":
+        ok = isinstance(value, (int, float)) and not isinstance(value, bool)
+    elif schema_type == "integer":
+        ok = isinstance(value, int) and not isinstance(value, bool)
+    elif schema_type == "boolean":
+        ok = isinstance(value, bool)
+    elif schema_type == "array":
+        ok = isinstance(value, list)
+    elif schema_type == "object":
+        ok = isinstance(value, dict)
+    else:
+        raise NotImplementedError("Unsupported schema type " + schema_type)
+    if not ok:
+        raise ValueError("{path} must be of type {t}, got {value}".format(path=path, t=schema_type, value=repr(value)))
+
+
+def _copy_value(value: Any) -> Any:
+    if isinstance(value, SchemaObject):
+        return value.copy()
+    elif isinstance(value, list):
+        return [_copy_value(item) for item in value]
+    else:
+        # Strings and numbers are immutable.
+        return value
+
+
+def _value_to_dict(value: Any) -> Any:
+    if isinstance(value, SchemaObject):
+        return value.to_dict()
+    elif isinstance(value, list):
+        return [_value_to_dict(item) for item in value]
+    else:
+        return value
+
+
+class SchemaObject:
+    """
+    Object of the tech JSON schema with one attribute per schema property.
+    Unset properties are None.
+    JSON keys which are not in the schema are kept as they are and are only accessible via [].
+    """
+    __slots__ = ('_extra',)
+
+    # Set by the generated subclasses.
+    _properties = ()  # type: Iterable[SchemaProperty]
+    _by_key = {}  # type: Dict[str, SchemaProperty]
+    _additional_properties = True  # type: bool
+
+    def __init__(self) -> None:
+        self._extra = {}  # type: Dict[str, Any]
+
+    @classmethod
+    def from_dict(cls: Type[_T], d: Dict[str, Any], validate: bool = True, path: Optional[str] = None) -> _T:
+        """
+        Create an object from its JSON dictionary.
+
+        :param d: Dictionary with JSON keys (e.g. "lef file")
+        :param validate: Check the types of the values against the schema (and raise ValueError if they don't match).
+                         Without validation, values are stored as they are.
+        :param path: Path of d in the document, for error messages
+        """
+        if path is None:
+            path = cls.__name__
+        if validate:
+            _check_type(path, d, "object")
+        obj = cls()
+        for key, value in d.items():
+            prop = cls._by_key.get(key)
+            if prop is None or prop.key != key:
+                if validate and not cls._additional_properties:
+                    raise ValueError("{path} has unknown property '{key}'".format(path=path, key=key))
+                obj._extra[key] = copy.deepcopy(value)
+            else:
+                # Paths are only needed for the error messages of validation.
+                prop_path = path + "." + prop.attr if validate else path
+                setattr(obj, prop.attr, _value_from_json(prop, value, validate, prop_path))
+        return obj
+
+    @classmethod
+    def from_json(cls: Type[_T], json_str: str, validate: bool = True) -> _T:
+        """
+        Create an object from a JSON string.
+        See from_dict.
+        """
+        return cls.from_dict(json.loads(json_str), validate)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the JSON dictionary of this object. Unset properties are omitted.
+        """
+        d = {}  # type: Dict[str, Any]
+        for prop in self._properties:
+            value = getattr(self, prop.attr)
+            if value is not None:
+                d[prop.key] = _value_to_dict(value)
+        if self._extra:
+            d.update(copy.deepcopy(self._extra))
+        return d
+
+    def serialize(self) -> str:
+        """
+        Get the JSON string of this object.
+        """
+        return json.dumps(self.to_dict())
+
+    def copy(self: _T) -> _T:
+        """
+        Perform a deep copy of this object.
+        """
+        new = self.__class__()
+        for prop in self._properties:
+            value = getattr(self, prop.attr)
+            if value is not None:
+                setattr(new, prop.attr, _copy_value(value))
+        if self._extra:
+            new._extra = copy.deepcopy(self._extra)
+        return new
+
+    def __getitem__(self, key: str) -> Any:
+        """
+        Get a property by JSON key or attribute name, e.g. stackup["name"].
+        """
+        prop = self._by_key.get(key)
+        if prop is not None:
+            return getattr(self, prop.attr)
+        return self._extra[key]
+
+    def __repr__(self) -> str:
+        return "{cls}({d})".format(cls=self.__class__.__name__, d=repr(self.to_dict()))
+
+
+def _value_from_json(prop: SchemaProperty, value: Any, validate: bool, path: str) -> Any:
+    if value is None:
+        return None
+    if prop.type == "object":
+        assert prop.cls is not None
+        if isinstance(value, dict) or validate:
+            return prop.cls.from_dict(value, validate, path)
+        return value
+    elif prop.type == "array":
+        if validate:
+            _check_type(path, value, "array")
+        if not isinstance(value, list):
+            return value
+        if prop.cls is not None:
+            if not validate:
+                return [prop.cls.from_dict(item, False, path) if isinstance(item, dict) else item for item in value]
+            return [prop.cls.from_dict(item, True, "{path}[{i}]".format(path=path, i=i))
+                    for i, item in enumerate(value)]
+        if validate:
+            assert prop.items is not None
+            for i, item in enumerate(value):
+                _check_type("{path}[{i}]".format(path=path, i=i), item, prop.items)
+        return list(value)
+    else:
+        if validate:
+            _check_type(path, value, prop.type)
+        return value
+
+
+class LibraryBase(SchemaObject):
+    """
+    Base class of the generated Library class.
+    Holds the extra_prefixes of the library in addition to the schema properties.
+    """
+    __slots__ = ('_extra_prefixes',)
+
+    def __init__(self) -> None:
+        super().__init__()
+        # List[LibraryPrefix]
+        self._extra_prefixes = []  # type: List[Any]
+
+    @property
+    def extra_prefixes(self) -> List[Any]:
+        """
+        Get a copy of the extra prefixes (List[LibraryPrefix]) of this library.
+        """
+        return list(self._extra_prefixes)
+
+    @extra_prefixes.setter
+    def extra_prefixes(self, value: List[Any]) -> None:
+        assert isinstance(value, list)
+        self._extra_prefixes = list(value)
+
+    def copy(self: _T) -> _T:
+        new = super().copy()  # type: ignore
+        new._extra_prefixes = list(self._extra_prefixes)  # type: ignore
+        return new
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tarballs.py
+#  Verified, resumable and concurrent extraction of technology tarballs.
+#
+#  See LICENSE for licence details.
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+from typing import TYPE_CHECKING, BinaryIO, Callable, List, NamedTuple, Optional
+
+from hammer_logging import HammerVLSILoggingContext
+
+if TYPE_CHECKING:
+    import tarfile
+
+__all__ = ['MARKER_NAME', 'TarballExtraction', 'extract_tarball', 'extract_tarballs', 'is_extracted']
+
+# Name of the completion marker written into every extracted tarball.
+MARKER_NAME = ".hammer-extracted"
+
+# Size of the chunks in which tarballs are read and hashed.
+_CHUNK_SIZE = 1024 * 1024
+
+
+# Struct that holds a tarball to extract and where to extract it to.
+class TarballExtraction(NamedTuple('TarballExtraction', [
+    # Path to the tarball.
+    ('tarball_path', str),
+    # Directory which should contain the extracted contents of the tarball.
+    ('target_path', str),
+    # Accept target_path as-is if it exists but was not extracted by hammer (e.g. extracted by hand into a
+    # user-specified extracted_tarballs_dir).
+    ('allow_unmarked', bool)
+])):
+    __slots__ = ()
+
+
+class _HashingReader:
+    """
+    Read-only file wrapper which hashes everything read through it and reports progress.
+    """
+
+    def __init__(self, f: BinaryIO, progress_func: Callable[[int], None]) -> None:
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.bytes_read = 0  # type: int
+        self.progress_func = progress_func
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        self.sha256.update(data)
+        self.bytes_read += len(data)
+        self.progress_func(self.bytes_read)
+        return data
+
+    def drain(self) -> None:
+        """Read (and hash) the rest of the file."""
+        while len(self.read(_CHUNK_SIZE)) > 0:
+            pass
+
+
+def _hash_file(path: str) -> str:
+    """Get the sha256 of the given file."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _read_marker(target_path: str) -> Optional[dict]:
+    """Read the completion marker of the given extracted tarball, or None if it is missing or unreadable."""
+    try:
+        with open(os.path.join(target_path, MARKER_NAME), "r") as f:
+            marker = json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+    return marker if isinstance(marker, dict) else None
+
+
+def _write_marker(target_path: str, tarball_path: str, sha256: str) -> None:
+    """Write the completion marker of the given extracted tarball."""
+    st = os.stat(tarball_path)
+    marker = {
+        "tarball": os.path.abspath(tarball_path),
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": sha256
+    }
+    with open(os.path.join(target_path, MARKER_NAME), "w") as f:
+        f.write(json.dumps(marker, indent=4))
+
+
+def is_extracted(tarball_path: str, target_path: str) -> bool:
+    """
+    Check whether the given tarball was completely extracted to target_path.
+    If the tarball's size or mtime changed since it was extracted, its contents are re-hashed and compared.
+
+    :param tarball_path: Path to the tarball.
+    :param target_path: Directory which should contain the extracted contents of the tarball.
+    :return: True if target_path contains a complete extraction of the current tarball.
+    """
+    marker = _read_marker(target_path)
+    if marker is None:
+        return False
+    st = os.stat(tarball_path)
+    if marker.get("size") == st.st_size and marker.get("mtime_ns") == st.st_mtime_ns:
+        return True
+    if marker.get("sha256") != _hash_file(tarball_path):
+        return False
+    # Same contents; refresh the marker so that we don't have to hash it next time.
+    try:
+        _write_marker(target_path, tarball_path, str(marker["sha256"]))
+    except OSError:
+        # The extracted tarballs may be in a read-only shared location.
+        pass
+    return True
+
+
+def _make_user_rwx(path: str) -> None:
+    """Equivalent of chmod -R u+rwX on the given directory."""
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in dirnames + filenames:
+            full_path = os.path.join(dirpath, name)
+            st = os.lstat(full_path)
+            if stat.S_ISLNK(st.st_mode):
+                continue
+            mode = st.st_mode | stat.S_IRUSR | stat.S_IWUSR
+            if stat.S_ISDIR(st.st_mode) or st.st_mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH):
+                mode |= stat.S_IXUSR
+            if mode != st.st_mode:
+                os.chmod(full_path, mode)
+
+
+def extract_tarball(tarball_path: str, target_path: str, logger: HammerVLSILoggingContext,
+                    allow_unmarked: bool = False) -> None:
+    """
+    Extract the given tarball to target_path, unless it was already extracted there.
+
+    The tarball is extracted into a staging directory next to target_path, which is atomically renamed to target_path
+    once extraction is complete and a completion marker (with the tarball's sha256) has been written. Concurrent
+    extractions to the same target_path (e.g. from several obj_dirs sharing an extracted_tarballs_dir) are serialized
+    with a lock file.
+
+    :param tarball_path: Path to the tarball.
+    :param target_path: Directory which should contain the extracted contents of the tarball.
+    :param logger: Logger to report progress to.
+    :param allow_unmarked: Accept an existing target_path which was not extracted by hammer.
+    """
+    name = os.path.basename(target_path)
+    if is_extracted(tarball_path, target_path):
+        logger.debug("Tarball {name} is already extracted to {path}".format(name=name, path=target_path))
+        return
+    if allow_unmarked and os.path.isdir(target_path) and _read_marker(target_path) is None:
+        logger.debug("Using pre-extracted tarball {name} in {path}".format(name=name, path=target_path))
+        return
+
+    parent_dir = os.path.dirname(os.path.abspath(target_path))
+    os.makedirs(parent_dir, exist_ok=True)
+    with open(os.path.join(parent_dir, "." + name + ".lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Someone else may have extracted it while we were waiting for the lock.
+            if is_extracted(tarball_path, target_path):
+                return
+
+            total_size = os.stat(tarball_path).st_size
+            reported = [0]  # type: List[int]
+
+            def report_progress(bytes_read: int) -> None:
+                percent = 100 * bytes_read // total_size if total_size > 0 else 100
+                if percent >= reported[0] + 10:
+                    reported[0] = percent - percent % 10
+                    logger.info("Extracting tarball {name}: {percent}%".format(name=name, percent=reported[0]))
+
+            # tarfile is only imported when something has to be extracted, to keep hammer-vlsi startup fast.
+            import tarfile
+
+            logger.info("Extracting tarball {path} to {target}".format(path=tarball_path, target=target_path))
+            staging_path = tempfile.mkdtemp(dir=parent_dir, prefix=".staging-" + name + "-")
+            try:
+                with open(tarball_path, "rb") as f:
+                    reader = _HashingReader(f, report_progress)
+                    with tarfile.open(fileobj=reader, mode="r|*") as tar:  # type: ignore
+                        if hasattr(tarfile, "tar_filter"):
+                            # Refuse members which would end up outside of the staging directory.
+                            tar.extractall(staging_path, filter=_tar_filter_keeping_links)  # type: ignore
+                        else:
+                            tar.extractall(staging_path)
+                    reader.drain()
+                _make_user_rwx(staging_path)
+                _write_marker(staging_path, tarball_path, reader.sha256.hexdigest())
+
+                # Replace any stale or interrupted extraction.
+                if os.path.lexists(target_path):
+                    shutil.rmtree(target_path)
+                os.replace(staging_path, target_path)
+            except BaseException:
+                shutil.rmtree(staging_path, ignore_errors=True)
+                raise
+            logger.info("Extracted tarball {name}".format(name=name))
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _tar_filter_keeping_links(member: "tarfile.TarInfo", dest_path: str) -> "tarfile.TarInfo":
+    """
+    tarfile's "tar" extraction filter, except that symlinks may point anywhere (like with tar -xf): PDK tarballs often
+    contain absolute symlinks or symlinks to files outside of the tarball.
+    Members are still never written outside of dest_path, since the filter resolves the symlinks extracted so far.
+    """
+    import tarfile
+
+    if not member.issym():
+        return tarfile.tar_filter(member, dest_path)  # type: ignore
+    # Check everything but the link target.
+    filtered = tarfile.tar_filter(member.replace(linkname="", deep=False), dest_path)  # type: ignore
+    return filtered.replace(linkname=member.linkname, deep=False)
+
+
+def extract_tarballs(extractions: List[TarballExtraction], logger: HammerVLSILoggingContext,
+                     max_workers: Optional[int] = None) -> None:
+    """
+    Extract the given tarballs concurrently (see extract_tarball).
+
+    :param extractions: Tarballs to extract.
+    :param logger: Logger to report progress to.
+    :param max_workers: Maximum number of tarballs to extract at once. Default: number of CPUs.
+    :return: Once all tarballs are extracted, or the first exception raised while extracting them.
+    """
+    if len(extractions) == 0:
+        return
+    import concurrent.futures
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(extractions)))) as executor:
+        futures = [executor.submit(extract_tarball, e.tarball_path, e.target_path, logger, e.allow_unmarked)
+                   for e in extractions]
+        # Wait for all of them so that no extraction is left running, then raise the first error, if any.
+        concurrent.futures.wait(futures)
+        for future in futures:
+            future.result()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  tech_schema.py
+#  Classes for the hammer technology JSON.
+#  Generated from schema.json by generate_tech_schema.py - do not edit by hand.
+#
+#  See LICENSE for licence details.
+
+from typing import List, Optional
+
+from schema_object import SchemaObject, SchemaProperty, LibraryBase, properties_by_key
+
+
+class Install(SchemaObject):
+    """Install in the technology JSON."""
+    __slots__ = ('base_var', 'path')
+
+    _properties = (
+        SchemaProperty(attr="base_var", key="base var", type="string", items=None, cls=None),
+        SchemaProperty(attr="path", key="path", type="string", items=None, cls=None),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 base_var: Optional[str] = None,
+                 path: Optional[str] = None) -> None:
+        super().__init__()
+        self.base_var = base_var  # type: Optional[str]
+        self.path = path  # type: Optional[str]
+
+
+class Corner(SchemaObject):
+    """Corner in the technology JSON."""
+    __slots__ = ('nmos', 'pmos', 'temperature')
+
+    _properties = (
+        SchemaProperty(attr="nmos", key="nmos", type="string", items=None, cls=None),
+        SchemaProperty(attr="pmos", key="pmos", type="string", items=None, cls=None),
+        SchemaProperty(attr="temperature", key="temperature", type="string", items=None, cls=None),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 nmos: Optional[str] = None,
+                 pmos: Optional[str] = None,
+                 temperature: Optional[str] = None) -> None:
+        super().__init__()
+        self.nmos = nmos  # type: Optional[str]
+        self.pmos = pmos  # type: Optional[str]
+        self.temperature = temperature  # type: Optional[str]
+
+
+class MinMaxCap(SchemaObject):
+    """MinMaxCap in the technology JSON."""
+    __slots__ = ('max_cap', 'min_cap')
+
+    _properties = (
+        SchemaProperty(attr="max_cap", key="max cap", type="string", items=None, cls=None),
+        SchemaProperty(attr="min_cap", key="min cap", type="string", items=None, cls=None),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 max_cap: Optional[str] = None,
+                 min_cap: Optional[str] = None) -> None:
+        super().__init__()
+        self.max_cap = max_cap  # type: Optional[str]
+        self.min_cap = min_cap  # type: Optional[str]
+
+
+class Provide(SchemaObject):
+    """Provide in the technology JSON."""
+    __slots__ = ('lib_type', 'vt')
+
+    _properties = (
+        SchemaProperty(attr="lib_type", key="lib_type", type="string", items=None, cls=None),
+        SchemaProperty(attr="vt", key="vt", type="string", items=None, cls=None),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 lib_type: Optional[str] = None,
+                 vt: Optional[str] = None) -> None:
+        super().__init__()
+        self.lib_type = lib_type  # type: Optional[str]
+        self.vt = vt  # type: Optional[str]
+
+
+class Supplies(SchemaObject):
+    """Supplies in the technology JSON."""
+    __slots__ = ('GND', 'VDD')
+
+    _properties = (
+        SchemaProperty(attr="GND", key="GND", type="string", items=None, cls=None),
+        SchemaProperty(attr="VDD", key="VDD", type="string", items=None, cls=None),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 GND: Optional[str] = None,
+                 VDD: Optional[str] = None) -> None:
+        super().__init__()
+        self.GND = GND  # type: Optional[str]
+        self.VDD = VDD  # type: Optional[str]
+
+
+class Library(LibraryBase):
+    """Library in the technology JSON."""
+    __slots__ = ('name', 'ccs_liberty_file', 'ccs_library_file', 'ecsm_liberty_file', 'ecsm_library_file', 'corner', 'itf_files', 'lef_file', 'spice_file', 'gds_file', 'milkyway_lib_in_dir', 'milkyway_techfile', 'nldm_liberty_file', 'nldm_library_file', 'openaccess_techfile', 'provides', 'qrc_techfile', 'supplies', 'tluplus_files', 'tluplus_map_file', 'verilog_sim', 'verilog_synth')
+
+    _properties = (
+        SchemaProperty(attr="name", key="name", type="string", items=None, cls=None),
+        SchemaProperty(attr="ccs_liberty_file", key="ccs liberty file", type="string", items=None, cls=None),
+        SchemaProperty(attr="ccs_library_file", key="ccs library file", type="string", items=None, cls=None),
+        SchemaProperty(attr="ecsm_liberty_file", key="ecsm liberty file", type="string", items=None, cls=None),
+        SchemaProperty(attr="ecsm_library_file", key="ecsm library file", type="string", items=None, cls=None),
+        SchemaProperty(attr="corner", key="corner", type="object", items=None, cls=Corner),
+        SchemaProperty(attr="itf_files", key="itf files", type="object", items=None, cls=MinMaxCap),
+        SchemaProperty(attr="lef_file", key="lef file", type="string", items=None, cls=None),
+        SchemaProperty(attr="spice_file", key="spice file", type="string", items=None, cls=None),
+        SchemaProperty(attr="gds_file", key="gds file", type="string", items=None, cls=None),
+        SchemaProperty(attr="milkyway_lib_in_dir", key="milkyway lib in dir", type="string", items=None, cls=None),
+        SchemaProperty(attr="milkyway_techfile", key="milkyway techfile", type="string", items=None, cls=None),
+        SchemaProperty(attr="nldm_liberty_file", key="nldm liberty file", type="string", items=None, cls=None),
+        SchemaProperty(attr="nldm_library_file", key="nldm library file", type="string", items=None, cls=None),
+        SchemaProperty(attr="openaccess_techfile", key="openaccess techfile", type="string", items=None, cls=None),
+        SchemaProperty(attr="provides", key="provides", type="array", items="object", cls=Provide),
+        SchemaProperty(attr="qrc_techfile", key="qrc techfile", type="string", items=None, cls=None),
+        SchemaProperty(attr="supplies", key="supplies", type="object", items=None, cls=Supplies),
+        SchemaProperty(attr="tluplus_files", key="tluplus files", type="object", items=None, cls=MinMaxCap),
+        SchemaProperty(attr="tluplus_map_file", key="tluplus map file", type="string", items=None, cls=None),
+        SchemaProperty(attr="verilog_sim", key="verilog sim", type="string", items=None, cls=None),
+        SchemaProperty(attr="verilog_synth", key="verilog synth", type="string", items=None, cls=None),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 name: Optional[str] = None,
+                 ccs_liberty_file: Optional[str] = None,
+                 ccs_library_file: Optional[str] = None,
+                 ecsm_liberty_file: Optional[str] = None,
+                 ecsm_library_file: Optional[str] = None,
+                 corner: Optional["Corner"] = None,
+                 itf_files: Optional["MinMaxCap"] = None,
+                 lef_file: Optional[str] = None,
+                 spice_file: Optional[str] = None,
+                 gds_file: Optional[str] = None,
+                 milkyway_lib_in_dir: Optional[str] = None,
+                 milkyway_techfile: Optional[str] = None,
+                 nldm_liberty_file: Optional[str] = None,
+                 nldm_library_file: Optional[str] = None,
+                 openaccess_techfile: Optional[str] = None,
+                 provides: Optional[List["Provide"]] = None,
+                 qrc_techfile: Optional[str] = None,
+                 supplies: Optional["Supplies"] = None,
+                 tluplus_files: Optional["MinMaxCap"] = None,
+                 tluplus_map_file: Optional[str] = None,
+                 verilog_sim: Optional[str] = None,
+                 verilog_synth: Optional[str] = None) -> None:
+        super().__init__()
+        self.name = name  # type: Optional[str]
+        self.ccs_liberty_file = ccs_liberty_file  # type: Optional[str]
+        self.ccs_library_file = ccs_library_file  # type: Optional[str]
+        self.ecsm_liberty_file = ecsm_liberty_file  # type: Optional[str]
+        self.ecsm_library_file = ecsm_library_file  # type: Optional[str]
+        self.corner = corner  # type: Optional["Corner"]
+        self.itf_files = itf_files  # type: Optional["MinMaxCap"]
+        self.lef_file = lef_file  # type: Optional[str]
+        self.spice_file = spice_file  # type: Optional[str]
+        self.gds_file = gds_file  # type: Optional[str]
+        self.milkyway_lib_in_dir = milkyway_lib_in_dir  # type: Optional[str]
+        self.milkyway_techfile = milkyway_techfile  # type: Optional[str]
+        self.nldm_liberty_file = nldm_liberty_file  # type: Optional[str]
+        self.nldm_library_file = nldm_library_file  # type: Optional[str]
+        self.openaccess_techfile = openaccess_techfile  # type: Optional[str]
+        self.provides = provides  # type: Optional[List["Provide"]]
+        self.qrc_techfile = qrc_techfile  # type: Optional[str]
+        self.supplies = supplies  # type: Optional["Supplies"]
+        self.tluplus_files = tluplus_files  # type: Optional["MinMaxCap"]
+        self.tluplus_map_file = tluplus_map_file  # type: Optional[str]
+        self.verilog_sim = verilog_sim  # type: Optional[str]
+        self.verilog_synth = verilog_synth  # type: Optional[str]
+
+
+class Tarball(SchemaObject):
+    """Tarball in the technology JSON."""
+    __slots__ = ('base_var', 'homepage', 'path')
+
+    _properties = (
+        SchemaProperty(attr="base_var", key="base var", type="string", items=None, cls=None),
+        SchemaProperty(attr="homepage", key="homepage", type="string", items=None, cls=None),
+        SchemaProperty(attr="path", key="path", type="string", items=None, cls=None),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 base_var: Optional[str] = None,
+                 homepage: Optional[str] = None,
+                 path: Optional[str] = None) -> None:
+        super().__init__()
+        self.base_var = base_var  # type: Optional[str]
+        self.homepage = homepage  # type: Optional[str]
+        self.path = path  # type: Optional[str]
+
+
+class Site(SchemaObject):
+    """Site in the technology JSON."""
+    __slots__ = ('name', 'x', 'y')
+
+    _properties = (
+        SchemaProperty(attr="name", key="name", type="string", items=None, cls=None),
+        SchemaProperty(attr="x", key="x", type="number", items=None, cls=None),
+        SchemaProperty(attr="y", key="y", type="number", items=None, cls=None),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 name: Optional[str] = None,
+                 x: Optional[float] = None,
+                 y: Optional[float] = None) -> None:
+        super().__init__()
+        self.name = name  # type: Optional[str]
+        self.x = x  # type: Optional[float]
+        self.y = y  # type: Optional[float]
+
+
+class WidthSpacingTuple(SchemaObject):
+    """WidthSpacingTuple in the technology JSON."""
+    __slots__ = ('width_at_least', 'min_spacing')
+
+    _properties = (
+        SchemaProperty(attr="width_at_least", key="width_at_least", type="number", items=None, cls=None),
+        SchemaProperty(attr="min_spacing", key="min_spacing", type="number", items=None, cls=None),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 width_at_least: Optional[float] = None,
+                 min_spacing: Optional[float] = None) -> None:
+        super().__init__()
+        self.width_at_least = width_at_least  # type: Optional[float]
+        self.min_spacing = min_spacing  # type: Optional[float]
+
+
+class Metal(SchemaObject):
+    """Metal in the technology JSON."""
+    __slots__ = ('name', 'index', 'direction', 'min_width', 'pitch', 'offset', 'power_strap_widths_and_spacings')
+
+    _properties = (
+        SchemaProperty(attr="name", key="name", type="string", items=None, cls=None),
+        SchemaProperty(attr="index", key="index", type="integer", items=None, cls=None),
+        SchemaProperty(attr="direction", key="direction", type="string", items=None, cls=None),
+        SchemaProperty(attr="min_width", key="min_width", type="number", items=None, cls=None),
+        SchemaProperty(attr="pitch", key="pitch", type="number", items=None, cls=None),
+        SchemaProperty(attr="offset", key="offset", type="number", items=None, cls=None),
+        SchemaProperty(attr="power_strap_widths_and_spacings", key="power_strap_widths_and_spacings", type="array", items="object", cls=WidthSpacingTuple),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 name: Optional[str] = None,
+                 index: Optional[int] = None,
+                 direction: Optional[str] = None,
+                 min_width: Optional[float] = None,
+                 pitch: Optional[float] = None,
+                 offset: Optional[float] = None,
+                 power_strap_widths_and_spacings: Optional[List["WidthSpacingTuple"]] = None) -> None:
+        super().__init__()
+        self.name = name  # type: Optional[str]
+        self.index = index  # type: Optional[int]
+        self.direction = direction  # type: Optional[str]
+        self.min_width = min_width  # type: Optional[float]
+        self.pitch = pitch  # type: Optional[float]
+        self.offset = offset  # type: Optional[float]
+        self.power_strap_widths_and_spacings = power_strap_widths_and_spacings  # type: Optional[List["WidthSpacingTuple"]]
+
+
+class Stackup(SchemaObject):
+    """Stackup in the technology JSON."""
+    __slots__ = ('name', 'metals')
+
+    _properties = (
+        SchemaProperty(attr="name", key="name", type="string", items=None, cls=None),
+        SchemaProperty(attr="metals", key="metals", type="array", items="object", cls=Metal),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 name: Optional[str] = None,
+                 metals: Optional[List["Metal"]] = None) -> None:
+        super().__init__()
+        self.name = name  # type: Optional[str]
+        self.metals = metals  # type: Optional[List["Metal"]]
+
+
+class TechJSON(SchemaObject):
+    """TechJSON in the technology JSON."""
+    __slots__ = ('grid_unit', 'installs', 'libraries', 'name', 'gds_map_file', 'dont_use_list', 'additional_drc_text', 'additional_lvs_text', 'tarballs', 'sites', 'stackups')
+
+    _properties = (
+        SchemaProperty(attr="grid_unit", key="grid_unit", type="string", items=None, cls=None),
+        SchemaProperty(attr="installs", key="installs", type="array", items="object", cls=Install),
+        SchemaProperty(attr="libraries", key="libraries", type="array", items="object", cls=Library),
+        SchemaProperty(attr="name", key="name", type="string", items=None, cls=None),
+        SchemaProperty(attr="gds_map_file", key="gds map file", type="string", items=None, cls=None),
+        SchemaProperty(attr="dont_use_list", key="dont use list", type="array", items="string", cls=None),
+        SchemaProperty(attr="additional_drc_text", key="additional drc text", type="string", items=None, cls=None),
+        SchemaProperty(attr="additional_lvs_text", key="additional lvs text", type="string", items=None, cls=None),
+        SchemaProperty(attr="tarballs", key="tarballs", type="array", items="object", cls=Tarball),
+        SchemaProperty(attr="sites", key="sites", type="array", items="object", cls=Site),
+        SchemaProperty(attr="stackups", key="stackups", type="array", items="object", cls=Stackup),
+    )
+    _by_key = properties_by_key(_properties)
+
+    def __init__(self, *,
+                 grid_unit: Optional[str] = None,
+                 installs: Optional[List["Install"]] = None,
+                 libraries: Optional[List["Library"]] = None,
+                 name: Optional[str] = None,
+                 gds_map_file: Optional[str] = None,
+                 dont_use_list: Optional[List[str]] = None,
+                 additional_drc_text: Optional[str] = None,
+                 additional_lvs_text: Optional[str] = None,
+                 tarballs: Optional[List["Tarball"]] = None,
+                 sites: Optional[List["Site"]] = None,
+                 stackups: Optional[List["Stackup"]] = None) -> None:
+        super().__init__()
+        self.grid_unit = grid_unit  # type: Optional[str]
+        self.installs = installs  # type: Optional[List["Install"]]
+        self.libraries = libraries  # type: Optional[List["Library"]]
+        self.name = name  # type: Optional[str]
+        self.gds_map_file = gds_map_file  # type: Optional[str]
+        self.dont_use_list = dont_use_list  # type: Optional[List[str]]
+        self.additional_drc_text = additional_drc_text  # type: Optional[str]
+        self.additional_lvs_text = additional_lvs_text  # type: Optional[str]
+        self.tarballs = tarballs  # type: Optional[List["Tarball"]]
+        self.sites = sites  # type: Optional[List["Site"]]
+        self.stackups = stackups  # type: Optional[List["Stackup"]]
@@ -8,13 +8,19 @@
 import json
 import os
 import shutil
+import socket
+import stat
+import subprocess
+import sys
 import tempfile
-from typing import Any, Callable, Dict, Optional
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import hammer_config
 from hammer_logging.test import HammerLoggingCaptureContext
 from hammer_tech import MacroSize
-from hammer_vlsi import CLIDriver, HammerDriver, PlacementConstraint, PlacementConstraintType
+from hammer_vlsi import CLIDriver, HammerDriver, HammerDriverOptions, PlacementConstraint, PlacementConstraintType
+from hammer_vlsi.daemon import _make_private_dir, _peer_uid
 from hammer_utils import deepdict
 
 import unittest
@@ -327,6 +333,120 @@ class CLIDriverTest(unittest.TestCase):
         # Cleanup
         shutil.rmtree(syn_rundir)
 
+    def test_actions_without_technology(self) -> None:
+        """
+        Test that config-only actions like dump don't load the technology, and that other actions do.
+        """
+        # Set up some temporary folders for the unit test.
+        syn_rundir = tempfile.mkdtemp()
+
+        config_path = os.path.join(syn_rundir, "run_config.json")
+        output_path = os.path.join(syn_rundir, "output.json")
+        self.generate_dummy_config(syn_rundir, config_path, "dummy")
+
+        drivers = []  # type: List[HammerDriver]
+
+        class DriverRecorder(CLIDriver):
+            def args_to_driver(self, args: dict,
+                               default_options: Optional[HammerDriverOptions] = None) -> Tuple[HammerDriver, List[str]]:
+                driver, errors = super().args_to_driver(args, default_options)
+                drivers.append(driver)
+                return driver, errors
+
+        for action in ["dump", "syn-to-par", "dump-macrosizes"]:
+            with self.assertRaises(SystemExit) as cm:  # type: ignore
+                DriverRecorder().main(args=[
+                    action,
+                    "-p", config_path,
+                    "--output", output_path,
+                    "--obj_dir", syn_rundir
+                ])
+            # syn-to-par fails since there is no synthesis output, but it still creates its driver.
+            self.assertEqual(cm.exception.code, 1 if action == "syn-to-par" else 0)
+
+        self.assertEqual([d.tech is None for d in drivers], [True, True, False])
+
+        # Cleanup
+        shutil.rmtree(syn_rundir)
+
+    def test_daemon(self) -> None:
+        """
+        Test that the serve action runs the actions sent by hammer-vlsi-client with loaded drivers, and reloads the
+        driver when its config changes.
+        """
+        tmpdir = tempfile.mkdtemp()
+        socket_path = os.path.join(tmpdir, "hammer.sock")
+        config_path = os.path.join(tmpdir, "config.json")
+        output_path = os.path.join(tmpdir, "output.json")
+        client = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                               "..", "hammer-shell", "hammer-vlsi-client")]
+        env = dict(os.environ, HAMMER_DAEMON_SOCKET=socket_path)
+
+        def dump(log_name: str) -> Tuple[str, bool]:
+            """Run dump in the daemon and return test.value and whether the driver was (re)loaded."""
+            subprocess.check_call(client + ["dump", "-p", config_path, "-o", output_path, "-l", log_name,
+                                            "--obj_dir", tmpdir], env=env, cwd=tmpdir, stdout=subprocess.DEVNULL)
+            with open(output_path, "r") as f:
+                value = json.load(f)["test.value"]
+            with open(os.path.join(tmpdir, log_name), "r") as f:
+                loaded = "reading settings" in f.read()
+            return value, loaded
+
+        with open(config_path, "w") as f:
+            f.write(json.dumps({"vlsi.core.technology": "nop", "test.value": "first"}))
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                CLIDriver().main(args=["serve", "--socket", socket_path])
+            finally:
+                os._exit(0)
+        try:
+            for _ in range(200):
+                if os.path.exists(socket_path):
+                    break
+                time.sleep(0.05)
+            self.assertTrue(os.path.exists(socket_path))
+            # Only the current user may connect.
+            self.assertEqual(stat.S_IMODE(os.stat(socket_path).st_mode), 0o600)
+
+            self.assertEqual(dump("first.log"), ("first", True))
+            # The second run reuses the loaded driver.
+            self.assertEqual(dump("second.log"), ("first", False))
+            with open(config_path, "w") as f:
+                f.write(json.dumps({"vlsi.core.technology": "nop", "test.value": "changed"}))
+            self.assertEqual(dump("changed.log"), ("changed", True))
+        finally:
+            subprocess.call(client + ["--shutdown"], env=env)
+            os.waitpid(pid, 0)
+
+        # Cleanup
+        shutil.rmtree(tmpdir)
+
+    def test_daemon_socket_security(self) -> None:
+        """
+        Test that the daemon socket directory is private and that the user of a client can be checked.
+        """
+        tmpdir = tempfile.mkdtemp()
+        private_dir = os.path.join(tmpdir, "private")
+        _make_private_dir(private_dir)
+        self.assertEqual(stat.S_IMODE(os.stat(private_dir).st_mode), 0o700)
+        # An existing private directory is fine...
+        _make_private_dir(private_dir)
+        # ... but one which other users can access is not.
+        os.chmod(private_dir, 0o755)
+        with self.assertRaises(ValueError):
+            _make_private_dir(private_dir)
+
+        a, b = socket.socketpair(socket.AF_UNIX)
+        with a, b:
+            uid = _peer_uid(a)
+            if uid is not None:
+                self.assertEqual(uid, os.getuid())
+
+        # Cleanup
+        shutil.rmtree(tmpdir)
+
     def test_hier_dump(self) -> None:
         """
         Test that hierarchical settings work properly.
@@ -434,6 +554,60 @@ class CLIDriverTest(unittest.TestCase):
         # Cleanup
         shutil.rmtree(syn_rundir)
 
+    def test_hier_auto_failure_isolation(self) -> None:
+        """
+        Test that a failing module in a parallel hierarchical run only stops the modules which depend on it.
+        """
+        # Set up some temporary folders for the unit test.
+        syn_rundir = tempfile.mkdtemp()
+
+        # Generate a config for testing.
+        top_module = "dummy"
+        config_path = os.path.join(syn_rundir, "run_config.json")
+        output_path = os.path.join(syn_rundir, "output.json")
+
+        def add_hier(d: Dict[str, Any]) -> Dict[str, Any]:
+            output = deepdict(d)
+            output["vlsi.inputs.hierarchical.top_module"] = top_module
+            output["vlsi.inputs.hierarchical.flat"] = "hierarchical"
+            output["vlsi.inputs.hierarchical.config_source"] = "manual"
+            output["vlsi.inputs.hierarchical.max_parallel_runs"] = 2
+            output["vlsi.inputs.hierarchical.manual_modules"] = [
+                {"mod1": ["m1s1", "m1s2"], "mod2": ["m2s1"], top_module: ["mod1", "mod2"]}]
+            output["vlsi.inputs.hierarchical.manual_placement_constraints"] = []
+            output["vlsi.inputs.hierarchical.constraints"] = [
+                {"m1s1": [{"synthesis.mocksynth.step2_succeeds": False}]}]
+            return output
+
+        self.generate_dummy_config(
+            syn_rundir, config_path, top_module, postprocessing_func=add_hier)
+
+        with self.assertRaises(SystemExit) as cm:  # type: ignore
+            CLIDriver().main(args=[
+                "auto",  # action
+                "-p", config_path,
+                "--obj_dir", syn_rundir,
+                "--output", output_path
+            ])
+        self.assertEqual(cm.exception.code, 1)
+
+        def module_finished(module: str) -> bool:
+            return os.path.exists(os.path.join(syn_rundir, "output-{module}.json".format(module=module)))
+
+        # The other subtree and the sibling of the failing module still ran.
+        self.assertTrue(module_finished("m2s1"))
+        self.assertTrue(module_finished("mod2"))
+        self.assertTrue(module_finished("m1s2"))
+        self.assertTrue(os.path.exists(os.path.join(syn_rundir, "output-mod2_ilm.json")))
+        # The failing module and the modules which depend on it did not.
+        self.assertFalse(module_finished("m1s1"))
+        self.assertFalse(module_finished("mod1"))
+        self.assertFalse(module_finished(top_module))
+        self.assertFalse(os.path.exists(os.path.join(syn_rundir, "syn-mod1")))
+
+        # Cleanup
+        shutil.rmtree(syn_rundir)
+
     def test_dump_macrosizes(self) -> None:
         """
         Test that dump-macrosizes works properly.
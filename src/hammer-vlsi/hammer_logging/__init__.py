@@ -5,6 +5,8 @@
 #
 #  See LICENSE for licence details.
 
-__all__ = ['HammerVLSIFileLogger', 'HammerVLSILogging', 'HammerVLSILoggingContext', 'Level']
+__all__ = ['HammerVLSIFileLogger', 'HammerVLSILogging', 'HammerVLSILoggingContext', 'Level',
+           'HammerTrace', 'TraceSpan', 'TraceHotspot', 'load_trace', 'summarize_traces', 'to_chrome_trace']
 
 from .logging import HammerVLSIFileLogger, HammerVLSILogging, HammerVLSILoggingContext, Level
+from .trace import HammerTrace, TraceSpan, TraceHotspot, load_trace, summarize_traces, to_chrome_trace
@@ -5,9 +5,15 @@
 #
 #  See LICENSE for licence details.
 
-from functools import reduce
+import atexit
+import os
+import queue
+import sys
+import threading
+import time as _time
+import traceback
 from enum import Enum
-from typing import Callable, Iterable, List, NamedTuple, Type
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Type
 
 class Level(Enum):
     """
@@ -27,21 +33,41 @@ class Level(Enum):
 
 
 # Message including additional metadata such as level and context.
-FullMessage = NamedTuple('FullMessage', [
+class FullMessage(NamedTuple('FullMessage', [
     ('message', str),
     ('level', Level),
-    ('context', List[str])
-])
+    ('context', List[str]),
+    # time.time() when the message was logged, and the thread which logged it
+    # (asynchronous logging hands messages to the callbacks later, on another thread).
+    ('time', float),
+    ('thread', int),
+    # Whether the message is printed on the console (and kept in the logging buffer). Other callbacks (e.g. log files)
+    # get every message.
+    ('console', bool)
+])):
+    __slots__ = ()
+
+    def __new__(cls, message: str, level: Level, context: List[str], time: Optional[float] = None,
+                thread: Optional[int] = None, console: bool = True) -> "FullMessage":
+        """Create a message. The time and thread default to the current ones."""
+        return super().__new__(cls, message, level, context,
+                               _time.time() if time is None else time,
+                               threading.get_ident() if thread is None else thread,
+                               console)
 
 
 # Need a way to bind the callbacks to the class...
 def with_default_callbacks(cls):
     # TODO: think about how to remove default callbacks
-    cls.add_callback(cls.callback_print)
+    cls.add_callback(cls.callback_print, cls.callback_print_batch)
     cls.add_callback(cls.callback_buffering)
     return cls
 
 
+# Cache of context -> tag, since every message needs the tag of its context.
+_tags = {}  # type: Dict[Tuple[str, ...], str]
+
+
 class HammerVLSIFileLogger:
     """A file logger for HammerVLSILogging."""
 
@@ -52,7 +78,9 @@ class HammerVLSIFileLogger:
         :param output_path: Output path of the logger.
         :param format_msg_callback: Optional callback to run to build the message. None to use HammerVLSILogging.build_log_message.
         """
-        self._file = open(output_path, "a")
+        # Line-buffered so that processes forked while logging (e.g. for hierarchical runs) neither lose nor
+        # duplicate buffered messages.
+        self._file = open(output_path, "a", buffering=1)
         self._format_msg_callback = format_msg_callback
 
     def __enter__(self):
@@ -62,6 +90,8 @@ class HammerVLSIFileLogger:
         """
         Close this file logger.
         """
+        # Write out any messages still queued for this logger.
+        HammerVLSILogging.flush()
         self._file.close()
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -79,6 +109,17 @@ class HammerVLSIFileLogger:
 
         return file_callback
 
+    @property
+    def batch_callback(self) -> Callable[[List[FullMessage]], None]:
+        """Get the batch callback for HammerVLSILogging.add_callback, which writes many messages at once."""
+        format_msg = self._format_msg_callback if self._format_msg_callback is not None \
+            else HammerVLSILogging.build_log_message
+
+        def file_batch_callback(fullmessages: List[FullMessage]) -> None:
+            self._file.write("".join(format_msg(fullmessage) + "\n" for fullmessage in fullmessages))
+
+        return file_batch_callback
+
 
 @with_default_callbacks
 class HammerVLSILogging:
@@ -97,6 +138,12 @@ class HammerVLSILogging:
     # Enable printing the tag (e.g. "[synthesis] ...).
     enable_tag = True  # type: bool
 
+    # Messages below this level are dropped before they are formatted or dispatched to any callback.
+    min_level = Level.DEBUG  # type: Level
+
+    # Maximum number of messages handed to the callbacks at once in asynchronous mode (see start_async).
+    async_batch_size = 1024  # type: int
+
     # Various escape characters for colour output.
     COLOUR_BLUE = "\033[96m"
     COLOUR_GREY = "\033[37m"
@@ -110,14 +157,22 @@ class HammerVLSILogging:
     @classmethod
     def callback_print(cls, fullmessage: FullMessage) -> None:
         """Default callback which prints a colour message."""
-        print(cls.build_message(fullmessage))
+        if fullmessage.console:
+            print(cls.build_message(fullmessage))
+
+    @classmethod
+    def callback_print_batch(cls, fullmessages: List[FullMessage]) -> None:
+        """Batch version of callback_print."""
+        shown = [cls.build_message(fullmessage) for fullmessage in fullmessages if fullmessage.console]
+        if len(shown) > 0:
+            print("\n".join(shown))
 
     output_buffer = []  # type: List[str]
 
     @classmethod
     def callback_buffering(cls, fullmessage: FullMessage) -> None:
         """Get the current contents of the logging buffer and clear it."""
-        if not cls.enable_buffering:
+        if not cls.enable_buffering or not fullmessage.console:
             return
         cls.output_buffer.append(cls.build_message(fullmessage))
 
@@ -132,15 +187,130 @@ class HammerVLSILogging:
     # List of callbacks to call for logging.
     callbacks = []  # type: List[Callable[[FullMessage], None]]
 
+    # Map of callback -> batch version of the callback, which handles many messages at once.
+    batch_callbacks = {}  # type: Dict[Callable[[FullMessage], None], Callable[[List[FullMessage]], None]]
+
     @classmethod
     def clear_callbacks(cls) -> None:
         """Clear the list of callbacks."""
+        cls.flush()
         cls.callbacks = []
+        cls.batch_callbacks = {}
 
     @classmethod
-    def add_callback(cls, callback: Callable[[FullMessage], None]) -> None:
-        """Add a callback."""
+    def add_callback(cls, callback: Callable[[FullMessage], None],
+                     batch_callback: Optional[Callable[[List[FullMessage]], None]] = None) -> None:
+        """
+        Add a callback.
+
+        :param callback: Function called with each message.
+        :param batch_callback: Optional function which does the same for a list of messages at once (e.g. with a
+                               single write), used instead of callback in asynchronous mode.
+        """
         cls.callbacks.append(callback)
+        if batch_callback is not None:
+            cls.batch_callbacks[callback] = batch_callback
+
+    @classmethod
+    def remove_callback(cls, callback: Callable[[FullMessage], None]) -> None:
+        """
+        Remove a callback (and its batch version) added with add_callback.
+
+        :param callback: Function given to add_callback.
+        """
+        cls.flush()
+        cls.callbacks = [c for c in cls.callbacks if c != callback]
+        cls.batch_callbacks.pop(callback, None)
+
+    # Queue of messages (and flush requests) for the writer thread in asynchronous mode, or None in synchronous mode.
+    _queue = None  # type: Optional[queue.SimpleQueue]
+    _writer = None  # type: Optional[threading.Thread]
+    _async_lock = threading.Lock()
+
+    @classmethod
+    def start_async(cls) -> None:
+        """
+        Switch to asynchronous mode: log() only queues messages, and a background thread hands them to the callbacks
+        in batches. Queued messages are flushed at exit, before forking, after fatal messages and by flush().
+        """
+        with cls._async_lock:
+            if cls._queue is None:
+                cls._queue = queue.SimpleQueue()
+                cls._start_writer(cls._queue)
+
+    @classmethod
+    def stop_async(cls) -> None:
+        """Flush all queued messages and switch back to synchronous mode."""
+        with cls._async_lock:
+            q, writer = cls._queue, cls._writer
+            cls._queue = None
+            cls._writer = None
+        if q is not None and writer is not None:
+            q.put(None)
+            if writer is not threading.current_thread():
+                writer.join()
+
+    @classmethod
+    def is_async(cls) -> bool:
+        """Return True if messages are dispatched asynchronously."""
+        return cls._queue is not None
+
+    @classmethod
+    def _start_writer(cls, q: queue.SimpleQueue) -> None:
+        cls._writer = threading.Thread(target=cls._write_messages, args=(q,), name="hammer-logging", daemon=True)
+        cls._writer.start()
+
+    @classmethod
+    def _write_messages(cls, q: queue.SimpleQueue) -> None:
+        """Body of the writer thread: dispatch queued messages in batches until stopped."""
+        while True:
+            items = [q.get()]
+            try:
+                while len(items) < cls.async_batch_size:
+                    items.append(q.get_nowait())
+            except queue.Empty:
+                pass
+            messages = [item for item in items if isinstance(item, FullMessage)]
+            if len(messages) > 0:
+                cls._dispatch(messages)
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is None for item in items):
+                return
+
+    @classmethod
+    def _dispatch(cls, fullmessages: List[FullMessage]) -> None:
+        """Hand a batch of messages to all callbacks."""
+        for callback in list(cls.callbacks):
+            batch_callback = cls.batch_callbacks.get(callback)
+            try:
+                if batch_callback is not None:
+                    batch_callback(fullmessages)
+                else:
+                    for fullmessage in fullmessages:
+                        callback(fullmessage)
+            except Exception:  # pylint: disable=broad-except
+                # Don't let a broken callback take down the writer thread.
+                traceback.print_exc(file=sys.stderr)
+
+    @classmethod
+    def flush(cls) -> None:
+        """Wait until all queued messages were handed to the callbacks (only needed in asynchronous mode)."""
+        q, writer = cls._queue, cls._writer
+        if q is None or writer is None or writer is threading.current_thread() or not writer.is_alive():
+            return
+        done = threading.Event()
+        q.put(done)
+        done.wait()
+
+    @classmethod
+    def _after_fork_in_child(cls) -> None:
+        """The writer thread doesn't survive a fork, so start a new one (messages were flushed before forking)."""
+        cls._async_lock = threading.Lock()
+        if cls._queue is not None:
+            cls._queue = queue.SimpleQueue()
+            cls._start_writer(cls._queue)
 
     @classmethod
     def context(cls, new_context: str = "") -> "HammerVLSILoggingContext":
@@ -174,8 +344,17 @@ class HammerVLSILogging:
         """
         Log the given message at the given level in the given context.
         """
-        for callback in cls.callbacks:
-            callback(fullmessage)
+        if fullmessage.level.value < cls.min_level.value:
+            return
+        q = cls._queue
+        if q is None:
+            for callback in cls.callbacks:
+                callback(fullmessage)
+        else:
+            q.put(fullmessage)
+            if fullmessage.level == Level.FATAL:
+                # The process might be about to die.
+                cls.flush()
 
     @classmethod
     def build_message(cls, fullmessage: FullMessage) -> str:
@@ -198,16 +377,22 @@ class HammerVLSILogging:
     @staticmethod
     def get_tag(context: List[str]) -> str:
         """Helper function to get the tag for outputting a message given a context."""
-        if len(context) > 0:
-            return str(reduce(lambda a, b: a + " " + b, map(lambda x: "[%s]" % (x), context)))
-        else:
-            return "[<global>]"
+        key = tuple(context)
+        tag = _tags.get(key)
+        if tag is None:
+            if len(context) > 0:
+                tag = " ".join("[%s]" % (x) for x in context)
+            else:
+                tag = "[<global>]"
+            _tags[key] = tag
+        return tag
 
     @classmethod
     def get_buffer(cls) -> Iterable[str]:
         """Get the current contents of the logging buffer and clear it."""
         if not cls.enable_buffering:
             raise ValueError("Buffering is not enabled")
+        cls.flush()
         output = list(cls.output_buffer)
         cls.output_buffer = []
         return output
@@ -254,5 +439,21 @@ class HammerVLSILoggingContext:
         """Create an fatal-level log message."""
         return self.log(message, Level.FATAL)
 
-    def log(self, message: str, level: Level) -> None:
-        return self.logging_class.log(FullMessage(message, level, self._context))
+    def log(self, message: str, level: Level, console: bool = True) -> None:
+        """
+        Create a log message.
+
+        :param message: Message to log.
+        :param level: Level of the message.
+        :param console: Whether to print the message on the console. If False, it only goes to the other callbacks
+                        (e.g. log files).
+        """
+        # Don't even build the message if it would be dropped.
+        if level.value < self.logging_class.min_level.value:
+            return None
+        return self.logging_class.log(FullMessage(message, level, self._context, console=console))
+
+
+# Never lose queued messages, and don't leave them behind in forked children.
+atexit.register(HammerVLSILogging.stop_async)
+os.register_at_fork(before=HammerVLSILogging.flush, after_in_child=HammerVLSILogging._after_fork_in_child)
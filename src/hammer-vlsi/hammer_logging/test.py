@@ -46,6 +46,7 @@ class HammerLoggingCaptureContext:
     def __exit__(self, type, value, traceback) -> bool:
         """Restore the old settings for buffering and colour and clear
         the buffer."""
+        HammerVLSILogging.flush()
         self.logs = list(HammerVLSILogging.output_buffer)
         HammerVLSILogging.enable_buffering = self.old_enable_buffering
         HammerVLSILogging.output_buffer.clear()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  trace.py
+#  Structured timing trace of hammer runs, in JSON lines of Chrome trace events.
+#
+#  See LICENSE for licence details.
+
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .logging import FullMessage
+
+__all__ = ['HammerTrace', 'TraceSpan', 'TraceHotspot', 'load_trace', 'summarize_traces', 'to_chrome_trace']
+
+
+class TraceSpan:
+    """
+    A timed region of a hammer run (e.g. an action, a tool step or a subprocess), written to the trace as a Chrome
+    "complete" event when it ends. Use it as a context manager, or call end() explicitly for spans which end on
+    another thread.
+    """
+
+    def __init__(self, name: str, category: str, args: Dict[str, Any]) -> None:
+        self.name = name  # type: str
+        self.category = category  # type: str
+        self.args = args  # type: Dict[str, Any]
+        # Wall clock start time in microseconds, so that traces of different processes line up.
+        self._ts = time.time_ns() // 1000  # type: int
+        self._start = time.perf_counter()  # type: float
+        self._tid = threading.get_ident()  # type: int
+        self._ended = False  # type: bool
+
+    def end(self, end_time: Optional[float] = None, **args: Any) -> None:
+        """
+        End the span and write it to the trace. Ending a span twice has no effect.
+
+        :param end_time: time.perf_counter() at the end of the span (leave as None for now).
+        :param args: Extra arguments to record (e.g. the return code of a subprocess).
+        """
+        if self._ended:
+            return
+        self._ended = True
+        if end_time is None:
+            end_time = time.perf_counter()
+        self.args.update(args)
+        HammerTrace.write_event({
+            "name": self.name,
+            "cat": self.category,
+            "ph": "X",
+            "ts": self._ts,
+            "dur": max(0, int((end_time - self._start) * 1000000)),
+            "pid": os.getpid(),
+            "tid": self._tid,
+            "args": self.args
+        })
+
+    def __enter__(self) -> "TraceSpan":
+        return self
+
+    def __exit__(self, type, value, traceback) -> None:
+        # Any exception is propagated.
+        if value is not None:
+            self.end(error=repr(value))
+        else:
+            self.end()
+
+
+class _NullSpan(TraceSpan):
+    """Span returned while tracing is disabled, which records nothing."""
+
+    def __init__(self) -> None:
+        pass
+
+    def end(self, end_time: Optional[float] = None, **args: Any) -> None:
+        pass
+
+    def __exit__(self, type, value, traceback) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class HammerTrace:
+    """
+    Global trace of the current hammer run.
+    While enabled (see start), spans and log messages are appended to a JSON lines file, one Chrome trace event per
+    line; use summarize_traces to find hotspots or to_chrome_trace to view it in chrome://tracing or Perfetto.
+    """
+
+    # File descriptor of the trace file, or None while tracing is disabled.
+    _fd = None  # type: Optional[int]
+    _path = None  # type: Optional[str]
+
+    @classmethod
+    def start(cls, path: str) -> None:
+        """
+        Start appending trace events to the given file.
+
+        :param path: Path of the trace file. Events are appended if it exists, so that the traces of several runs
+                     (or processes) can be collected in one file.
+        """
+        cls.stop()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Append each event with a single write, so that concurrent processes don't interleave partial lines.
+        cls._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        cls._path = path
+
+    @classmethod
+    def stop(cls) -> None:
+        """Stop tracing and close the trace file."""
+        fd = cls._fd
+        cls._fd = None
+        cls._path = None
+        if fd is not None:
+            os.close(fd)
+
+    @classmethod
+    def enabled(cls) -> bool:
+        """Return True if tracing is enabled."""
+        return cls._fd is not None
+
+    @classmethod
+    def path(cls) -> Optional[str]:
+        """Get the path of the trace file, or None if tracing is disabled."""
+        return cls._path
+
+    @classmethod
+    def span(cls, name: str, category: str, **args: Any) -> TraceSpan:
+        """
+        Start a span, which is written to the trace when it ends.
+        Spans are free (and record nothing) while tracing is disabled.
+
+        :param name: Name of the span (e.g. the name of the step).
+        :param category: Category of the span (e.g. "step").
+        :param args: Extra JSON-serializable information to record.
+        :return: The span, to be used as a context manager or ended with end().
+        """
+        if cls._fd is None:
+            return _NULL_SPAN
+        return TraceSpan(name, category, args)
+
+    @classmethod
+    def write_event(cls, event: Dict[str, Any]) -> None:
+        """
+        Write a raw Chrome trace event to the trace, if tracing is enabled.
+
+        :param event: Trace event.
+        """
+        fd = cls._fd
+        if fd is None:
+            return
+        line = json.dumps(event, separators=(',', ':'), default=str) + "\n"
+        try:
+            os.write(fd, line.encode("utf-8"))
+        except OSError:
+            # Tracing was stopped concurrently.
+            pass
+
+    @classmethod
+    def log_callback(cls, fullmessage: FullMessage) -> None:
+        """Callback for HammerVLSILogging.add_callback, which records log messages as instant events."""
+        cls.log_batch_callback([fullmessage])
+
+    @classmethod
+    def log_batch_callback(cls, fullmessages: List[FullMessage]) -> None:
+        """Batch version of log_callback."""
+        if cls._fd is None:
+            return
+        pid = os.getpid()
+        for fullmessage in fullmessages:
+            # Use the time and thread of the log() call, not of the (possibly asynchronous) dispatch.
+            cls.write_event({
+                "name": fullmessage.level.name,
+                "cat": "log",
+                "ph": "i",
+                "s": "t",
+                "ts": int(fullmessage.time * 1000000),
+                "pid": pid,
+                "tid": fullmessage.thread,
+                "args": {"context": fullmessage.context, "message": fullmessage.message}
+            })
+
+
+def load_trace(path: str) -> List[Dict[str, Any]]:
+    """
+    Load the events of a trace file written by HammerTrace.
+    Lines which can't be parsed (e.g. the last line of a trace whose run was killed) are skipped.
+
+    :param path: Path of the trace file.
+    :return: List of trace events.
+    """
+    events = []  # type: List[Dict[str, Any]]
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(event, dict):
+                events.append(event)
+    return events
+
+
+# Struct that holds the statistics of all spans of the same category and name across traces.
+class TraceHotspot(NamedTuple('TraceHotspot', [
+    ('category', str),
+    ('name', str),
+    ('count', int),
+    # Total duration of the spans, in microseconds.
+    ('total_us', int),
+    # Total duration of the spans minus the time spent in spans nested in them, in microseconds.
+    ('self_us', int),
+    # Duration of the longest span, in microseconds.
+    ('max_us', int)
+])):
+    __slots__ = ()
+
+
+def summarize_traces(events: Iterable[Dict[str, Any]]) -> List[TraceHotspot]:
+    """
+    Summarize the spans of the given traces by category and name.
+
+    :param events: Trace events (e.g. from load_trace on the traces of several runs).
+    :return: Statistics of each kind of span, with the most time spent outside of nested spans first.
+    """
+    # Group the spans by thread to work out how they nest.
+    threads = {}  # type: Dict[Tuple[Any, Any], List[Dict[str, Any]]]
+    for event in events:
+        if event.get("ph") == "X":
+            threads.setdefault((event.get("pid"), event.get("tid")), []).append(event)
+
+    stats = {}  # type: Dict[Tuple[str, str], List[int]]
+    for spans in threads.values():
+        # Parents start before (or with, but last longer than) their children.
+        spans.sort(key=lambda e: (e["ts"], -e["dur"]))
+        # Stack of (end, stats key) of the spans enclosing the current one.
+        stack = []  # type: List[Tuple[int, Tuple[str, str]]]
+        for span in spans:
+            key = (str(span.get("cat", "")), str(span.get("name", "")))
+            while len(stack) > 0 and stack[-1][0] <= span["ts"]:
+                stack.pop()
+            if len(stack) > 0:
+                # Time spent in this span doesn't count towards the self time of its parent.
+                stats[stack[-1][1]][2] -= span["dur"]
+            s = stats.setdefault(key, [0, 0, 0, 0])
+            s[0] += 1
+            s[1] += span["dur"]
+            s[2] += span["dur"]
+            s[3] = max(s[3], span["dur"])
+            stack.append((span["ts"] + span["dur"], key))
+
+    hotspots = [TraceHotspot(category=key[0], name=key[1], count=s[0], total_us=s[1], self_us=max(0, s[2]),
+                             max_us=s[3]) for key, s in stats.items()]
+    return sorted(hotspots, key=lambda h: (-h.self_us, -h.total_us, h.category, h.name))
+
+
+def to_chrome_trace(events: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Convert trace events into a Chrome trace, which can be loaded in chrome://tracing or Perfetto.
+
+    :param events: Trace events.
+    :return: Chrome trace object, to be written as JSON.
+    """
+    return {"traceEvents": list(events), "displayTimeUnit": "ms"}
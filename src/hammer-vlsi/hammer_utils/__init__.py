@@ -9,8 +9,9 @@ import copy
 import inspect
 import math
 import sys
+from collections import deque
 from functools import reduce
-from typing import List, Any, Set, Dict, Tuple, TypeVar, Callable, Iterable, Optional, Union
+from typing import List, Any, Deque, Set, Dict, Tuple, TypeVar, Callable, Iterable, Optional, Union
 from enum import Enum, unique
 from decimal import Decimal
 
@@ -173,32 +174,30 @@ def topological_sort(graph: Dict[str, Tuple[List[str], List[str]]], starting_nod
     :return: A valid topological ordering of the graph.
     """
 
-    # Make a copy of the graph since we'll be modifying it.
-    working_graph = deepdict(graph)  # type: Dict[str, Tuple[List[str], List[str]]]
+    # Keep track of the number of incoming edges left for each node instead
+    # of modifying (a copy of) the graph.
+    incoming_left = {node: len(edges[1]) for node, edges in graph.items()}  # type: Dict[str, int]
 
-    queue = []  # type: List[str]
+    queue = deque(starting_nodes)  # type: Deque[str]
     output = []  # type: List[str]
 
-    # Add starting nodes to the queue.
-    queue.extend(starting_nodes)
-
     while len(queue) > 0:
         # Get front-most node in the queue.
-        node = queue.pop(0)
+        node = queue.popleft()
 
         # It should have no incoming edges.
-        assert len(working_graph[node][1]) == 0
+        assert incoming_left[node] == 0
 
         # Add it to the output.
         output.append(node)
 
         # Examine all targets of outgoing edges of this node.
-        for target_node in working_graph[node][0]:
+        for target_node in graph[node][0]:
             # Remove the corresponding incoming edge there.
-            working_graph[target_node][1].remove(node)
+            incoming_left[target_node] -= 1
 
             # If the target node now has no incoming nodes, we can add it to the queue.
-            if len(working_graph[target_node][1]) == 0:
+            if incoming_left[target_node] == 0:
                 queue.append(target_node)
 
     return output
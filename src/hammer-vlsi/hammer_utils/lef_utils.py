@@ -7,10 +7,55 @@
 #
 #  See LICENSE for licence details.
 
+import hashlib
+import json
+import os
 import re
-from typing import List, Optional, Tuple
+import tempfile
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
-__all__ = ['LEFUtils']
+__all__ = ['LEFUtils', 'LEFRect', 'LEFPin', 'LEFMacro', 'LEFSizeCache']
+
+# Patterns used by the LEF parser. Each one is only tried on lines which contain its keyword.
+_PROPERTYDEFINITIONS_PATTERN = re.compile(r"^\s*PROPERTYDEFINITIONS")
+_MACRO_PATTERN = re.compile(r"MACRO\s+([a-zA-Z0-9_]+)")
+_SIZE_PATTERN = re.compile(r"SIZE\s+([\d\.]+)\s+BY\s+([\d\.]+)\s*;")
+_RECT_PATTERN = re.compile(r"RECT\s+(?:MASK\s+\d+\s+)?([-\d\.]+)\s+([-\d\.]+)\s+([-\d\.]+)\s+([-\d\.]+)\s*;")
+
+# Size of the read buffer when streaming LEF files.
+_BUFFER_SIZE = 1024 * 1024
+
+
+# Struct that holds a rectangle on a layer, e.g. a pin shape or an obstruction.
+class LEFRect(NamedTuple('LEFRect', [
+    ('layer', str),
+    ('x1', float),
+    ('y1', float),
+    ('x2', float),
+    ('y2', float)
+])):
+    __slots__ = ()
+
+
+# Struct that holds a pin of a macro.
+class LEFPin(NamedTuple('LEFPin', [
+    ('name', str),
+    ('direction', Optional[str]),
+    ('use', Optional[str]),
+    ('rects', List[LEFRect])
+])):
+    __slots__ = ()
+
+
+# Struct that holds a macro. width and height are None if the macro has no SIZE statement.
+class LEFMacro(NamedTuple('LEFMacro', [
+    ('name', str),
+    ('width', Optional[float]),
+    ('height', Optional[float]),
+    ('pins', List[LEFPin]),
+    ('obstructions', List[LEFRect])
+])):
+    __slots__ = ()
 
 
 class LEFUtils:
@@ -22,75 +67,264 @@ class LEFUtils:
         :param source: LEF file source, Unix line endings
         :return: List of all macros' sizes in the form of (macro name, width, height).
         """
-        lines = source.split("\n")
+        return LEFUtils.get_sizes_from_lines(source.split("\n"))
 
-        output = []  # type: List[Tuple[str, float, float]]
+    @staticmethod
+    def get_sizes_from_file(path: str) -> List[Tuple[str, float, float]]:
+        """
+        Get the sizes of all macros in the given LEF file, streaming it instead of reading it into memory.
 
+        :param path: Path to the LEF file
+        :return: List of all macros' sizes in the form of (macro name, width, height).
+        """
+        with open(path, 'r', buffering=_BUFFER_SIZE, errors='replace') as f:
+            return LEFUtils.get_sizes_from_lines(f)
+
+    @staticmethod
+    def get_sizes_from_lines(lines: Iterable[str]) -> List[Tuple[str, float, float]]:
+        """
+        Get the sizes of all macros in the given lines of LEF (e.g. an open LEF file).
+
+        :param lines: Lines of LEF source
+        :return: List of all macros' sizes in the form of (macro name, width, height).
+        """
+        return [(macro.name, macro.width, macro.height) for macro in LEFUtils.iter_macros(lines)
+                if macro.width is not None and macro.height is not None]
+
+    @staticmethod
+    def get_macros_from_file(path: str) -> List[LEFMacro]:
+        """
+        Get all macros in the given LEF file with their sizes, pins and obstructions.
+
+        :param path: Path to the LEF file
+        :return: List of all macros.
+        """
+        with open(path, 'r', buffering=_BUFFER_SIZE, errors='replace') as f:
+            return list(LEFUtils.iter_macros(f, details=True))
+
+    @staticmethod
+    def iter_macros(lines: Iterable[str], details: bool = False) -> Iterator[LEFMacro]:
+        """
+        Parse the macros in the given lines of LEF in a single pass, yielding each macro as soon as it ends.
+
+        :param lines: Lines of LEF source (e.g. an open LEF file)
+        :param details: Also extract the pins and obstructions of each macro. Otherwise, only sizes are extracted
+                        and the pins and obstructions of each macro are empty.
+        :return: Iterator over the macros.
+        """
         in_propertydefinitions = False  # type: bool
         in_macro = None  # type: Optional[str]
-        found_size = False  # type: bool
+        macro_end = ""  # type: str
+        size = None  # type: Optional[Tuple[float, float]]
+        pins = []  # type: List[LEFPin]
+        obstructions = []  # type: List[LEFRect]
+        # Pin currently being parsed, as (name, "END <name>", direction, use, rects).
+        pin = None  # type: Optional[Tuple[str, str, Optional[str], Optional[str], List[LEFRect]]]
+        in_obs = False  # type: bool
+        layer = ""  # type: str
         for line in lines:
             # Check for PROPERTYDEFINITIONS statement
-            regex = "^\s*PROPERTYDEFINITIONS"
-            regex_search = re.search(regex, line)
-
-            if regex_search:
-                if in_macro:
-                    raise ValueError("Found PROPERTYDEFINITIONS inside MACRO")
-                if in_propertydefinitions:
-                    raise ValueError("Found PROPERTYDEFINITIONS inside PROPERTYDEFINITIONS")
-                else:
-                    in_propertydefinitions = True
+            if "PROPERTYDEFINITIONS" in line:
+                if _PROPERTYDEFINITIONS_PATTERN.search(line):
+                    if in_macro:
+                        raise ValueError("Found PROPERTYDEFINITIONS inside MACRO")
+                    if in_propertydefinitions:
+                        raise ValueError("Found PROPERTYDEFINITIONS inside PROPERTYDEFINITIONS")
+                    else:
+                        in_propertydefinitions = True
 
             # Just wait for the end of PROPERTYDEFINITIONS
             if in_propertydefinitions:
                 # Check for "END PROPERTYDEFINITIONS"
-                regex = "END PROPERTYDEFINITIONS"
-                if re.search(regex, line) is not None:
+                if "END PROPERTYDEFINITIONS" in line:
                     # END found
                     in_propertydefinitions = False
                 continue
 
             # Check for MACRO statement
-            regex = "MACRO\s+([a-zA-Z0-9_]+)"
-            regex_search = re.search(regex, line)
-
-            if regex_search:
-                macro_name = str(regex_search.group(1))
-                if in_macro is not None:
-                    raise ValueError(
-                        "Found new MACRO statement {n} while parsing MACRO block {c}".format(n=macro_name, c=in_macro))
-                else:
-                    in_macro = macro_name
-                    found_size = False
+            if "MACRO" in line:
+                regex_search = _MACRO_PATTERN.search(line)
+                if regex_search:
+                    macro_name = str(regex_search.group(1))
+                    if in_macro is not None:
+                        raise ValueError(
+                            "Found new MACRO statement {n} while parsing MACRO block {c}".format(n=macro_name, c=in_macro))
+                    else:
+                        in_macro = macro_name
+                        macro_end = "END " + macro_name
+                        size = None
+                        pins = []
+                        obstructions = []
+                        pin = None
+                        in_obs = False
 
             # If not in MACRO block, skip
             if in_macro is None:
                 continue
 
             # Check for "END <my_macro>"
-            regex = "END " + re.escape(in_macro)
-            if re.search(regex, line) is not None:
+            if macro_end in line:
                 # END found
+                yield LEFMacro(
+                    name=in_macro,
+                    width=None if size is None else size[0],
+                    height=None if size is None else size[1],
+                    pins=pins,
+                    obstructions=obstructions
+                )
                 in_macro = None
                 continue
 
             # Check for SIZE
-            regex = "SIZE\s+([\d\.]+)\s+BY\s+([\d\.]+)\s*;"
-            regex_search = re.search(regex, line)
-
-            if regex_search:
-                if found_size:
-                    raise ValueError("Found two SIZE statements in MACRO block for {m}".format(m=in_macro))
-                width = float(regex_search.group(1))
-                height = float(regex_search.group(2))
-                found_size = True
-
-                # Add size to output
-                output.append((in_macro, width, height))
+            if "SIZE" in line:
+                regex_search = _SIZE_PATTERN.search(line)
+                if regex_search:
+                    if size is not None:
+                        raise ValueError("Found two SIZE statements in MACRO block for {m}".format(m=in_macro))
+                    size = (float(regex_search.group(1)), float(regex_search.group(2)))
+                    continue
+
+            if not details:
+                continue
+
+            tokens = line.split()
+            if len(tokens) == 0:
                 continue
+            keyword = tokens[0]
+            if pin is not None:
+                if keyword == "END" and len(tokens) > 1 and line.strip() == pin[1]:
+                    pins.append(LEFPin(name=pin[0], direction=pin[2], use=pin[3], rects=pin[4]))
+                    pin = None
+                elif keyword == "DIRECTION" and len(tokens) > 1:
+                    pin = (pin[0], pin[1], tokens[1], pin[3], pin[4])
+                elif keyword == "USE" and len(tokens) > 1:
+                    pin = (pin[0], pin[1], pin[2], tokens[1], pin[4])
+                elif keyword == "LAYER" and len(tokens) > 1:
+                    layer = tokens[1]
+                elif keyword == "RECT":
+                    pin[4].extend(LEFUtils._parse_rects(line, layer))
+            elif in_obs:
+                if keyword == "END":
+                    in_obs = False
+                elif keyword == "LAYER" and len(tokens) > 1:
+                    layer = tokens[1]
+                elif keyword == "RECT":
+                    obstructions.extend(LEFUtils._parse_rects(line, layer))
+            elif keyword == "PIN" and len(tokens) > 1:
+                pin = (tokens[1], "END " + tokens[1], None, None, [])
+                layer = ""
+            elif keyword == "OBS":
+                in_obs = True
+                layer = ""
 
         if in_macro is not None:
             raise ValueError("Unexpected end of file in MACRO block {m}".format(m=in_macro))
 
-        return output
+    @staticmethod
+    def _parse_rects(line: str, layer: str) -> List[LEFRect]:
+        """Parse the RECT statements in the given line."""
+        return [LEFRect(layer, float(m.group(1)), float(m.group(2)), float(m.group(3)), float(m.group(4)))
+                for m in _RECT_PATTERN.finditer(line)]
+
+
+class LEFSizeCache:
+    """
+    On-disk cache of the macro sizes of LEF files, keyed by the path and the hash of the contents of each LEF file.
+    LEF files whose size and modification time are unchanged are not even re-hashed.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open (or create) a macro size cache.
+
+        :param path: Path of the cache file.
+        """
+        self.path = path  # type: str
+        # Map of LEF path -> {"stat": [size, mtime], "hash": content hash, "sizes": [[name, width, height]]}.
+        self._entries = {}  # type: Dict[str, dict]
+        self._dirty = False  # type: bool
+        try:
+            with open(path, 'r') as f:
+                entries = json.loads(f.read())
+            if isinstance(entries, dict):
+                self._entries = entries
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """
+        Get the hash of the contents of the given file.
+
+        :param path: Path to the file.
+        :return: Hash of the file.
+        """
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(_BUFFER_SIZE), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def lookup(self, lef_path: str) -> Optional[List[Tuple[str, float, float]]]:
+        """
+        Get the cached sizes of the given LEF file, if it is unchanged since they were cached.
+
+        :param lef_path: Path to the LEF file.
+        :return: List of all macros' sizes in the form of (macro name, width, height), or None if not cached.
+        """
+        entry = self._entries.get(os.path.abspath(lef_path))
+        if entry is None:
+            return None
+        st = os.stat(lef_path)
+        file_stat = [st.st_size, st.st_mtime_ns]
+        if entry["stat"] != file_stat:
+            # The file was touched or replaced; its contents might still be the same.
+            if entry["hash"] != self.hash_file(lef_path):
+                return None
+            entry["stat"] = file_stat
+            self._dirty = True
+        return [(str(name), float(width), float(height)) for name, width, height in entry["sizes"]]
+
+    def store(self, lef_path: str, sizes: List[Tuple[str, float, float]]) -> None:
+        """
+        Record the sizes of the given LEF file. Call save() to write the cache.
+
+        :param lef_path: Path to the LEF file.
+        :param sizes: List of all macros' sizes in the form of (macro name, width, height).
+        """
+        st = os.stat(lef_path)
+        self._entries[os.path.abspath(lef_path)] = {
+            "stat": [st.st_size, st.st_mtime_ns],
+            "hash": self.hash_file(lef_path),
+            "sizes": [list(s) for s in sizes]
+        }
+        self._dirty = True
+
+    def get_sizes(self, lef_path: str) -> List[Tuple[str, float, float]]:
+        """
+        Get the sizes of all macros in the given LEF file, parsing it only if it isn't cached.
+
+        :param lef_path: Path to the LEF file.
+        :return: List of all macros' sizes in the form of (macro name, width, height).
+        """
+        sizes = self.lookup(lef_path)
+        if sizes is None:
+            sizes = LEFUtils.get_sizes_from_file(lef_path)
+            self.store(lef_path, sizes)
+        return sizes
+
+    def save(self) -> None:
+        """Atomically write the cache, if anything changed."""
+        if not self._dirty:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(json.dumps(self._entries, separators=(',', ':')))
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._dirty = False
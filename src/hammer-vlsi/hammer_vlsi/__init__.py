@@ -20,6 +20,14 @@ from .constraints import *
 
 from .driver import *
 
-from .cli_driver import CLIDriver
+from .cli_driver import CLIDriver, action_without_technology
 
 from .submit_command import *
+
+from .subprocess_output import *
+
+from .scheduler import *
+
+from .step_cache import *
+
+from .driver_snapshot import *
@@ -15,9 +15,12 @@ import sys
 from .hammer_vlsi_impl import HammerTool, HammerVLSISettings
 from .hooks import HammerToolHookAction
 from .driver import HammerDriver, HammerDriverOptions
+from .scheduler import HierarchicalScheduler
 
-from typing import List, Dict, Tuple, Any, Callable, Optional, Union, cast
+from typing import List, Dict, Tuple, Any, Callable, Optional, TypeVar, Union, cast
 
+from hammer_config import ConfigCache
+from hammer_logging import HammerTrace, HammerVLSILogging
 from hammer_utils import add_dicts, deeplist, deepdict, get_or_else, check_function_type
 
 
@@ -97,6 +100,24 @@ def check_CLIActionType_type(func: CLIActionType) -> None:
             config=config_check, string=string_check))
 
 
+_F = TypeVar('_F', bound=Callable[..., Any])
+
+
+def action_without_technology(func: _F) -> _F:
+    """
+    Mark a CLIDriver action which only needs the project config (e.g. dump).
+    The driver for such an action does not load the technology, which skips reading the tech JSON and extracting the
+    technology files.
+    """
+    setattr(func, "needs_technology", False)
+    return func
+
+
+def action_needs_technology(func: CLIActionType) -> bool:
+    """Return True if the driver for the given action must load the technology (see action_without_technology)."""
+    return bool(getattr(func, "needs_technology", True))
+
+
 class CLIDriver:
     """
     Helper class for projects to easily write/customize a CLI driver for hammer without needing to rewrite/copy all the
@@ -179,6 +200,7 @@ class CLIDriver:
         }, self.all_hierarchical_actions)
 
     @staticmethod
+    @action_without_technology
     def dump_action(driver: HammerDriver, append_error_func: Callable[[str], None]) -> Optional[dict]:
         """
         Just dump the parsed project configuration as the output.
@@ -381,6 +403,7 @@ class CLIDriver:
 
         return action
 
+    @action_without_technology
     def synthesis_to_par_action(self, driver: HammerDriver, append_error_func: Callable[[str], None]) -> Optional[dict]:
         """Create a full config to run the output."""
         par_input_only = HammerDriver.synthesis_output_to_par_input(driver.project_config)
@@ -390,6 +413,7 @@ class CLIDriver:
         else:
             return self.get_full_config(driver, par_input_only)
 
+    @action_without_technology
     def hier_par_to_syn_action(self, driver: HammerDriver, append_error_func: Callable[[str], None]) -> Optional[dict]:
         """ Create a full config to run the output. """
         syn_input_only = HammerDriver.par_output_to_syn_input(driver.project_config)
@@ -399,6 +423,7 @@ class CLIDriver:
         else:
             return self.get_full_config(driver, syn_input_only)
 
+    @action_without_technology
     def par_to_drc_action(self, driver: HammerDriver, append_error_func: Callable[[str], None]) -> Optional[dict]:
         """ Create a full config to run the output. """
         drc_input_only = HammerDriver.par_output_to_drc_input(driver.project_config)
@@ -408,6 +433,7 @@ class CLIDriver:
         else:
             return self.get_full_config(driver, drc_input_only)
 
+    @action_without_technology
     def par_to_lvs_action(self, driver: HammerDriver, append_error_func: Callable[[str], None]) -> Optional[dict]:
         """ Create a full config to run the output. """
         lvs_input_only = HammerDriver.par_output_to_lvs_input(driver.project_config)
@@ -690,7 +716,11 @@ class CLIDriver:
         to_step = get_nonempty_str(args['to_step'])
         only_step = get_nonempty_str(args['only_step'])
 
-        driver = HammerDriver(options, config)
+        # Only load the technology if the action needs it.
+        action_func = self.action_map().get(str(args.get('action', "")))  # type: Optional[CLIActionType]
+        load_tech = action_func is None or action_needs_technology(action_func)
+
+        driver = HammerDriver(options, config, load_tech=load_tech)
         if from_step is not None or to_step is not None:
             driver.set_post_custom_syn_tool_hooks(HammerTool.make_from_to_hooks(from_step, to_step))
             driver.set_post_custom_par_tool_hooks(HammerTool.make_from_to_hooks(from_step, to_step))
@@ -710,37 +740,28 @@ class CLIDriver:
                 # Create a new context (this def) per module, otherwise when these higher-order funcs run they'll all
                 # use the last iteration of the loop.
 
-                # TODO(edwardw): this is a bit of a hack.
-                # Should really add an API to allow a run to have a bit of temporary project config
-                base_project_config = [[]]  # type: List[List[dict]]
+                def with_module_config(action: CLIActionConfigType) -> CLIActionConfigType:
+                    """Run the given action with the module's config snippet as an overlay of the project config."""
+                    def module_action(d: HammerDriver, append_error_func: Callable[[str], None]) -> Optional[dict]:
+                        with d.database.overlay(config):
+                            return action(d, append_error_func)
+                    return module_action
 
                 def syn_pre_func(d: HammerDriver) -> None:
                     self.syn_rundir = os.path.join(d.obj_dir, "syn-{module}".format(
                         module=module))  # TODO(edwardw): fix this ugly os.path.join; it doesn't belong here.
-                    # TODO(edwardw): remove ugly hack to store stuff in parent context
-                    base_project_config[0] = deeplist(driver.project_configs)
-                    d.update_project_configs(deeplist(base_project_config[0]) + [config])
 
                 def par_pre_func(d: HammerDriver) -> None:
                     self.par_rundir = os.path.join(d.obj_dir, "par-{module}".format(
                         module=module))  # TODO(edwardw): fix this ugly os.path.join; it doesn't belong here.
-                    # TODO(edwardw): remove ugly hack to store stuff in parent context
-                    base_project_config[0] = deeplist(driver.project_configs)
-                    d.update_project_configs(deeplist(base_project_config[0]) + [config])
 
                 def drc_pre_func(d: HammerDriver) -> None:
                     self.drc_rundir = os.path.join(d.obj_dir, "drc-{module}".format(
                         module=module))  # TODO(edwardw): fix this ugly os.path.join; it doesn't belong here.
-                    # TODO(edwardw): remove ugly hack to store stuff in parent context
-                    base_project_config[0] = deeplist(driver.project_configs)
-                    d.update_project_configs(deeplist(base_project_config[0]) + [config])
 
                 def lvs_pre_func(d: HammerDriver) -> None:
                     self.lvs_rundir = os.path.join(d.obj_dir, "lvs-{module}".format(
                         module=module))  # TODO(edwardw): fix this ugly os.path.join; it doesn't belong here.
-                    # TODO(edwardw): remove ugly hack to store stuff in parent context
-                    base_project_config[0] = deeplist(driver.project_configs)
-                    d.update_project_configs(deeplist(base_project_config[0]) + [config])
 
                 def post_run(d: HammerDriver, rundir: str) -> None:
                     # Write out the configs used/generated for logging/debugging.
@@ -751,8 +772,6 @@ class CLIDriver:
                         new_output_json = json.dumps(config, indent=4)
                         f.write(new_output_json)
 
-                    d.update_project_configs(deeplist(base_project_config[0]))
-
                 def syn_post_run(d: HammerDriver) -> None:
                     post_run(d, get_or_else(self.syn_rundir, ""))
 
@@ -765,23 +784,23 @@ class CLIDriver:
                 def lvs_post_run(d: HammerDriver) -> None:
                     post_run(d, get_or_else(self.lvs_rundir, ""))
 
-                syn_action = self.create_synthesis_action(self.get_extra_hierarchical_synthesis_hooks(driver).get(module, []),
-                                                          pre_action_func=syn_pre_func, post_load_func=None,
-                                                          post_run_func=syn_post_run)
+                syn_action = with_module_config(self.create_synthesis_action(
+                    self.get_extra_hierarchical_synthesis_hooks(driver).get(module, []),
+                    pre_action_func=syn_pre_func, post_load_func=None, post_run_func=syn_post_run))
                 self.set_hierarchical_synthesis_action(module, syn_action)
-                par_action = self.create_par_action(self.get_extra_hierarchical_par_hooks(driver).get(module, []),
-                                                    pre_action_func=par_pre_func, post_load_func=None,
-                                                    post_run_func=par_post_run)
+                par_action = with_module_config(self.create_par_action(
+                    self.get_extra_hierarchical_par_hooks(driver).get(module, []),
+                    pre_action_func=par_pre_func, post_load_func=None, post_run_func=par_post_run))
                 self.set_hierarchical_par_action(module, par_action)
                 syn_par_action = self.create_synthesis_par_action(synthesis_action=syn_action, par_action=par_action)
                 self.set_hierarchical_synthesis_par_action(module, syn_par_action)
-                drc_action = self.create_drc_action(self.get_extra_hierarchical_drc_hooks(driver).get(module, []),
-                                                    pre_action_func=drc_pre_func, post_load_func=None,
-                                                    post_run_func=drc_post_run)
+                drc_action = with_module_config(self.create_drc_action(
+                    self.get_extra_hierarchical_drc_hooks(driver).get(module, []),
+                    pre_action_func=drc_pre_func, post_load_func=None, post_run_func=drc_post_run))
                 self.set_hierarchical_drc_action(module, drc_action)
-                lvs_action = self.create_lvs_action(self.get_extra_hierarchical_lvs_hooks(driver).get(module, []),
-                                                    pre_action_func=lvs_pre_func, post_load_func=None,
-                                                    post_run_func=lvs_post_run)
+                lvs_action = with_module_config(self.create_lvs_action(
+                    self.get_extra_hierarchical_lvs_hooks(driver).get(module, []),
+                    pre_action_func=lvs_pre_func, post_load_func=None, post_run_func=lvs_post_run))
                 self.set_hierarchical_lvs_action(module, lvs_action)
 
             create_actions(module_iter, config_iter)
@@ -792,18 +811,34 @@ class CLIDriver:
                 log = driver.log.context("CLIDriver_auto")
                 output = {}  # type: dict
 
-                # Run syn_par for every module.
-                for module, _ in hierarchical_settings:
+                max_jobs = driver.database.get_setting("vlsi.inputs.hierarchical.max_parallel_runs")  # type: Optional[int]
+                scheduler = HierarchicalScheduler(
+                    order=[module for module, _ in hierarchical_settings],
+                    dependencies=driver.get_hierarchical_dependencies(),
+                    max_jobs=get_or_else(max_jobs, os.cpu_count() or 1),
+                    logger=log)
+                b, ext = os.path.splitext(args["output"])
+                # New input ILM configs of finished modules.
+                ilms = {}  # type: Dict[str, dict]
+
+                # Run syn_par for every module, each in its own process.
+                def run_module(module: str) -> Optional[dict]:
                     syn_par_action = self.get_hierarchical_synthesis_par_action(module)
-                    new_output = syn_par_action(driver, append_error_func)
+                    return syn_par_action(driver, lambda err: log.error(err))
 
-                    if new_output is None:
-                        log.error("Hierarchical syn-par run for module {module} failed".format(module=module))
-                        return None
-                    else:
-                        log.info("Hierarchical syn-par run for module {module} finished".format(module=module))
+                # Give each module the ILMs of its sub-modules.
+                def pre_fork(module: str) -> List[dict]:
+                    base_project_configs = driver.project_configs
+                    sub_ilms = [ilms[m] for m in scheduler.descendants(module) if m in ilms]
+                    if len(sub_ilms) > 0:
+                        driver.update_project_configs(deeplist(base_project_configs) + sub_ilms)
+                    return base_project_configs
 
-                    b, ext = os.path.splitext(args["output"])
+                def post_fork(module: str, base_project_configs: List[dict]) -> None:
+                    if driver.project_configs != base_project_configs:
+                        driver.update_project_configs(base_project_configs)
+
+                def module_done(module: str, new_output: dict) -> None:
                     new_output_filename = "{base}-{module}{ext}".format(base=b, module=module, ext=ext)
                     with open(new_output_filename, "w") as f:
                         new_output_json = json.dumps(new_output, indent=4)
@@ -819,24 +854,61 @@ class CLIDriver:
                         json_content = json.dumps(new_ilm, indent=4)
                         f.write(json_content)
                     log.info("New input ILM JSON written to " + new_ilm_filename)
-                    driver.update_project_configs(driver.project_configs + [new_ilm])
+                    ilms[module] = new_ilm
+
+                results = scheduler.run(run_module, pre_fork, post_fork, module_done)
+                failed = [module for module, result in results.items() if result is None]
+                if len(failed) > 0:
+                    append_error_func("Hierarchical syn-par runs failed or were skipped for modules: " + ", ".join(failed))
+                    return None
+                # Later actions see the ILMs of all modules.
+                driver.update_project_configs(driver.project_configs + [ilms[module] for module in scheduler.order])
                 return output
 
             self.hierarchical_auto_action = auto_action
 
         return driver, errors
 
-    def run_main_parsed(self, args: dict) -> int:
+    def run_main_parsed(self, args: dict, prebuilt: Optional[Tuple[HammerDriver, List[str]]] = None) -> int:
         """
         Given a parsed dictionary of arguments, find and run the given action.
 
+        :param prebuilt: Driver and errors already created from args by args_to_driver (e.g. kept by the daemon).
+                         If not given, args_to_driver is called.
         :return: Return code (0 for success)
         """
         if args['firrtl'] is not None and len(args['firrtl']) > 0:
             print("firrtl convenience argument not yet implemented", file=sys.stderr)
             return 1
 
-        driver, errors = self.args_to_driver(args)
+        if args.get('clear_config_cache', False):
+            ConfigCache.clear()
+        if args.get('config_cache', False):
+            ConfigCache.enabled = True
+        if args.get('no_config_cache', False):
+            ConfigCache.enabled = False
+        if args.get('async_logging', False):
+            HammerVLSILogging.start_async()
+        trace_path = args.get('trace', None)  # type: Optional[str]
+        if trace_path is not None:
+            HammerTrace.start(trace_path)
+            if HammerTrace.log_callback not in HammerVLSILogging.callbacks:
+                HammerVLSILogging.add_callback(HammerTrace.log_callback, HammerTrace.log_batch_callback)
+        try:
+            with HammerTrace.span(str(args['action']), "run"):
+                return self._run_main_parsed(args, prebuilt)
+        finally:
+            if trace_path is not None:
+                HammerVLSILogging.flush()
+                HammerTrace.stop()
+
+    def _run_main_parsed(self, args: dict, prebuilt: Optional[Tuple[HammerDriver, List[str]]]) -> int:
+        """Implementation of run_main_parsed once logging and tracing are set up."""
+        if prebuilt is None:
+            with HammerTrace.span("args_to_driver", "driver"):
+                driver, errors = self.args_to_driver(args)
+        else:
+            driver, errors = prebuilt
 
         # Check for action after creating the driver (e.g. for custom actions like hierarchical actions).
         action = str(args['action'])  # type: str
@@ -847,16 +919,17 @@ class CLIDriver:
 
         action_func = self.action_map()[action]
         output_str = None  # type: Optional[str]
-        if is_config_action(action_func):
-            action_func = cast(CLIActionConfigType, action_func)
-            output_config = action_func(driver, errors.append)  # type: Optional[dict]
-            if output_config is not None:
-                output_str = json.dumps(output_config, indent=4)
-        elif is_string_action(action_func):
-            action_func = cast(CLIActionStringType, action_func)
-            output_str = action_func(driver, errors.append)
-        else:
-            raise NotImplementedError("Invalid action function")
+        with HammerTrace.span(action, "action"):
+            if is_config_action(action_func):
+                action_func = cast(CLIActionConfigType, action_func)
+                output_config = action_func(driver, errors.append)  # type: Optional[dict]
+                if output_config is not None:
+                    output_str = json.dumps(output_config, indent=4)
+            elif is_string_action(action_func):
+                action_func = cast(CLIActionStringType, action_func)
+                output_str = action_func(driver, errors.append)
+            else:
+                raise NotImplementedError("Invalid action function")
         if output_str is None:
             print("Action {action} failed with errors".format(action=action), file=sys.stderr)
             for err in errors:
@@ -869,19 +942,15 @@ class CLIDriver:
             return 0
 
 
-    def main(self, args: Optional[List[str]] = None) -> None:
+    def argument_parser(self) -> argparse.ArgumentParser:
         """
-        Main function to call from your entry point script.
-        Parses command line arguments.
-        :param args: Custom command-line arguments.  If not given, sys.argv[1:] will be used.
-        Example:
-        >>> if __name__ == '__main__':
-        >>>   CLIDriver().main()
+        Get the parser of the command-line arguments of main().
+        Subclasses can override this to add arguments, which are then passed to run_main_parsed.
         """
         parser = argparse.ArgumentParser()
 
         parser.add_argument('action', metavar='ACTION', type=str,  # choices=self.valid_actions() <- sadly incompatible w/custom actions
-                            help='Action to perform with the command-line driver.')
+                            help='Action to perform with the command-line driver, or serve to run a daemon which runs the actions sent by hammer-vlsi-client.')
         # Required arguments for (Python) hammer driver.
         parser.add_argument("-e", "--environment_config", action='append', required=False,
                             help="Environment config files (.yml or .json) - .json will take precendence over any .yml. These config files will not be re-emitted in the output json. Can also be specified as a colon-separated list in the environment variable HAMMER_ENVIRONMENT_CONFIGS.")
@@ -918,6 +987,45 @@ class CLIDriver:
                             help='Top module. If not specified, hammer-vlsi will take it from synthesis.inputs.top_module.')
         parser.add_argument("--cad-files", action='append', required=False,
                             help="CAD files.")
+        # Parsed config cache.
+        parser.add_argument("--config_cache", action='store_true', required=False,
+                            help="Use an on-disk cache of parsed config files, so that repeated runs don't re-parse them. Can also be enabled by setting the environment variable HAMMER_CONFIG_CACHE=1.")
+        parser.add_argument("--no_config_cache", action='store_true', required=False,
+                            help="Don't use the on-disk cache of parsed config files, even if HAMMER_CONFIG_CACHE=1.")
+        parser.add_argument("--clear_config_cache", action='store_true', required=False,
+                            help="Clear the on-disk cache of parsed config files (by default in ~/.cache/hammer/configs or HAMMER_CONFIG_CACHE_DIR) before running.")
+        # Logging.
+        parser.add_argument("--async_logging", action='store_true', required=False,
+                            help="Write log messages from a background thread in batches, so that tools which log a lot are not slowed down by console and log file output.")
+        parser.add_argument("--trace", required=False,
+                            help="Append a timing trace of the actions, tool steps, subprocesses, config resolution and library filtering of this run to the given file, one JSON trace event per line. Summarize traces with hammer-trace-report.")
+        # Daemon mode.
+        parser.add_argument("--socket", required=False,
+                            help="Socket path of the serve action, which keeps drivers loaded and runs the actions sent by hammer-vlsi-client. Can also be specified via the environment variable HAMMER_DAEMON_SOCKET. Default: hammer-vlsi.sock in XDG_RUNTIME_DIR, or else in a private hammer-vlsi-<uid> directory in the temp dir.")
+        return parser
+
+    def serve(self, args: dict) -> int:
+        """
+        Run the hammer-vlsi daemon (the serve action) until a client shuts it down.
+        See HammerDaemon.
+
+        :return: Return code (0 for success)
+        """
+        from .daemon import HammerDaemon, default_socket_path
+        socket_path = get_or_else(get_nonempty_str(args.get('socket')), default_socket_path())
+        HammerDaemon(self.__class__, socket_path).serve_forever()
+        return 0
+
+    def main(self, args: Optional[List[str]] = None) -> None:
+        """
+        Main function to call from your entry point script.
+        Parses command line arguments.
+        :param args: Custom command-line arguments.  If not given, sys.argv[1:] will be used.
+        Example:
+        >>> if __name__ == '__main__':
+        >>>   CLIDriver().main()
+        """
+        parser = self.argument_parser()
 
         if HammerVLSISettings.set_hammer_vlsi_path_from_environment() is False:
             print("You must set HAMMER_VLSI to the hammer-vlsi directory", file=sys.stderr)
@@ -934,4 +1042,7 @@ class CLIDriver:
                   file=sys.stderr)
             sys.exit(1)
 
-        sys.exit(self.run_main_parsed(vars(parser.parse_args(args))))
+        parsed_args = vars(parser.parse_args(args))
+        if parsed_args['action'] == "serve":
+            sys.exit(self.serve(parsed_args))
+        sys.exit(self.run_main_parsed(parsed_args))
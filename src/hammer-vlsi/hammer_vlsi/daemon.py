@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  daemon.py
+#  Daemon which keeps hammer-vlsi drivers loaded and runs CLIDriver actions for clients on a Unix domain socket.
+#
+#  See LICENSE for licence details.
+
+import array
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple, TYPE_CHECKING
+
+from hammer_config import ConfigCache
+from hammer_logging import HammerVLSIFileLogger, HammerVLSILogging
+
+from .driver import HammerDriver
+
+if TYPE_CHECKING:
+    from .cli_driver import CLIDriver  # pylint: disable=unused-import
+
+__all__ = ['HammerDaemon', 'default_socket_path', 'DAEMON_SOCKET_ENV']
+
+# Environment variable with the path of the daemon socket (see default_socket_path).
+DAEMON_SOCKET_ENV = "HAMMER_DAEMON_SOCKET"
+
+# Arguments which only matter for the run of an action, not for loading the driver.
+_PER_RUN_ARGS = ("output", "log", "trace", "async_logging", "clear_config_cache")
+
+# Largest request (JSON line) accepted from a client.
+_MAX_REQUEST_SIZE = 1 << 20
+
+# (mtime in ns, size) of a file, or None if it doesn't exist.
+FileStamp = Optional[Tuple[int, int]]
+
+# A loaded driver kept by the daemon.
+# cli: CLIDriver whose args_to_driver created the driver (it holds e.g. the hierarchical actions)
+# driver: The driver
+# errors: Errors from args_to_driver
+# stamps: Stamps of the config files the driver was loaded from, to notice when they change
+WarmDriver = NamedTuple('WarmDriver', [
+    ('cli', 'CLIDriver'),
+    ('driver', HammerDriver),
+    ('errors', List[str]),
+    ('stamps', Dict[str, FileStamp])
+])
+
+
+def _default_socket_dir() -> str:
+    """
+    Get the directory of the default daemon socket, which only the current user may access: XDG_RUNTIME_DIR if it is
+    set, or else hammer-vlsi-<uid> in the temp dir (created by the daemon with mode 0700).
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR", "")
+    if runtime_dir != "":
+        return runtime_dir
+    return os.path.join(tempfile.gettempdir(), "hammer-vlsi-{uid}".format(uid=os.getuid()))
+
+
+def default_socket_path() -> str:
+    """
+    Get the socket path of the daemon: HAMMER_DAEMON_SOCKET if it is set, or else hammer-vlsi.sock in
+    _default_socket_dir(). hammer-vlsi-client uses the same default.
+    """
+    path = os.environ.get(DAEMON_SOCKET_ENV, "")
+    if path != "":
+        return path
+    return os.path.join(_default_socket_dir(), "hammer-vlsi.sock")
+
+
+def _make_private_dir(path: str) -> None:
+    """
+    Create the given directory with mode 0700 if it doesn't exist, and check that only the current user can access it
+    (e.g. that nobody else created it first in a shared temp dir).
+
+    :param path: Path of the directory.
+    """
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) & 0o077 != 0:
+        raise ValueError("{path} must be a directory owned by the current user with mode 0700".format(path=path))
+
+
+def _peer_uid(conn: socket.socket) -> Optional[int]:
+    """
+    Get the user ID of the process on the other end of a Unix domain socket.
+
+    :param conn: Connected socket.
+    :return: User ID of the peer, or None if the platform can't tell (SO_PEERCRED is Linux-only).
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return None
+    ucred = struct.Struct("3i")  # pid, uid, gid
+    _, uid, _ = ucred.unpack(conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, ucred.size))
+    return uid
+
+
+def file_stamp(path: str) -> FileStamp:
+    """Get the stamp of the given file, which changes when the file is modified, created or removed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _config_paths(args: dict) -> List[str]:
+    """Get the absolute paths of the environment and project configs given by args and HAMMER_ENVIRONMENT_CONFIGS."""
+    paths = list(args.get('environment_config') or [])  # type: List[str]
+    paths.extend(p for p in os.environ.get("HAMMER_ENVIRONMENT_CONFIGS", "").split(os.pathsep) if p != "")
+    paths.extend(args.get('configs') or [])
+    return [os.path.abspath(p) for p in paths]
+
+
+class HammerDaemon:
+    """
+    Serve CLIDriver actions to hammer-vlsi-client over a Unix domain socket.
+
+    The daemon keeps the drivers it loads (parsed configs, resolved database, technology) keyed by the arguments and
+    environment they were loaded with, so that repeated runs of hammer-vlsi (e.g. from a Makefile) skip the startup.
+    A driver is reloaded when one of its config files or technology files changes on disk.
+
+    Every request is run in a forked process with the stdin/stdout/stderr, working directory and environment of the
+    client, so actions cannot change the drivers kept by the daemon.
+
+    Only clients of the same user are served: the socket has mode 0600 (in a private directory by default), and
+    connections from other users are rejected.
+
+    Protocol: the client sends a JSON line {"argv": [...], "cwd": "...", "env": {...}} together with its
+    stdin/stdout/stderr file descriptors, and gets back a JSON line {"returncode": ...} once the action finished.
+    {"command": "shutdown"} stops the daemon.
+    """
+
+    def __init__(self, cli_driver_factory: Callable[[], "CLIDriver"], socket_path: str,
+                 max_drivers: int = 8) -> None:
+        """
+        Create a new daemon.
+
+        :param cli_driver_factory: Function which creates a new CLIDriver (e.g. the CLIDriver subclass).
+                                   Every loaded driver gets its own CLIDriver.
+        :param socket_path: Path of the Unix domain socket to listen on.
+        :param max_drivers: Maximum number of loaded drivers to keep; the least recently used ones are dropped.
+        """
+        if max_drivers < 1:
+            raise ValueError("max_drivers must be at least 1")
+        self.cli_driver_factory = cli_driver_factory  # type: Callable[[], CLIDriver]
+        self.socket_path = socket_path  # type: str
+        self.max_drivers = max_drivers  # type: int
+        self.log = HammerVLSILogging.context("daemon")
+        self._parser = cli_driver_factory().argument_parser()
+        self._drivers = OrderedDict()  # type: OrderedDict[str, WarmDriver]
+        self._children = set()  # type: Set[int]
+        self._running = False
+
+    def serve_forever(self) -> None:
+        """Serve requests until a client asks the daemon to shut down."""
+        socket_dir = os.path.dirname(os.path.abspath(self.socket_path))
+        if socket_dir == os.path.abspath(_default_socket_dir()):
+            _make_private_dir(socket_dir)
+        if os.path.exists(self.socket_path):
+            # Remove the socket of a previous daemon, unless it is still running.
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                    probe.connect(self.socket_path)
+                raise ValueError("A hammer-vlsi daemon is already listening on " + self.socket_path)
+            except ConnectionRefusedError:
+                os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # Don't let other users connect, not even between bind() and chmod().
+            old_umask = os.umask(0o177)
+            try:
+                server.bind(self.socket_path)
+            finally:
+                os.umask(old_umask)
+            os.chmod(self.socket_path, 0o600)
+            server.listen(16)
+            # Wake up regularly to reap finished requests.
+            server.settimeout(1.0)
+            self.log.info("Serving hammer-vlsi actions on {path}".format(path=self.socket_path))
+            self._running = True
+            while self._running:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    self._reap()
+                    continue
+                conn.settimeout(None)
+                self._handle(server, conn)
+                self._reap()
+        finally:
+            server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            self._reap(block=True)
+
+    def _reap(self, block: bool = False) -> None:
+        """Wait for the processes of finished requests."""
+        for pid in list(self._children):
+            done, _ = os.waitpid(pid, 0 if block else os.WNOHANG)
+            if done != 0:
+                self._children.discard(pid)
+
+    def _handle(self, server: socket.socket, conn: socket.socket) -> None:
+        """Handle one connection from a client."""
+        fds = []  # type: List[int]
+        try:
+            uid = _peer_uid(conn)
+            if uid is not None and uid != os.getuid():
+                self.log.error("Rejected a connection from user {uid}".format(uid=uid))
+                return
+            request, fds = _receive_request(conn)
+            if request.get("command") == "shutdown":
+                self._running = False
+                _send_response(conn, {"returncode": 0})
+                return
+            if "command" in request:
+                _send_response(conn, {"returncode": 1, "error": "Unknown command " + str(request["command"])})
+                return
+            if len(fds) != 3:
+                _send_response(conn, {"returncode": 1, "error": "Expected stdin, stdout and stderr"})
+                return
+
+            prepared = self._prepare(request, fds)
+            if isinstance(prepared, int):
+                _send_response(conn, {"returncode": prepared})
+                return
+            args, warm = prepared
+
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                self._run_child(conn, fds, request, args, warm)
+            self._children.add(pid)
+        except (OSError, ValueError) as e:
+            self.log.error("Could not handle request: {e}".format(e=e))
+        finally:
+            for fd in fds:
+                os.close(fd)
+            conn.close()
+
+    def _prepare(self, request: dict, fds: List[int]) -> Any:
+        """
+        Parse the arguments of the request and get its driver, loading it if needed.
+        Output goes to the client.
+
+        :return: (parsed arguments, WarmDriver), or a return code for the client if this failed.
+        """
+        with _client_context(request, fds[1], fds[2]):
+            try:
+                args = vars(self._parser.parse_args(request["argv"]))  # type: Dict[str, Any]
+                return args, self._warm_driver(args, request)
+            except SystemExit as e:
+                # e.g. invalid arguments
+                return e.code if isinstance(e.code, int) else 1
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+                return 1
+
+    def _warm_driver(self, args: dict, request: dict) -> WarmDriver:
+        """Get the loaded driver for the given arguments (and the current environment), loading it if needed."""
+        key = json.dumps({
+            "args": {k: v for k, v in args.items() if k not in _PER_RUN_ARGS},
+            "cwd": os.getcwd(),
+            "env": {k: v for k, v in os.environ.items() if k.startswith("HAMMER_")}
+        }, sort_keys=True)
+        warm = self._drivers.pop(key, None)
+        if warm is not None:
+            changed = [path for path, stamp in warm.stamps.items() if file_stamp(path) != stamp]
+            if len(changed) > 0:
+                self.log.info("Reloading the driver since {path} changed".format(path=changed[0]))
+                warm = None
+            elif args.get('clear_config_cache', False):
+                warm = None
+        if warm is None:
+            warm = self._load_driver(args)
+        self._drivers[key] = warm
+        while len(self._drivers) > self.max_drivers:
+            self._drivers.popitem(last=False)
+        return warm
+
+    def _load_driver(self, args: dict) -> WarmDriver:
+        """Load a new driver for the given arguments."""
+        # Take the stamps before loading so that changes made while loading are noticed by the next request.
+        stamps = {path: file_stamp(path) for path in _config_paths(args)}
+        old_callbacks = list(HammerVLSILogging.callbacks)
+        cache_enabled = ConfigCache.enabled
+        if args.get('clear_config_cache', False):
+            ConfigCache.clear()
+        if args.get('config_cache', False):
+            ConfigCache.enabled = True
+        if args.get('no_config_cache', False):
+            ConfigCache.enabled = False
+        try:
+            cli = self.cli_driver_factory()
+            driver, errors = cli.args_to_driver(args)
+        finally:
+            ConfigCache.enabled = cache_enabled
+            # Every request writes its own log (see _run_child), so drop the log file of the loading driver.
+            for callback in list(HammerVLSILogging.callbacks):
+                if callback not in old_callbacks:
+                    HammerVLSILogging.remove_callback(callback)
+        # e.g. builtins and technology files
+        for path in map(os.path.abspath, driver.input_files):
+            stamps.setdefault(path, file_stamp(path))
+        return WarmDriver(cli=cli, driver=driver, errors=errors, stamps=stamps)
+
+    def _run_child(self, conn: socket.socket, fds: List[int], request: dict, args: dict, warm: WarmDriver) -> None:
+        """Run the requested action in the forked process of the request and exit."""
+        code = 1
+        try:
+            for fd, target in zip(fds, (0, 1, 2)):
+                os.dup2(fd, target)
+            os.chdir(request["cwd"])
+            os.environ.clear()
+            os.environ.update(request["env"])
+            log_file = args["log"] if args["log"] is not None else HammerDriver.get_default_driver_options().log_file
+            file_logger = HammerVLSIFileLogger(log_file)
+            HammerVLSILogging.add_callback(file_logger.callback, file_logger.batch_callback)
+            code = warm.cli.run_main_parsed(args, prebuilt=(warm.driver, list(warm.errors)))
+            file_logger.close()
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except BaseException:  # pylint: disable=broad-except
+            traceback.print_exc()
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                _send_response(conn, {"returncode": code})
+            finally:
+                os._exit(0)
+
+
+@contextmanager
+def _client_context(request: dict, stdout_fd: int, stderr_fd: int) -> Iterator[None]:
+    """Temporarily use the working directory, environment and stdout/stderr of the client."""
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved_fds = os.dup(1), os.dup(2)
+    saved_cwd = os.getcwd()
+    saved_env = dict(os.environ)
+    try:
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+        os.dup2(saved_fds[0], 1)
+        os.dup2(saved_fds[1], 2)
+        os.close(saved_fds[0])
+        os.close(saved_fds[1])
+
+
+def _receive_request(conn: socket.socket) -> Tuple[dict, List[int]]:
+    """Receive a JSON line and the file descriptors sent with it."""
+    data = b""
+    fds = []  # type: List[int]
+    fd_size = array.array("i").itemsize
+    while not data.endswith(b"\n"):
+        chunk, ancdata, _, _ = conn.recvmsg(4096, socket.CMSG_SPACE(3 * fd_size))
+        for level, kind, fd_data in ancdata:
+            if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+                received = array.array("i")
+                received.frombytes(fd_data[:len(fd_data) - (len(fd_data) % fd_size)])
+                fds.extend(received)
+        if chunk == b"" or len(data) + len(chunk) > _MAX_REQUEST_SIZE:
+            for fd in fds:
+                os.close(fd)
+            raise ValueError("Incomplete or oversized request")
+        data += chunk
+    try:
+        request = json.loads(data.decode("utf-8"))
+        if not isinstance(request, dict):
+            raise ValueError("Request is not a JSON object")
+        if "command" not in request:
+            if not (isinstance(request.get("argv"), list) and all(isinstance(a, str) for a in request["argv"])):
+                raise ValueError("Request argv is not a list of strings")
+            if not isinstance(request.get("cwd"), str):
+                raise ValueError("Request cwd is not a string")
+            if not isinstance(request.get("env"), dict):
+                raise ValueError("Request env is not a JSON object")
+    except ValueError:
+        for fd in fds:
+            os.close(fd)
+        raise
+    return request, fds
+
+
+def _send_response(conn: socket.socket, response: dict) -> None:
+    conn.sendall((json.dumps(response) + "\n").encode("utf-8"))
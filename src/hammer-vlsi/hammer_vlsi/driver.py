@@ -23,6 +23,7 @@ from .hammer_vlsi_impl import HammerVLSISettings, HammerPlaceAndRouteTool, Hamme
     HierarchicalMode, load_tool, PlacementConstraint, SRAMParameters, ILMStruct
 from hammer_logging import HammerVLSIFileLogger, HammerVLSILogging, HammerVLSILoggingContext
 from .submit_command import HammerSubmitCommand
+from .driver_snapshot import DriverSnapshot
 
 __all__ = ['HammerDriverOptions', 'HammerDriver']
 
@@ -50,7 +51,7 @@ class HammerDriver:
             obj_dir=HammerVLSISettings.hammer_vlsi_path
         )
 
-    def __init__(self, options: HammerDriverOptions, extra_project_config: dict = {}) -> None:
+    def __init__(self, options: HammerDriverOptions, extra_project_config: dict = {}, load_tech: bool = True) -> None:
         """
         Create a hammer-vlsi driver, which is a higher level convenience function
         for quickly using hammer-vlsi. It imports and uses the hammer-vlsi blocks.
@@ -59,39 +60,54 @@ class HammerDriver:
 
         :param options: Driver options.
         :param extra_project_config: An extra flattened config for the project. Optional.
+        :param load_tech: Load the technology (and extract its files). Drivers which only work with the project config
+                          (e.g. to dump it) can skip this; load_technology() can still be called later.
         """
 
         # Create global logging context.
         file_logger = HammerVLSIFileLogger(options.log_file)
-        HammerVLSILogging.add_callback(file_logger.callback)
+        HammerVLSILogging.add_callback(file_logger.callback, file_logger.batch_callback)
         self.log = HammerVLSILogging.context()  # type: HammerVLSILoggingContext
 
-        # Create a new hammer database.
-        self.database = hammer_config.HammerDatabase()  # type: hammer_config.HammerDatabase
-
-        self.log.info("Loading hammer-vlsi libraries and reading settings")
-
         # Store the run dir.
         self.obj_dir = options.obj_dir  # type: str
 
-        # Load builtins and core into the database.
-        HammerVLSISettings.load_builtins_and_core(self.database)
+        self.log.info("Loading hammer-vlsi libraries and reading settings")
 
-        # Read in the environment config for paths to CAD tools, etc.
-        for config in options.environment_configs:
-            if not os.path.exists(config):
-                self.log.error("Environment config %s does not exist!" % (config))
-        self.database.update_environment(hammer_config.load_config_from_paths(options.environment_configs, strict=True))
+        # Files from which the settings and technology were loaded.
+        self.input_files = []  # type: List[str]
 
-        # Read in the project config to find the syn, par, and tech.
-        project_configs = hammer_config.load_config_from_paths(options.project_configs, strict=True)
-        project_configs.append(extra_project_config)
+        # Create a new hammer database.
+        self.database = hammer_config.HammerDatabase()  # type: hammer_config.HammerDatabase
         self.project_configs = []  # type: List[dict]
-        self.update_project_configs(project_configs)
-
-        # Get the technology and load technology settings.
         self.tech = None  # type: Optional[hammer_tech.HammerTechnology]
-        self.load_technology()
+
+        # Restore the settings and technology from a snapshot if the inputs are unchanged.
+        # Snapshots are not written into the hammer-vlsi folder itself (the default obj_dir).
+        snapshot_path = None  # type: Optional[str]
+        if os.path.abspath(self.obj_dir) != os.path.abspath(HammerVLSISettings.hammer_vlsi_path):
+            snapshot_path = DriverSnapshot.snapshot_path(self.obj_dir, {
+                "environment_configs": options.environment_configs,
+                "project_configs": options.project_configs,
+                "extra_project_config": extra_project_config,
+                "hammer_vlsi_path": HammerVLSISettings.hammer_vlsi_path,
+                "load_tech": load_tech
+            })
+        snapshot = None if snapshot_path is None else DriverSnapshot.load(snapshot_path)
+        if snapshot is not None:
+            self.log.debug("Restoring settings from snapshot {path}".format(path=snapshot_path))
+            self.input_files, state = snapshot
+            self.database = hammer_config.HammerDatabase.from_snapshot(state["database"])
+            self.project_configs = self.database.project
+            if state["tech"] is not None:
+                tech = hammer_tech.HammerTechnology.load_from_dict(
+                    state["tech"]["name"], state["tech"]["config"], state["tech"]["path"], validate=False)
+                self._init_technology(tech, state["tech"]["cache_dir"])
+        else:
+            self._load_settings(options, extra_project_config, load_tech)
+            # Don't save a failed technology load, so that its error is reported every time.
+            if snapshot_path is not None and (self.tech is not None or not load_tech):
+                DriverSnapshot.save(snapshot_path, self.input_files, self._get_snapshot_state())
 
         # Keep track of what the synthesis and par configs are since
         # update_tools() just takes a whole list.
@@ -111,9 +127,49 @@ class HammerDriver:
         self.post_custom_lvs_tool_hooks = []  # type: List[HammerToolHookAction]
         self.post_custom_sram_generator_tool_hooks = []  # type: List[HammerToolHookAction]
 
+    def _load_settings(self, options: HammerDriverOptions, extra_project_config: dict, load_tech: bool) -> None:
+        """Load the settings database (and the technology if load_tech) from the config files."""
+        # Load builtins and core into the database.
+        HammerVLSISettings.load_builtins_and_core(self.database)
+        self.input_files.extend(os.path.join(HammerVLSISettings.hammer_vlsi_path, name)
+                                for name in ("builtins.yml", "defaults.yml", "defaults.json"))
+
+        # Read in the environment config for paths to CAD tools, etc.
+        for config in options.environment_configs:
+            if not os.path.exists(config):
+                self.log.error("Environment config %s does not exist!" % (config))
+        self.database.update_environment(hammer_config.load_config_from_paths(options.environment_configs, strict=True))
+        self.input_files.extend(options.environment_configs)
+
+        # Read in the project config to find the syn, par, and tech.
+        project_configs = hammer_config.load_config_from_paths(options.project_configs, strict=True)
+        project_configs.append(extra_project_config)
+        self.update_project_configs(project_configs)
+        self.input_files.extend(options.project_configs)
+
+        # Get the technology and load technology settings.
+        if load_tech:
+            self.load_technology()
+
+    def _get_snapshot_state(self) -> dict:
+        """Get the state restored from a DriverSnapshot by __init__."""
+        tech_state = None  # type: Optional[dict]
+        if self.tech is not None:
+            tech_state = {
+                "name": self.tech.name,
+                "path": self.tech.path,
+                "config": self.tech.config.to_dict(),
+                "cache_dir": self.tech.cache_dir
+            }
+        return {
+            "database": self.database.get_snapshot(),
+            "tech": tech_state
+        }
+
     @property
     def project_config(self) -> dict:
-        return hammer_config.combine_configs(self.project_configs)
+        """Combined project config, including any overlays (see HammerDatabase.push_overlay)."""
+        return hammer_config.combine_configs(self.project_configs + self.database.overlays)
 
     def update_project_configs(self, project_configs: List[dict]) -> None:
         """
@@ -134,6 +190,8 @@ class HammerDriver:
         tech_opt = None  # type: Optional[hammer_tech.HammerTechnology]
         for base_path in tech_paths:
             path = os.path.join(base_path, tech_str)
+            # A technology added to an earlier path would be found instead.
+            self.input_files.extend(os.path.join(path, "%s.tech.%s" % (tech_str, ext)) for ext in ("json", "yml"))
             tech_opt = hammer_tech.HammerTechnology.load_from_dir(tech_str, path)
             if tech_opt is not None:
                 break
@@ -144,6 +202,11 @@ class HammerDriver:
             tech = tech_opt  # type: hammer_tech.HammerTechnology
         # Update database as soon as possible since e.g. extract_technology_files could use those settings
         self.database.update_technology(tech.get_config())
+        self.input_files.extend(os.path.join(tech.path, name) for name in ("defaults.yml", "defaults.json"))
+        self._init_technology(tech, cache_dir)
+
+    def _init_technology(self, tech: hammer_tech.HammerTechnology, cache_dir: str) -> None:
+        """Set up the given technology (whose settings are already in the database) and make it the driver's."""
         tech.logger = self.log.context("tech")
         tech.set_database(self.database)
         tech.cache_dir = cache_dir
@@ -785,13 +848,35 @@ class HammerDriver:
 
         return run_succeeded, output_config
 
-    def get_hierarchical_settings(self) -> List[Tuple[str, dict]]:
+    def get_hierarchical_dependencies(self) -> Dict[str, List[str]]:
         """
-        Read settings from the database, determine leaf/hierarchical modules, an order of execution, and return an
-        ordered list (from leaf to top) of modules and associated config snippets needed to run syn+par for that module
-        hierarchically.
+        Read settings from the database and determine which sub-modules each module in the hierarchical flow depends
+        on, i.e. which modules must be run (and have their ILMs available) before it.
 
-        :return: List of tuples of (module name, config snippet)
+        :return: Dictionary of module name -> list of sub-modules it depends on, for every module in the hierarchy.
+                 Empty if this is not a hierarchical flow.
+        """
+        hier_modules = self.__read_hierarchical_modules()[0]
+        if not hier_modules:
+            return {}
+
+        dependencies = {}  # type: Dict[str, List[str]]
+
+        def visit_module(mod: str) -> None:
+            if mod in dependencies:
+                return
+            dependencies[mod] = list(hier_modules.get(mod, []))
+            for m in dependencies[mod]:
+                visit_module(m)
+        visit_module(str(self.database.get_setting("vlsi.inputs.hierarchical.top_module")))
+
+        return dependencies
+
+    def __read_hierarchical_modules(self) -> Tuple[Dict[str, List[str]], Dict[str, List[PlacementConstraint]], Dict[str, List[Dict]]]:
+        """
+        Read the hierarchical modules, placement constraints and per-module constraints from the database.
+
+        :return: Tuple of (module -> sub-modules, module -> placement constraints, module -> constraints)
         """
         hier_source_key = "vlsi.inputs.hierarchical.config_source"
         hier_source = str(self.database.get_setting(hier_source_key))
@@ -822,6 +907,17 @@ class HammerDriver:
             raise ValueError("Invalid value for " + hier_source_key)
 
         assert isinstance(hier_modules, dict)
+        return hier_modules, hier_placement_constraints, hier_constraints
+
+    def get_hierarchical_settings(self) -> List[Tuple[str, dict]]:
+        """
+        Read settings from the database, determine leaf/hierarchical modules, an order of execution, and return an
+        ordered list (from leaf to top) of modules and associated config snippets needed to run syn+par for that module
+        hierarchically.
+
+        :return: List of tuples of (module name, config snippet)
+        """
+        hier_modules, hier_placement_constraints, hier_constraints = self.__read_hierarchical_modules()
         if not hier_modules:
             return []
 
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  driver_snapshot.py
+#  Snapshots of fully loaded HammerDrivers, to skip reloading unchanged configs.
+#
+#  See LICENSE for licence details.
+
+import hashlib
+import json
+import marshal
+import os
+import sys
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+__all__ = ['DriverSnapshot']
+
+# Bump this whenever the format of snapshots or what goes into them changes.
+_FORMAT_VERSION = 2
+
+_SNAPSHOT_SUFFIX = ".snapshot"
+
+# Input file the snapshot was made from: (path, mtime in ns, size, SHA-256 of the contents).
+# mtime, size and hash are None if the file did not exist.
+InputFile = Tuple[str, Optional[int], Optional[int], Optional[str]]
+
+
+def _hash_file(path: str) -> Optional[str]:
+    """Get the SHA-256 of the contents of the given file, or None if it doesn't exist."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _input_file(path: str) -> InputFile:
+    """Record the given input file."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return path, None, None, None
+    return path, stat.st_mtime_ns, stat.st_size, _hash_file(path)
+
+
+def _is_unchanged(input_file: InputFile) -> bool:
+    """Check if the given input file is still the same: same mtime and size, or else the same contents."""
+    path, mtime, size, digest = input_file
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return digest is None
+    if stat.st_mtime_ns == mtime and stat.st_size == size:
+        return True
+    return digest is not None and _hash_file(path) == digest
+
+
+class DriverSnapshot:
+    """
+    Snapshots of the state of a HammerDriver right after it was created (resolved settings database and parsed
+    technology), so that later drivers created with the same options restore the snapshot instead of re-reading and
+    re-combining every config.
+
+    Snapshots are stored in the obj_dir of the driver and keyed by the driver options and the working directory.
+    A snapshot is only used if every file the driver read (builtins, core defaults, environment and project configs,
+    technology files) is unchanged: it has the same mtime and size or, failing that, the same contents.
+
+    Snapshots can be disabled by setting enabled to False (or the HAMMER_DRIVER_SNAPSHOT environment variable to 0).
+    """
+
+    enabled = os.environ.get("HAMMER_DRIVER_SNAPSHOT", "1") != "0"  # type: bool
+
+    # Maximum number of snapshots kept in each obj_dir; the least recently used ones are removed.
+    max_snapshots = 16  # type: int
+
+    # Statistics, mainly for testing and debugging.
+    hits = 0  # type: int
+    misses = 0  # type: int
+
+    @staticmethod
+    def snapshot_dir(obj_dir: str) -> str:
+        """Get the directory of the snapshots in the given obj_dir."""
+        return os.path.join(obj_dir, "driver-snapshots")
+
+    @classmethod
+    def snapshot_path(cls, obj_dir: str, key: Dict[str, Any]) -> Optional[str]:
+        """
+        Get the path of the snapshot for the given key.
+
+        :param obj_dir: obj_dir of the driver.
+        :param key: Everything the driver state depends on besides its input files (e.g. driver options).
+                    Must be serializable to JSON.
+        :return: Path of the snapshot, or None if snapshots are disabled or the key is not serializable.
+        """
+        if not cls.enabled:
+            return None
+        try:
+            key_str = json.dumps({
+                "version": _FORMAT_VERSION,
+                "python": list(sys.version_info[:2]),
+                "cwd": os.getcwd(),
+                "key": key
+            }, sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+        digest = hashlib.sha1(key_str.encode("utf-8")).hexdigest()
+        return os.path.join(cls.snapshot_dir(obj_dir), digest + _SNAPSHOT_SUFFIX)
+
+    @classmethod
+    def load(cls, path: str) -> Optional[Tuple[List[str], Any]]:
+        """
+        Load the given snapshot if all of its input files are unchanged.
+
+        :param path: Path of the snapshot (see snapshot_path).
+        :return: Tuple of (input files, state given to save), or None if there is no valid snapshot.
+        """
+        try:
+            with open(path, "rb") as f:
+                snapshot = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            cls.misses += 1
+            return None
+        if not isinstance(snapshot, tuple) or len(snapshot) != 3 or snapshot[0] != _FORMAT_VERSION:
+            cls.misses += 1
+            return None
+        _, input_files, state = snapshot
+        if not all(map(_is_unchanged, input_files)):
+            cls.misses += 1
+            return None
+        cls.hits += 1
+        try:
+            # Mark the snapshot as recently used.
+            os.utime(path)
+        except OSError:
+            pass
+        return [input_file[0] for input_file in input_files], state
+
+    @classmethod
+    def save(cls, path: str, input_files: Iterable[str], state: Any) -> None:
+        """
+        Atomically write a snapshot and remove old snapshots if there are too many.
+
+        :param path: Path of the snapshot (see snapshot_path).
+        :param input_files: Paths of all files the state was loaded from.
+        :param state: State to save. Must be serializable with marshal.
+        """
+        try:
+            data = marshal.dumps((_FORMAT_VERSION, [_input_file(p) for p in input_files], state))
+        except ValueError:
+            # Not serializable; just don't save it.
+            return
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            except OSError:
+                os.remove(temp_path)
+                raise
+        except OSError:
+            # Snapshots are only an optimization.
+            return
+        cls._evict(directory)
+
+    @classmethod
+    def _evict(cls, directory: str) -> None:
+        """Remove the least recently used snapshots in the given directory until at most max_snapshots are left."""
+        snapshots = []  # type: List[Tuple[float, str]]
+        try:
+            for name in os.listdir(directory):
+                if name.endswith(_SNAPSHOT_SUFFIX):
+                    snapshot_path = os.path.join(directory, name)
+                    snapshots.append((os.stat(snapshot_path).st_mtime, snapshot_path))
+        except OSError:
+            return
+        for _, snapshot_path in sorted(snapshots)[:max(0, len(snapshots) - cls.max_snapshots)]:
+            try:
+                os.remove(snapshot_path)
+            except OSError:
+                pass
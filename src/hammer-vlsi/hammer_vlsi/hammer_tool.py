@@ -11,12 +11,12 @@ import os
 import re
 import shlex
 from abc import ABCMeta, abstractmethod
-from functools import reduce
+from functools import lru_cache, reduce, wraps
 from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, cast
 
 import hammer_config
 import hammer_tech
-from hammer_logging import HammerVLSILoggingContext
+from hammer_logging import HammerTrace, HammerVLSILoggingContext
 from hammer_tech import LibraryFilter, Stackup, RoutingDirection, Metal
 from hammer_utils import (add_lists, assert_function_type, get_or_else,
                           optional_map)
@@ -25,12 +25,75 @@ from .constraints import *
 from .hammer_vlsi_impl import HammerToolPauseException, HierarchicalMode
 from .hooks import (HammerStepFunction, HammerToolHookAction, HammerToolStep,
                     HookLocation)
-from .submit_command import HammerSubmitCommand
+from .step_cache import StepCache
+from .submit_command import HammerSubmitCommand, HammerSubmitJob
 from .units import TemperatureValue, TimeValue, VoltageValue
 
 __all__ = ['HammerTool']
 
 
+def memoized_accessor(func: Callable) -> Callable:
+    """
+    Decorator for HammerTool methods which compute something from settings
+    (e.g. get_clock_ports): memoize the result until any of the settings read
+    while computing it change.
+    Lists are shallow-copied before being returned so that callers can't
+    modify the memoized result.
+    """
+    @wraps(func)
+    def wrapper(self: "HammerTool", *args: Any) -> Any:
+        result = self._get_memoized(func.__name__, args, lambda: func(self, *args))
+        return list(result) if isinstance(result, list) else result
+    return wrapper
+
+
+@lru_cache(maxsize=1024)
+def _parse_temperature(value: str) -> TemperatureValue:
+    """Parse a library temperature. Libraries share a handful of distinct values, so parses are cached."""
+    return TemperatureValue(value)
+
+
+@lru_cache(maxsize=1024)
+def _parse_voltage(value: str) -> VoltageValue:
+    """Parse a library supply voltage. Libraries share a handful of distinct values, so parses are cached."""
+    return VoltageValue(value)
+
+
+def _mmmc_corner_value(temp: TemperatureValue, voltage: VoltageValue) -> Tuple[float, float]:
+    """Hashable form of an MMMC corner's temperature and voltage (see HammerTool.filter_for_mmmc)."""
+    return temp.value_in_units(temp.default_prefix), voltage.value_in_units(voltage.default_prefix)
+
+
+def _mmmc_corner_key(lib: hammer_tech.Library) -> Optional[Tuple[float, float]]:
+    """Get the MMMC corner of a library (see _mmmc_corner_value), or None if it has no temperature or VDD."""
+    if lib.corner is None or lib.corner.temperature is None:
+        return None
+    if lib.supplies is None or lib.supplies.VDD is None:
+        return None
+    return _mmmc_corner_value(_parse_temperature(str(lib.corner.temperature)), _parse_voltage(str(lib.supplies.VDD)))
+
+
+def _step_function_fingerprint(func: Callable, depth: int = 0) -> str:
+    """
+    Describe the code of a step function, so that changing a step (or replacing it with a hook) invalidates its cached
+    results. Functions captured by the step (e.g. the method wrapped by make_step_from_method) are included.
+    """
+    func = getattr(func, "__func__", func)
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return getattr(func, "__qualname__", type(func).__qualname__)
+    parts = [func.__module__, func.__qualname__, code.co_code.hex()]
+    if depth < 2:
+        for cell in func.__closure__ or ():
+            try:
+                contents = cell.cell_contents
+            except ValueError:
+                continue
+            if callable(contents):
+                parts.append(_step_function_fingerprint(contents, depth + 1))
+    return ":".join(parts)
+
+
 def make_raw_hammer_tool_step(func: HammerStepFunction, name: str) -> HammerToolStep:
     # Check the type of the HammerStepFunction
     check_hammer_step_function(func)
@@ -111,9 +174,19 @@ class HammerTool(metaclass=ABCMeta):
         # Ensure that the run_dir exists.
         os.makedirs(self.run_dir, exist_ok=True)
 
+        tracer = None  # type: Optional[hammer_config.SettingAccessTracer]
+        if self._get_optional_flag("vlsi.core.trace_setting_accesses"):
+            tracer = hammer_config.SettingAccessTracer()
+            self.setting_tracer = tracer
+
         # Run the list of steps defined for this tool.
-        if not self.run_steps(self.steps, hook_actions):
-            return False
+        try:
+            if not self.run_steps(self.steps, hook_actions):
+                return False
+        finally:
+            if tracer is not None:
+                self.setting_tracer = None
+                tracer.write_manifest(os.path.join(self.run_dir, "setting-accesses.json"))
 
         # Fill the outputs of the tool.
         return self.fill_outputs()
@@ -172,11 +245,25 @@ class HammerTool(metaclass=ABCMeta):
         Internal helper function to set the environment variables for
         self.run_executable().
         """
-        env = os.environ.copy()
-        # Add HAMMER_DATABASE to the environment for the script.
-        env.update({"HAMMER_DATABASE": self.dump_database()})
-        env.update(self.env_vars)
-        return env
+        # Add HAMMER_DATABASE (and HAMMER_COMPILED_DATABASE) to the environment for the script.
+        database_path = self.dump_database()
+        env_vars = dict(self.env_vars)
+        compiled_path = self.attr_getter("_dumped_compiled_database", "")  # type: Optional[str]
+        if compiled_path is not None:
+            env_vars["HAMMER_COMPILED_DATABASE"] = compiled_path
+        # Reuse the environment of the previous subprocess if nothing changed since.
+        # (database path, env_vars, os.environ, resulting environment)
+        cached = self.attr_getter("_subprocess_env_cache", ("", {}, {}, {}))  # type: Tuple[str, dict, dict, dict]
+        if cached[0] != database_path or cached[1] != env_vars or cached[2] != os.environ:
+            base_env = os.environ.copy()
+            env = dict(base_env)
+            # Don't pass on the compiled database of an enclosing hammer run.
+            env.pop("HAMMER_COMPILED_DATABASE", None)
+            env.update({"HAMMER_DATABASE": database_path})
+            env.update(env_vars)
+            cached = (database_path, dict(env_vars), base_env, env)
+            self.attr_setter("_subprocess_env_cache", cached)
+        return dict(cached[3])
 
     # Properties.
     @property
@@ -294,6 +381,30 @@ class HammerTool(metaclass=ABCMeta):
     def technology(self, value: hammer_tech.HammerTechnology) -> None:
         """Set the HammerTechnology currently in use."""
         self._technology = value  # type: hammer_tech.HammerTechnology
+        # Memoized accessors might depend on the technology.
+        # Map of (accessor name, args) -> (database version, settings read, result); see _get_memoized.
+        self._memoized = {}  # type: Dict[Tuple[str, tuple], Tuple[int, Dict[str, Any], Any]]
+
+    @property
+    def setting_tracer(self) -> Optional[hammer_config.SettingAccessTracer]:
+        """
+        Get the tracer which records the settings read by each step, if any (see vlsi.core.trace_setting_accesses).
+
+        :return: SettingAccessTracer instance, or None if setting accesses are not being traced.
+        """
+        try:
+            return self._setting_tracer
+        except AttributeError:
+            return None
+
+    @setting_tracer.setter
+    def setting_tracer(self, value: Optional[hammer_config.SettingAccessTracer]) -> None:
+        """Set the tracer which records the settings read by each step. It is also used by the technology."""
+        self._setting_tracer = value  # type: Optional[hammer_config.SettingAccessTracer]
+        try:
+            self.technology.setting_tracer = value
+        except ValueError:
+            pass
 
     @property
     def submit_command(self) -> HammerSubmitCommand:
@@ -453,6 +564,14 @@ class HammerTool(metaclass=ABCMeta):
         # Run steps.
         prev_step = None  # type: Optional[HammerToolStep]
 
+        step_cache = self._open_step_cache()
+        # Fingerprint of the last step which ran, or None if the state of the run_dir is unknown
+        # (e.g. because a step was skipped), in which case the step cache can't be used anymore.
+        fingerprint = ""  # type: Optional[str]
+        cache_hits = 0
+        cache_misses = 0
+        tracer = self.setting_tracer
+
         for step_index in range(len(new_steps)):
             step = new_steps[step_index]
 
@@ -474,24 +593,41 @@ class HammerTool(metaclass=ABCMeta):
                     self.logger.info("Sub-step '{step}' skipped due to resume hook".format(step=step.name))
                     do_step = False
 
+            if not do_step:
+                fingerprint = None
+
             if do_step:
-                try:
-                    if prev_step is None:
-                        # Run pre-step hook.
-                        self.do_pre_steps(step)
-                    else:
-                        # TODO: find a cleaner way of detecting a pause hook
-                        if step.name == "pause":
-                            # Don't include "pause" for do_between_steps
-                            if step_index + 1 < len(new_steps):
-                                self.do_between_steps(prev_step, new_steps[step_index + 1])
+                if tracer is not None:
+                    # Reads made while preparing for a step are attributed to it.
+                    tracer.current_step = step.name
+                with HammerTrace.span(step.name, "step", tool=type(self).__name__):
+                    try:
+                        if prev_step is None:
+                            # Run pre-step hook.
+                            self.do_pre_steps(step)
                         else:
-                            self.do_between_steps(prev_step, step)
-                    func_out = step.func(self)  # type: bool
-                    prev_step = step
-                except HammerToolPauseException:
-                    self.logger.info("Sub-step '{step}' paused the tool execution".format(step=step.name))
-                    break
+                            # TODO: find a cleaner way of detecting a pause hook
+                            if step.name == "pause":
+                                # Don't include "pause" for do_between_steps
+                                if step_index + 1 < len(new_steps):
+                                    self.do_between_steps(prev_step, new_steps[step_index + 1])
+                            else:
+                                self.do_between_steps(prev_step, step)
+                        if step_cache is not None and fingerprint is not None and step.name != "pause":
+                            func_out, fingerprint, hit = self._run_step_cached(step, step_cache, fingerprint)
+                            if hit:
+                                cache_hits += 1
+                            else:
+                                cache_misses += 1
+                        else:
+                            func_out = step.func(self)
+                        prev_step = step
+                    except HammerToolPauseException:
+                        self.logger.info("Sub-step '{step}' paused the tool execution".format(step=step.name))
+                        break
+                    finally:
+                        if tracer is not None:
+                            tracer.current_step = None
                 assert isinstance(func_out, bool)
                 if not func_out:
                     return False
@@ -501,11 +637,117 @@ class HammerTool(metaclass=ABCMeta):
                     self.logger.info("Resuming after '{step}' due to resume hook".format(step=step.name))
                     resume_step = None
 
+        if step_cache is not None:
+            self.logger.info("Step cache: {hits} hit(s), {misses} miss(es)".format(hits=cache_hits, misses=cache_misses))
+
         # Run post-steps hook.
         self.do_post_steps()
 
         return True
 
+    def get_step_cache_state(self) -> Any:
+        """
+        Get the in-memory state that the steps of this tool pass to each other (e.g. an accumulated script), to be
+        recorded in the step cache (see vlsi.core.step_cache).
+        Intended to be overridden by subclasses whose steps don't only communicate through settings and run_dir files.
+
+        :return: JSON-serializable state of the tool after the last step.
+        """
+        return None
+
+    def set_step_cache_state(self, state: Any) -> None:
+        """
+        Restore the in-memory state of the tool from the step cache (see get_step_cache_state).
+
+        :param state: State returned by get_step_cache_state after the step which is being restored.
+        """
+        pass
+
+    def _open_step_cache(self) -> Optional[StepCache]:
+        """Get the step cache for this tool, or None if vlsi.core.step_cache is disabled."""
+        if not self._get_optional_flag("vlsi.core.step_cache"):
+            return None
+        path = self.get_setting("vlsi.core.step_cache_dir")
+        if path is None:
+            path = os.path.join(os.path.dirname(self.run_dir), "step-cache")
+        step_cache = self.attr_getter("_step_cache", StepCache(path))  # type: StepCache
+        if step_cache.path != path:
+            step_cache = StepCache(path)
+            self.attr_setter("_step_cache", step_cache)
+        return step_cache
+
+    def _step_cache_key(self, step: HammerToolStep, step_cache: StepCache, previous: str) -> str:
+        """
+        Get the hash of everything known about a step before running it: the tool and its version, the code of the
+        step, the contents of the input files and the fingerprint of the previous step.
+        Settings read through the technology and files named by settings are not included (see vlsi.core.step_cache).
+        """
+        version_key = self.tool_config_prefix() + ".version"
+        try:
+            input_files = list(self.input_files)
+        except ValueError:
+            input_files = []
+        try:
+            source = inspect.getsourcefile(type(self))
+        except TypeError:
+            source = None
+        description = {
+            "tool": "{module}.{cls}".format(module=type(self).__module__, cls=type(self).__qualname__),
+            "version": self._database.get_setting(version_key) if self._database.has_setting(version_key) else None,
+            "source": step_cache.hash_file(source) if source is not None else None,
+            "step": step.name,
+            "function": _step_function_fingerprint(step.func),
+            "inputs": [(path, step_cache.hash_file(path)) for path in input_files],
+            "previous": previous
+        }
+        return hammer_config.hash_setting_value(description)
+
+    def _run_step_cached(self, step: HammerToolStep, step_cache: StepCache, previous: str) -> Tuple[bool, Optional[str], bool]:
+        """
+        Run the given step, or restore its result from the step cache if nothing it depends on has changed since it
+        last ran.
+
+        :param step: Step to run.
+        :param step_cache: Step cache to use.
+        :param previous: Fingerprint of the previous step.
+        :return: Tuple of (whether the step was successful, fingerprint of the step or None if it couldn't be cached,
+                 whether it was restored from the cache).
+        """
+        key = self._step_cache_key(step, step_cache, previous)
+        entry = step_cache.lookup(key, lambda setting: hammer_config.setting_hash(self._database, setting))
+        if entry is not None:
+            restored = step_cache.restore(entry, self.run_dir)
+            for setting, value in entry.writes:
+                self.set_setting(setting, value)
+            self.set_step_cache_state(entry.state)
+            tracer = self.setting_tracer
+            if tracer is not None:
+                for setting, value_hash in entry.reads.items():
+                    tracer.record_hash(setting, value_hash)
+            self.logger.info("Sub-step '{step}' restored from step cache ({n} file(s) restored)".format(
+                step=step.name, n=restored))
+            return True, entry.fingerprint, True
+
+        self.logger.info("Sub-step '{step}' not found in step cache".format(step=step.name))
+        setting_reads = self.attr_getter("_setting_reads", [])  # type: List[Dict[str, Any]]
+        setting_writes = self.attr_getter("_setting_writes", [])  # type: List[List[Tuple[str, Any]]]
+        setting_reads.append({})
+        setting_writes.append([])
+        try:
+            func_out = step.func(self)  # type: bool
+        finally:
+            reads = setting_reads.pop()
+            writes = setting_writes.pop()
+        if not func_out:
+            return False, None, False
+        read_hashes = {setting: hammer_config.hash_setting_value(value) for setting, value in reads.items()}
+        try:
+            entry = step_cache.store(key, read_hashes, writes, self.get_step_cache_state(), self.run_dir)
+        except (TypeError, ValueError, OSError) as e:
+            self.logger.warning("Could not store sub-step '{step}' in step cache: {err}".format(step=step.name, err=e))
+            return True, None, False
+        return True, entry.fingerprint, False
+
     @staticmethod
     def make_step_from_method(func: Callable[[], bool], name: str = "") -> HammerToolStep:
         """
@@ -690,14 +932,31 @@ class HammerTool(metaclass=ABCMeta):
     def set_database(self, database: hammer_config.HammerDatabase) -> None:
         """Set the settings database for use by the tool."""
         self._database = database # type: hammer_config.HammerDatabase
+        self._memoized = {}
 
     def dump_database(self) -> str:
         """Dump the current database JSON in a temporary file in the run_dir and return the path.
+        The file is only rewritten (atomically) when the database changed since it was last dumped.
         """
         path = os.path.join(self.run_dir, "config_db_tmp.json")
-        db_contents = self._database.get_database_json()
-        with open(path, 'w') as f:
+        database = self._database
+        # (path, database, database version) of the last dump.
+        key = (path, id(database), database.version)
+        if self.attr_getter("_dumped_database", ("", 0, 0)) == key and os.path.exists(path):
+            return path
+
+        db_contents = database.get_database_json(compact=self._get_optional_flag("vlsi.core.compact_database_dump"))
+        tmp_path = "{path}.{pid}.tmp".format(path=path, pid=os.getpid())
+        with open(tmp_path, 'w') as f:
             f.write(db_contents)
+        os.replace(tmp_path, path)
+
+        compiled_path = None  # type: Optional[str]
+        if self._get_optional_flag("vlsi.core.compiled_database_dump"):
+            compiled_path = os.path.join(self.run_dir, "config_db_tmp.db")
+            database.write_compiled(compiled_path)
+        self.attr_setter("_dumped_compiled_database", compiled_path)
+        self.attr_setter("_dumped_database", key)
         return path
 
     @property
@@ -722,15 +981,94 @@ class HammerTool(metaclass=ABCMeta):
         :param nullvalue: Value to return in case of null (leave as None to use the default).
         """
         try:
-            return self._database.get_setting(key, nullvalue)
+            value = self._database.get_setting(key)
+        except AttributeError:
+            raise ValueError("Internal error: no database set by hammer-vlsi")
+        for reads in self.attr_getter("_setting_reads", []):
+            reads[key] = value
+        tracer = self.setting_tracer
+        if tracer is not None:
+            tracer.record_get(key, value)
+        return nullvalue if value is None else value
+
+    def has_setting(self, key: str) -> bool:
+        """
+        Check if a particular setting exists in the database.
+
+        :param key: Key of the setting to check.
+        """
+        try:
+            database = self._database
         except AttributeError:
             raise ValueError("Internal error: no database set by hammer-vlsi")
+        tracer = self.setting_tracer
+        if tracer is not None:
+            tracer.record_has(database, key)
+        return database.has_setting(key)
+
+    def _get_optional_flag(self, key: str) -> bool:
+        """
+        Get a boolean setting which might not exist in the database (e.g. when
+        the hammer-vlsi defaults are not loaded). Missing settings are False.
+
+        :param key: Key of the setting to receive.
+        """
+        return self.has_setting(key) and bool(self.get_setting(key))
+
+    def _get_memoized(self, name: str, args: tuple, compute: Callable[[], Any]) -> Any:
+        """
+        Get the memoized result of an accessor (see memoized_accessor), or
+        compute it if any of the settings it read last time have changed.
+
+        :param name: Name of the accessor.
+        :param args: Arguments to the accessor.
+        :param compute: Function which computes the result of the accessor.
+        :return: Result of the accessor.
+        """
+        try:
+            database = self._database
+        except AttributeError:
+            raise ValueError("Internal error: no database set by hammer-vlsi")
+        # Map of (accessor name, args) -> (database version, settings read, result).
+        memoized = self.attr_getter("_memoized", {})  # type: Dict[Tuple[str, tuple], Tuple[int, Dict[str, Any], Any]]
+        # Settings read by each accessor currently being computed.
+        setting_reads = self.attr_getter("_setting_reads", [])  # type: List[Dict[str, Any]]
+
+        entry = memoized.get((name, args))
+        if entry is not None:
+            version, reads, result = entry
+            if version != database.version:
+                # Something changed, but maybe not something we depend on.
+                config = database.get_config()
+                missing = object()
+                if all(config.get(key, missing) == value for key, value in reads.items()):
+                    memoized[(name, args)] = (database.version, reads, result)
+                else:
+                    entry = None
+        if entry is None:
+            setting_reads.append({})
+            try:
+                result = compute()
+            finally:
+                reads = setting_reads.pop()
+            memoized[(name, args)] = (database.version, reads, result)
+
+        # Accessors calling other accessors depend on the same settings.
+        for outer_reads in setting_reads:
+            outer_reads.update(reads)
+        tracer = self.setting_tracer
+        if tracer is not None:
+            for key, value in reads.items():
+                tracer.record_get(key, value)
+        return result
 
     def set_setting(self, key: str, value: Any) -> None:
         """
         Set a runtime setting in the database.
         """
         self._database.set_setting(key, value)
+        for writes in self.attr_getter("_setting_writes", []):
+            writes.append((key, value))
 
     def create_enter_script(self, enter_script_location: str = "", raw: bool = False) -> None:
         """
@@ -780,22 +1118,10 @@ class HammerTool(metaclass=ABCMeta):
     def filter_for_mmmc(self, voltage: VoltageValue, temp: TemperatureValue) -> Callable[[hammer_tech.Library],bool]:
         """
         Selecting libraries that match given temp and voltage.
+        The libraries are looked up in the library index, bucketed by corner.
         """
-        def extraction_func(lib: hammer_tech.Library) -> bool:
-            if lib.corner is None or lib.corner.temperature is None:
-                return False
-            if lib.supplies is None or lib.supplies.VDD is None:
-                return False
-            lib_temperature = TemperatureValue(str(lib.corner.temperature))
-            lib_VDD = VoltageValue(str(lib.supplies.VDD))
-            if lib_temperature == temp:
-                if lib_VDD == voltage:
-                    return True
-                else:
-                    return False
-            else:
-                return False
-        return extraction_func
+        return hammer_tech.indexed_library_filter("mmmc_corner", _mmmc_corner_key,
+                                                  _mmmc_corner_value(temp, voltage))
 
     @staticmethod
     def replace_tcl_set(variable: str, value: str, tcl_path: str, quotes: bool = True) -> None:
@@ -826,18 +1152,37 @@ class HammerTool(metaclass=ABCMeta):
             f.write(new_tcl_contents)
 
     # TODO(edwardw): consider pulling this out so that hammer_tech can also use this
-    def run_executable(self, args: List[str], cwd: str = None) -> str:
+    def run_executable(self, args: List[str], cwd: Optional[str] = None,
+                       line_consumers: List[Callable[[str], None]] = []) -> str:
         """
         Run an executable and log the command to the log while also capturing the output.
 
         :param args: Command-line to run; each item in the list is one token. The first token should be the command to run.
         :param cwd: Working directory (leave as None to use the current working directory).
+        :param line_consumers: Functions called with every line of output as soon as it arrives (e.g. error scanners).
         :return: Output from the command or an error message.
         """
 
-        return self.submit_command.submit(args, self._subprocess_env, self.logger, cwd)
+        with HammerTrace.span(os.path.basename(args[0]), "subprocess", args=args, tool=type(self).__name__):
+            return self.submit_command.submit(args, self._subprocess_env, self.logger, cwd, line_consumers)
+
+    def run_executable_async(self, args: List[str], cwd: Optional[str] = None,
+                             line_consumers: List[Callable[[str], None]] = []) -> HammerSubmitJob:
+        """
+        Run an executable in the background (e.g. to overlap independent jobs) and log its output.
+
+        :param args: Command-line to run; each item in the list is one token. The first token should be the command to run.
+        :param cwd: Working directory (leave as None to use the current working directory).
+        :param line_consumers: Functions called with every line of output as soon as it arrives (e.g. error scanners).
+        :return: Handle to the running job.
+        """
+
+        job = self.submit_command.submit_async(args, self._subprocess_env, self.logger, cwd, line_consumers)
+        job.set_trace_span(HammerTrace.span(os.path.basename(args[0]), "subprocess", args=args, tool=type(self).__name__))
+        return job
 
     # TODO: these helper functions might get a bit out of hand, put them somewhere more organized?
+    @memoized_accessor
     def get_clock_ports(self) -> List[ClockPort]:
         """
         Get the clock ports of the top-level module, as specified in vlsi.inputs.clocks.
@@ -865,6 +1210,7 @@ class HammerTool(metaclass=ABCMeta):
             output.append(clock)
         return output
 
+    @memoized_accessor
     def get_all_supplies(self, key: str) -> List[Supply]:
         supplies = self.get_setting(key)
         output = []  # type: List[Supply]
@@ -891,6 +1237,7 @@ class HammerTool(metaclass=ABCMeta):
     def get_independent_ground_nets(self) -> List[Supply]:
         return list(filter(lambda x: x.tie is None, self.get_all_ground_nets()))
 
+    @memoized_accessor
     def get_bumps(self) -> Optional[BumpsDefinition]:
         bumps_mode = self.get_setting("vlsi.inputs.bumps_mode")
         if bumps_mode == "empty":
@@ -917,6 +1264,7 @@ class HammerTool(metaclass=ABCMeta):
             pitch=self.get_setting("vlsi.inputs.bumps.pitch"),
             cell=self.get_setting("vlsi.inputs.bumps.cell"), assignments=assignments)
 
+    @memoized_accessor
     def get_pin_assignments(self) -> List[PinAssignment]:
         """
         Get a list of pin assignments in accordance with settings in the Hammer IR.
@@ -1035,6 +1383,7 @@ class HammerTool(metaclass=ABCMeta):
 
         return dont_use_list
 
+    @memoized_accessor
     def get_placement_constraints(self) -> List[PlacementConstraint]:
         """
         Get a list of placement constraints as specified in the config.
@@ -1043,6 +1392,7 @@ class HammerTool(metaclass=ABCMeta):
         assert isinstance(constraints, list)
         return list(map(PlacementConstraint.from_dict, constraints))
 
+    @memoized_accessor
     def get_mmmc_corners(self) -> List[MMMCCorner]:
         """
         Get a list of MMMC corners as specified in the config.
@@ -1060,13 +1410,14 @@ class HammerTool(metaclass=ABCMeta):
             output.append(corn)
         return output
 
+    @memoized_accessor
     def get_stackup(self) -> Stackup:
         """
         Get the stackup provided by the technology key
         """
-        # TODO how does python cache this? Do we need to avoid re-processing this every time?
         return self.technology.get_stackup_by_name(self.get_setting("technology.core.stackup"))
 
+    @memoized_accessor
     def get_input_ilms(self) -> List[ILMStruct]:
         """
         Get a list of input ILM modules for hierarchical mode.
@@ -1075,6 +1426,7 @@ class HammerTool(metaclass=ABCMeta):
         assert isinstance(ilms, list)
         return list(map(ILMStruct.from_setting, ilms))
 
+    @memoized_accessor
     def get_output_load_constraints(self) -> List[OutputLoadConstraint]:
         """
         Get a list of output load constraints as specified in the config.
@@ -1089,6 +1441,7 @@ class HammerTool(metaclass=ABCMeta):
             output.append(load)
         return output
 
+    @memoized_accessor
     def get_delay_constraints(self) -> List[DelayConstraint]:
         """
         Get a list of input and output delay constraints as specified in
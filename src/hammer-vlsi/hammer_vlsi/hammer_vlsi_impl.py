@@ -13,7 +13,6 @@ import importlib
 from numbers import Number
 import os
 import sys
-import json
 from typing import Callable, Iterable, List, NamedTuple, Optional, Dict, Any, Union
 from decimal import Decimal
 
@@ -194,15 +193,7 @@ class HammerSRAMGeneratorTool(HammerTool):
 
     def export_config_outputs(self) -> Dict[str, Any]:
         outputs = deepdict(super().export_config_outputs())
-        simple_ex = []
-        for ex in self.output_libraries: # type: ExtraLibrary
-            simple_lib = json.loads(ex.library.serialize())
-            if(ex.prefix == None):
-                new_ex = {"library": simple_lib}
-            else:
-                new_ex = {"prefix": ex.prefix, "library": simple_lib}
-            simple_ex.append(new_ex)
-        outputs["vlsi.technology.extra_libraries"] = simple_ex
+        outputs["vlsi.technology.extra_libraries"] = list(map(lambda ex: ex.to_setting(), self.output_libraries))
         outputs["vlsi.technology.extra_libraries_meta"] = "append"
         return outputs
 
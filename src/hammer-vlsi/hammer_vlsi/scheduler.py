@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  scheduler.py
+#  Scheduler which runs the modules of a hierarchical flow concurrently.
+#
+#  See LICENSE for licence details.
+
+import os
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, TYPE_CHECKING, cast
+
+from hammer_logging import HammerVLSILogging, HammerVLSILoggingContext
+
+# multiprocessing is only imported when a hierarchical flow is run, to keep hammer-vlsi startup fast.
+if TYPE_CHECKING:
+    import multiprocessing.connection  # pylint: disable=unused-import
+
+__all__ = ['HierarchicalScheduler']
+
+
+class HierarchicalScheduler:
+    """
+    Run the modules of a hierarchical flow in dependency order, running
+    independent modules (e.g. sibling leaf modules) concurrently.
+
+    Every module runs in its own forked process, so it gets its own copy of
+    the driver and its settings database. A module is started as soon as all
+    of its sub-modules have finished successfully; if a module fails, the
+    modules which depend on it are skipped, but unrelated subtrees keep
+    running.
+    """
+
+    def __init__(self, order: List[str], dependencies: Dict[str, List[str]], max_jobs: int,
+                 logger: HammerVLSILoggingContext) -> None:
+        """
+        Create a new scheduler.
+
+        :param order: All modules, in an order in which they can be run serially (e.g. from
+                      HammerDriver.get_hierarchical_settings). Ready modules are started in this order.
+        :param dependencies: Dictionary of module -> sub-modules which must finish before it can start.
+        :param max_jobs: Maximum number of modules to run at once.
+        :param logger: Logger for progress messages.
+        """
+        if max_jobs < 1:
+            raise ValueError("max_jobs must be at least 1")
+        self.order = list(order)  # type: List[str]
+        self.dependencies = {module: list(dependencies.get(module, [])) for module in order}  # type: Dict[str, List[str]]
+        self.max_jobs = max_jobs  # type: int
+        self.logger = logger  # type: HammerVLSILoggingContext
+
+    def descendants(self, module: str) -> List[str]:
+        """
+        Get all (transitive) sub-modules of the given module, in run order.
+
+        :param module: Module to get the sub-modules of.
+        :return: List of sub-modules.
+        """
+        found = set()  # type: Set[str]
+        stack = list(self.dependencies.get(module, []))
+        while len(stack) > 0:
+            m = stack.pop()
+            if m not in found:
+                found.add(m)
+                stack.extend(self.dependencies.get(m, []))
+        return [m for m in self.order if m in found]
+
+    @staticmethod
+    def _run_child(func: Callable[[str], Optional[dict]], module: str,
+                   conn: "multiprocessing.connection.Connection") -> None:
+        """Run a module in the child process and send back its output (or None if it failed)."""
+        try:
+            result = func(module)  # type: Optional[dict]
+            conn.send((result, None))
+        except BaseException:  # pylint: disable=broad-except
+            conn.send((None, traceback.format_exc()))
+        finally:
+            # The child exits without running atexit handlers, so write out any asynchronously queued messages now.
+            HammerVLSILogging.flush()
+            conn.close()
+
+    def run(self, run_func: Callable[[str], Optional[dict]],
+            pre_fork_func: Callable[[str], Any] = lambda module: None,
+            post_fork_func: Callable[[str, Any], None] = lambda module, state: None,
+            done_func: Callable[[str, dict], None] = lambda module, output: None) -> Dict[str, Optional[dict]]:
+        """
+        Run all modules.
+
+        :param run_func: Function which runs a module in its child process and returns its output config, or None if
+                         it failed.
+        :param pre_fork_func: Function called in this process right before forking the process for a module (e.g. to
+                              give it the ILMs of its sub-modules). Its return value is passed to post_fork_func.
+        :param post_fork_func: Function called in this process right after forking the process for a module (e.g. to
+                               undo the changes made by pre_fork_func).
+        :param done_func: Function called in this process with the output of each module which finished successfully.
+        :return: Dictionary of module -> output config, or None if the module failed or was skipped.
+        """
+        import multiprocessing
+        import multiprocessing.connection
+
+        ctx = multiprocessing.get_context("fork")
+        pending = list(self.order)  # type: List[str]
+        running = {}  # type: Dict[multiprocessing.connection.Connection, Tuple[str, Any]]
+        results = {}  # type: Dict[str, Optional[dict]]
+
+        while len(pending) > 0 or len(running) > 0:
+            # Skip modules whose sub-modules failed, and start modules whose sub-modules are all done.
+            for module in list(pending):
+                deps = self.dependencies[module]
+                if any(results.get(d, {}) is None for d in deps):
+                    self.logger.error("Skipping hierarchical run for module {module} since one of its sub-modules failed".format(
+                        module=module))
+                    pending.remove(module)
+                    results[module] = None
+                elif len(running) < self.max_jobs and all(results.get(d) is not None for d in deps):
+                    pending.remove(module)
+                    parent_conn, child_conn = ctx.Pipe(duplex=False)
+                    state = pre_fork_func(module)
+                    try:
+                        process = ctx.Process(target=self._run_child, args=(run_func, module, child_conn),
+                                              name="hammer-" + module)
+                        process.start()
+                    finally:
+                        post_fork_func(module, state)
+                    child_conn.close()
+                    running[parent_conn] = (module, process)
+                    self.logger.info("Started hierarchical run for module {module} (pid {pid})".format(
+                        module=module, pid=process.pid))
+
+            if len(running) == 0:
+                if len(pending) > 0:
+                    raise ValueError("Hierarchical modules {modules} can never run".format(modules=", ".join(pending)))
+                break
+
+            for ready in multiprocessing.connection.wait(list(running.keys())):
+                conn = cast(multiprocessing.connection.Connection, ready)
+                module, process = running.pop(conn)
+                output = None  # type: Optional[dict]
+                error = None  # type: Optional[str]
+                try:
+                    output, error = conn.recv()
+                except EOFError:
+                    error = "Process exited without a result"
+                conn.close()
+                process.join()
+                results[module] = output
+                if output is None:
+                    self.logger.error("Hierarchical run for module {module} failed{error}".format(
+                        module=module, error="" if error is None else ":{sep}{error}".format(sep=os.linesep, error=error)))
+                else:
+                    self.logger.info("Hierarchical run for module {module} finished".format(module=module))
+                    done_func(module, output)
+
+        return results
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  step_cache.py
+#  Content-addressed cache of the results of HammerTool steps.
+#
+#  See LICENSE for licence details.
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import tempfile
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from hammer_config import hash_setting_value
+
+__all__ = ['StepCache', 'StepCacheEntry']
+
+# Size of the chunks in which files are read and hashed.
+_CHUNK_SIZE = 1024 * 1024
+
+# Maximum number of entries (i.e. different sets of setting values) kept for each step.
+_MAX_ENTRIES_PER_STEP = 8
+
+
+# Struct that holds the cached result of a step.
+class StepCacheEntry(NamedTuple('StepCacheEntry', [
+    # Fingerprint of the step, which depends on the fingerprints of all the steps before it.
+    ('fingerprint', str),
+    # Map of setting key -> hash of the value the step read.
+    ('reads', Dict[str, str]),
+    # Runtime settings the step set, in order.
+    ('writes', List[Tuple[str, Any]]),
+    # Tool-specific state after the step (see HammerTool.get_step_cache_state).
+    ('state', Any),
+    # Map of path relative to the run_dir -> (content hash, mode) of every file in the run_dir after the step.
+    ('files', Dict[str, Tuple[str, int]]),
+    # Map of path relative to the run_dir -> target of every symlink in the run_dir after the step.
+    ('links', Dict[str, str])
+])):
+    __slots__ = ()
+
+    @staticmethod
+    def from_dict(d: dict) -> "StepCacheEntry":
+        return StepCacheEntry(
+            fingerprint=str(d["fingerprint"]),
+            reads=dict(d["reads"]),
+            writes=[(str(key), value) for key, value in d["writes"]],
+            state=d["state"],
+            files={path: (str(h), int(mode)) for path, (h, mode) in d["files"].items()},
+            links={path: str(target) for path, target in d["links"].items()}
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "reads": self.reads,
+            "writes": [list(w) for w in self.writes],
+            "state": self.state,
+            "files": {path: list(v) for path, v in self.files.items()},
+            "links": self.links
+        }
+
+
+class StepCache:
+    """
+    Content-addressed store of the results of HammerTool steps.
+
+    Every file is stored once under objects/ by the hash of its contents; every step has an index file under steps/
+    (named by the hash of everything known about the step before it runs: the tool, the step, its input files and the
+    fingerprint of the previous step) which lists the results of the step for the different values of the settings
+    it read.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open (or create) a step cache.
+
+        :param path: Directory of the cache.
+        """
+        self.path = path  # type: str
+        # Map of path -> ((size, mtime, inode), hash) of files hashed so far.
+        self._file_hashes = {}  # type: Dict[str, Tuple[Tuple[int, int, int], str]]
+        # Map of run_dir file path -> ((size, mtime, inode), hash) of files whose contents are known to be in the
+        # store, so that files which didn't change since the previous step are neither hashed nor copied again.
+        self._stored_files = {}  # type: Dict[str, Tuple[Tuple[int, int, int], str]]
+
+    def hash_file(self, path: str) -> str:
+        """
+        Get the hash of the contents of the given file.
+        Hashes are remembered until the file's size or mtime changes.
+
+        :param path: Path to the file.
+        :return: Hash of the file, or a placeholder if it doesn't exist or is not a regular file.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return "missing"
+        if not stat.S_ISREG(st.st_mode):
+            return "not a file"
+        key = (st.st_size, st.st_mtime_ns, st.st_ino)
+        cached = self._file_hashes.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        self._file_hashes[path] = (key, digest)
+        return digest
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self.path, "steps", key + ".json")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.path, "objects", digest[:2], digest)
+
+    def _read_index(self, key: str) -> List[StepCacheEntry]:
+        try:
+            with open(self._index_path(key), "r") as f:
+                return [StepCacheEntry.from_dict(d) for d in json.loads(f.read())]
+        except (OSError, ValueError, KeyError, TypeError):
+            return []
+
+    def _write_atomically(self, path: str, write_func: Callable[[str], Any]) -> None:
+        """
+        Write the given file through a temporary file, so that readers never see a partial file.
+
+        :param path: Path of the file to write.
+        :param write_func: Function which writes the contents to the given temporary path. Its return value is ignored.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        os.close(fd)
+        try:
+            write_func(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def lookup(self, key: str, get_value_hash: Callable[[str], str]) -> Optional[StepCacheEntry]:
+        """
+        Find a result of the given step whose settings still have the same values.
+
+        :param key: Hash of everything known about the step before it runs.
+        :param get_value_hash: Function which returns the hash of the current value of the given setting.
+        :return: The cached result, or None if there is none.
+        """
+        for entry in self._read_index(key):
+            if all(get_value_hash(setting) == h for setting, h in entry.reads.items()) \
+                    and all(os.path.exists(self._object_path(h)) for h, mode in entry.files.values()):
+                return entry
+        return None
+
+    def store(self, key: str, reads: Dict[str, str], writes: List[Tuple[str, Any]], state: Any,
+              run_dir: str) -> StepCacheEntry:
+        """
+        Record the result of a step which just ran.
+        Only files whose size or mtime changed since the previous step (or restore) are hashed and copied.
+
+        :param key: Hash of everything known about the step before it ran.
+        :param reads: Map of setting key -> hash of the value the step read.
+        :param writes: Runtime settings the step set, in order.
+        :param state: Tool-specific state after the step. Must be serializable to JSON.
+        :param run_dir: Run directory of the tool, whose contents are stored.
+        :return: The stored result.
+        """
+        files = {}  # type: Dict[str, Tuple[str, int]]
+        links = {}  # type: Dict[str, str]
+        for dirpath, dirnames, filenames in os.walk(run_dir):
+            dirnames.sort()
+            # os.walk lists symlinks to directories as directories (without following them).
+            for name in sorted(dirnames + filenames):
+                full_path = os.path.join(dirpath, name)
+                st = os.lstat(full_path)
+                if stat.S_ISLNK(st.st_mode):
+                    links[os.path.relpath(full_path, run_dir)] = os.readlink(full_path)
+                    continue
+                if not stat.S_ISREG(st.st_mode):
+                    continue
+                stat_key = (st.st_size, st.st_mtime_ns, st.st_ino)
+                stored = self._stored_files.get(full_path)
+                if stored is not None and stored[0] == stat_key:
+                    digest = stored[1]
+                else:
+                    digest = self.hash_file(full_path)
+                    object_path = self._object_path(digest)
+                    if not os.path.exists(object_path):
+                        self._write_atomically(object_path, lambda tmp_path: shutil.copyfile(full_path, tmp_path))
+                    self._stored_files[full_path] = (stat_key, digest)
+                files[os.path.relpath(full_path, run_dir)] = (digest, stat.S_IMODE(st.st_mode))
+
+        fingerprint = hash_setting_value([key, sorted(reads.items())])
+        entry = StepCacheEntry(fingerprint=fingerprint, reads=reads, writes=writes, state=state, files=files,
+                               links=links)
+        entries = [entry] + [e for e in self._read_index(key) if e.fingerprint != fingerprint]
+
+        def write_index(tmp_path: str) -> None:
+            with open(tmp_path, "w") as f:
+                f.write(json.dumps([e.to_dict() for e in entries[:_MAX_ENTRIES_PER_STEP]]))
+
+        self._write_atomically(self._index_path(key), write_index)
+        return entry
+
+    def restore(self, entry: StepCacheEntry, run_dir: str) -> int:
+        """
+        Restore the run_dir files and symlinks recorded in the given result.
+        Files which already have the right contents are left alone; other files in the run_dir are not touched.
+
+        :param entry: Cached result of a step.
+        :param run_dir: Run directory of the tool.
+        :return: Number of files and symlinks which had to be restored.
+        """
+        restored = 0
+        for rel_path, (digest, mode) in sorted(entry.files.items()):
+            path = os.path.join(run_dir, rel_path)
+            if os.path.isfile(path) and not os.path.islink(path) and self.hash_file(path) == digest:
+                if stat.S_IMODE(os.stat(path).st_mode) != mode:
+                    os.chmod(path, mode)
+            else:
+                if os.path.lexists(path) and not os.path.isdir(path):
+                    os.remove(path)
+                object_path = self._object_path(digest)
+                self._write_atomically(path, lambda tmp_path: shutil.copyfile(object_path, tmp_path))
+                os.chmod(path, mode)
+                restored += 1
+            st = os.lstat(path)
+            self._stored_files[path] = ((st.st_size, st.st_mtime_ns, st.st_ino), digest)
+        for rel_path, target in sorted(entry.links.items()):
+            path = os.path.join(run_dir, rel_path)
+            if os.path.islink(path):
+                if os.readlink(path) == target:
+                    continue
+                os.remove(path)
+            elif os.path.lexists(path) and not os.path.isdir(path):
+                os.remove(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.symlink(target, path)
+            restored += 1
+        return restored
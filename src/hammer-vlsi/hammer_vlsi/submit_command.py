@@ -9,25 +9,188 @@
 # pylint: disable=bad-continuation
 
 import atexit
+import itertools
+import os
+import re
 import subprocess
 import datetime
-from abc import abstractmethod
+import threading
+import time
+from abc import ABCMeta, abstractmethod
 from functools import reduce
-from typing import Any, Dict, List, NamedTuple, Optional
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional
 
 from hammer_config import HammerDatabase
-from hammer_logging import HammerVLSILoggingContext
+from hammer_logging import HammerVLSILoggingContext, TraceSpan
 from hammer_utils import add_dicts, get_or_else
 
-__all__ = ['HammerSubmitCommand', 'HammerLocalSubmitCommand',
-           'HammerLSFSettings', 'HammerLSFSubmitCommand']
+from .subprocess_output import RateLimitedLogMirror, SubprocessOutput, read_output_lines
+
+__all__ = ['HammerSubmitJob', 'HammerSubmitCommand', 'HammerLocalSubmitJob', 'HammerLocalSubmitCommand',
+           'HammerLSFSettings', 'HammerLSFSubmitJob', 'HammerLSFSubmitCommand']
+
+
+class HammerSubmitJob(metaclass=ABCMeta):
+    """
+    Handle to a job submitted with HammerSubmitCommand.submit_async.
+    The job runs in the background; its output can be streamed with
+    output_lines() while it runs, or handed to line consumers as it arrives.
+    The caller owns the job: call close() once its output is no longer needed,
+    so that output spilled to a temporary file is deleted.
+    """
+
+    # Maximum number of characters of output kept in memory per job. Longer output is spilled to a temporary file.
+    max_output_memory = 16 * 1024 * 1024  # type: int
+
+    # Maximum number of lines of output per second printed on the console (None for no limit). The log file gets them all.
+    max_logged_lines_per_second = 1000  # type: Optional[int]
+
+    def __init__(self, line_consumers: List[Callable[[str], None]] = []) -> None:
+        """
+        :param line_consumers: Functions called with every line of output (including newlines) as soon as it
+                               arrives, e.g. to scan for errors or to parse progress. They are called on the
+                               thread which reads the output.
+        """
+        self._captured = SubprocessOutput(self.max_output_memory)
+        self._line_consumers = list(line_consumers)  # type: List[Callable[[str], None]]
+        self._finished = False  # type: bool
+        self._cancelled = False  # type: bool
+        self._returncode = None  # type: Optional[int]
+        self._exception = None  # type: Optional[BaseException]
+        self._cond = threading.Condition()
+        # Trace span of the job (see set_trace_span), and time.perf_counter() when it finished.
+        self._trace_span = None  # type: Optional[TraceSpan]
+        self._finish_time = None  # type: Optional[float]
+
+    def set_trace_span(self, span: TraceSpan) -> None:
+        """
+        Set the trace span which records the duration of this job. It is ended when the job finishes.
+
+        :param span: Span started when the job was submitted.
+        """
+        with self._cond:
+            self._trace_span = span
+            if self._finished:
+                span.end(self._finish_time, returncode=self._returncode)
+
+    def _append_output(self, lines: List[str]) -> None:
+        """Record lines of output, pass them to the line consumers and wake up anyone streaming the output."""
+        with self._cond:
+            self._captured.append(lines)
+            self._cond.notify_all()
+        for line in lines:
+            for consumer in self._line_consumers:
+                consumer(line)
+
+    def _finish(self, returncode: Optional[int], exception: Optional[BaseException] = None) -> None:
+        """Mark the job as finished."""
+        with self._cond:
+            self._returncode = returncode
+            self._exception = exception
+            self._finished = True
+            self._finish_time = time.perf_counter()
+            # End the span before waking up waiters, so that it is in the trace once wait() returns.
+            if self._trace_span is not None:
+                self._trace_span.end(self._finish_time, returncode=returncode)
+            self._cond.notify_all()
+
+    def _run_in_background(self, func: Callable[[], Optional[int]]) -> None:
+        """Run the given function (which returns the exit status of the job) on a background thread."""
+        def run() -> None:
+            try:
+                returncode = func()
+            except BaseException as e:  # pylint: disable=broad-except
+                self._finish(None, e)
+            else:
+                self._finish(returncode)
+        threading.Thread(target=run, daemon=True).start()
+
+    @property
+    def captured_output(self) -> SubprocessOutput:
+        """
+        Get the handle to the captured output of the job, which gives access to it without building one string
+        (e.g. get_lines() or tail()). It must only be used once the job is finished.
+        """
+        return self._captured
+
+    @property
+    def output(self) -> str:
+        """Get the output of the job so far."""
+        with self._cond:
+            return self._captured.text()
+
+    def output_lines(self) -> Iterator[str]:
+        """
+        Stream the output of the job, line by line (including newlines).
+        Blocks until more output is available and stops once the job is finished.
+        """
+        i = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: i < self._captured.line_count or self._finished)
+                if i >= self._captured.line_count:
+                    return
+                lines = self._captured.get_lines(i)
+                i = self._captured.line_count
+            for line in lines:
+                yield line
+
+    @property
+    def returncode(self) -> Optional[int]:
+        """Get the exit status of the job, or None if it is still running (or was cancelled before it started)."""
+        return self._returncode
+
+    @property
+    def cancelled(self) -> bool:
+        """Return True if cancel() was called on this job."""
+        return self._cancelled
+
+    def done(self) -> bool:
+        """Return True if the job is finished."""
+        return self._finished
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Wait for the job to finish.
+
+        :param timeout: Maximum number of seconds to wait (leave as None to wait indefinitely).
+        :return: The exit status of the job, or None if it is not finished yet.
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._finished, timeout)
+            if self._exception is not None:
+                raise self._exception
+            return self._returncode
+
+    def result(self) -> str:
+        """
+        Wait for the job to finish and get its output.
+
+        :return: The job output
+        """
+        self.wait()
+        return self.output
+
+    def close(self) -> None:
+        """
+        Release the captured output of the finished job (deleting any output spilled to a temporary file).
+        Only the output still in memory remains available afterwards.
+        """
+        with self._cond:
+            self._captured.close()
+
+    @abstractmethod
+    def cancel(self) -> None:
+        """Cancel the job, killing it if it is already running."""
+        pass
 
 
 class HammerSubmitCommand:
 
     @abstractmethod
     def submit(self, args: List[str], env: Dict[str, str],
-               logger: HammerVLSILoggingContext, cwd: str = None) -> str:
+               logger: HammerVLSILoggingContext, cwd: Optional[str] = None,
+               line_consumers: List[Callable[[str], None]] = []) -> str:
         """
         Submit the job to the job submission system. This function MUST block
         until the command is complete.
@@ -37,10 +200,29 @@ class HammerSubmitCommand:
         :param env: The environment variables to set for the command
         :param logger: The logging context
         :param cwd: Working directory (leave as None to use the current working directory).
+        :param line_consumers: Functions called with every line of output as soon as it arrives.
         :return: The command output
         """
         pass
 
+    @abstractmethod
+    def submit_async(self, args: List[str], env: Dict[str, str],
+                     logger: HammerVLSILoggingContext, cwd: Optional[str] = None,
+                     line_consumers: List[Callable[[str], None]] = []) -> HammerSubmitJob:
+        """
+        Submit the job to the job submission system without waiting for it to
+        complete, so that independent jobs can run concurrently.
+
+        :param args: Command-line to run; each item in the list is one token.
+                     The first token should be the command to run.
+        :param env: The environment variables to set for the command
+        :param logger: The logging context
+        :param cwd: Working directory (leave as None to use the current working directory).
+        :param line_consumers: Functions called with every line of output as soon as it arrives.
+        :return: Handle to the submitted job
+        """
+        pass
+
     @abstractmethod
     def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:
         """
@@ -116,32 +298,99 @@ class HammerSubmitCommand:
         return prog_name + " " + prog_args
 
 
-class HammerLocalSubmitCommand(HammerSubmitCommand):
+class HammerLocalSubmitJob(HammerSubmitJob):
+    """
+    Job running on this host.
+    """
 
-    def submit(self, args: List[str], env: Dict[str, str],
-               logger: HammerVLSILoggingContext, cwd: str = None) -> str:
-        # Just run the command on this host.
-
-        prog_tag = self.get_program_tag(args)
+    def __init__(self, args: List[str], env: Dict[str, str],
+                 logger: HammerVLSILoggingContext, cwd: Optional[str], slots: Optional[threading.Semaphore],
+                 line_consumers: List[Callable[[str], None]] = []) -> None:
+        """
+        Start the given command as soon as a job slot is available.
 
-        logger.debug("Executing subprocess: " + ' '.join(args))
-        subprocess_logger = logger.context("Exec " + prog_tag)
-        proc = subprocess.Popen(args, shell=False, stderr=subprocess.STDOUT,
-                                stdout=subprocess.PIPE, env=env, cwd=cwd)
+        :param slots: Semaphore which limits the number of concurrently running local jobs, or None to start the
+                      command right away.
+        """
+        mirror = RateLimitedLogMirror(logger.context("Exec " + HammerSubmitCommand.get_program_tag(args)),
+                                      self.max_logged_lines_per_second)
+        super().__init__([mirror] + list(line_consumers))
+        self._proc = None  # type: Optional[subprocess.Popen]
+        self._run_in_background(lambda: self._run(args, env, logger, cwd, slots, mirror))
+
+    def _run(self, args: List[str], env: Dict[str, str], logger: HammerVLSILoggingContext, cwd: Optional[str],
+             slots: Optional[threading.Semaphore], mirror: RateLimitedLogMirror) -> Optional[int]:
+        if slots is None:
+            return self._run_process(args, env, logger, cwd, mirror)
+        with slots:
+            return self._run_process(args, env, logger, cwd, mirror)
+
+    def _run_process(self, args: List[str], env: Dict[str, str], logger: HammerVLSILoggingContext,
+                     cwd: Optional[str], mirror: RateLimitedLogMirror) -> Optional[int]:
+        with self._cond:
+            if self._cancelled:
+                return None
+            logger.debug("Executing subprocess: " + ' '.join(args))
+            proc = subprocess.Popen(args, shell=False, stderr=subprocess.STDOUT,
+                                    stdout=subprocess.PIPE, env=env, cwd=cwd)
+            self._proc = proc
         atexit.register(proc.kill)
 
-        output_buf = ""
         # Log output and also capture output at the same time.
-        while True:
-            line = proc.stdout.readline().decode("utf-8")
-            if line != '':
-                subprocess_logger.debug(line.rstrip())
-                output_buf += line
-            else:
-                break
+        assert proc.stdout is not None
+        try:
+            for lines in read_output_lines(proc.stdout.fileno()):
+                self._append_output(lines)
+        except BaseException:
+            # e.g. a line consumer failed.
+            proc.kill()
+            raise
+        finally:
+            mirror.flush()
+            proc.stdout.close()
+            returncode = proc.wait()
+            atexit.unregister(proc.kill)
+        return returncode
+
+    def cancel(self) -> None:
+        with self._cond:
+            self._cancelled = True
+            if self._proc is not None and self._proc.poll() is None:
+                self._proc.kill()
+
+
+class HammerLocalSubmitCommand(HammerSubmitCommand):
+
+    # Maximum number of local jobs to run at the same time.
+    max_jobs = os.cpu_count() or 1  # type: int
+
+    _slots = None  # type: Optional[threading.Semaphore]
+    _slots_lock = threading.Lock()
+
+    @classmethod
+    def job_slots(cls) -> threading.Semaphore:
+        """Get the semaphore shared by all local jobs which limits them to max_jobs running at once."""
+        with cls._slots_lock:
+            if HammerLocalSubmitCommand._slots is None:
+                HammerLocalSubmitCommand._slots = threading.Semaphore(cls.max_jobs)
+            return HammerLocalSubmitCommand._slots
+
+    def submit(self, args: List[str], env: Dict[str, str],
+               logger: HammerVLSILoggingContext, cwd: Optional[str] = None,
+               line_consumers: List[Callable[[str], None]] = []) -> str:
+        # Just run the command on this host.
+        # Blocking runs don't take a job slot, so they never wait for (or deadlock with) background jobs.
         # TODO: check errors
+        job = HammerLocalSubmitJob(args, env, logger, cwd, None, line_consumers)
+        try:
+            return job.result()
+        finally:
+            job.close()
 
-        return output_buf
+    def submit_async(self, args: List[str], env: Dict[str, str],
+                     logger: HammerVLSILoggingContext, cwd: Optional[str] = None,
+                     line_consumers: List[Callable[[str], None]] = []) -> HammerLocalSubmitJob:
+        return HammerLocalSubmitJob(args, env, logger, cwd, self.job_slots(), line_consumers)
 
     def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:
         # Should never get here
@@ -153,7 +402,11 @@ class HammerLSFSettings(NamedTuple('HammerLSFSettings', [
     ('num_cpus', Optional[int]),
     ('queue', Optional[str]),
     ('log_file', Optional[str]),
-    ('extra_args', List[str])
+    ('extra_args', List[str]),
+    # Binaries and polling interval (in seconds) used for non-blocking submissions.
+    ('bjobs_binary', str),
+    ('bkill_binary', str),
+    ('poll_interval', float)
 ])):
     __slots__ = ()
 
@@ -183,10 +436,95 @@ class HammerLSFSettings(NamedTuple('HammerLSFSettings', [
             num_cpus=num_cpus,
             queue=queue,
             log_file=log_file,
-            extra_args=get_or_else(settings["extra_args"], [])
+            extra_args=get_or_else(settings["extra_args"], []),
+            bjobs_binary=str(settings.get("bjobs_binary", "bjobs")),
+            bkill_binary=str(settings.get("bkill_binary", "bkill")),
+            poll_interval=float(settings.get("poll_interval", 10.0))
         )
 
 
+class HammerLSFSubmitJob(HammerSubmitJob):
+    """
+    Job submitted to LSF without blocking (bsub without -K).
+    Its status is polled with bjobs and its output is read from the bsub log file once it is finished.
+    """
+
+    def __init__(self, settings: HammerLSFSettings, bsub_args: List[str], log_file: str, args: List[str],
+                 env: Dict[str, str], logger: HammerVLSILoggingContext, cwd: Optional[str],
+                 line_consumers: List[Callable[[str], None]] = []) -> None:
+        """
+        Submit the given command.
+
+        :param bsub_args: bsub command-line (without the command to run).
+        :param log_file: Log file which bsub writes the job output to.
+        """
+        mirror = RateLimitedLogMirror(logger.context("Exec " + HammerSubmitCommand.get_program_tag(args)),
+                                      self.max_logged_lines_per_second)
+        super().__init__([mirror] + list(line_consumers))
+        self.settings = settings  # type: HammerLSFSettings
+        self.job_id = None  # type: Optional[str]
+        self._env = env
+        self._cwd = cwd
+        self._run_in_background(lambda: self._run(bsub_args, log_file, args, logger, mirror))
+
+    def _run(self, bsub_args: List[str], log_file: str, args: List[str],
+             logger: HammerVLSILoggingContext, mirror: RateLimitedLogMirror) -> Optional[int]:
+        try:
+            return self._run_job(bsub_args, log_file, args, logger)
+        finally:
+            mirror.flush()
+
+    def _run_job(self, bsub_args: List[str], log_file: str, args: List[str],
+                 logger: HammerVLSILoggingContext) -> Optional[int]:
+        subprocess_format_str = 'Executing subprocess: {bsub_args} "{args}"'
+        logger.debug(subprocess_format_str.format(bsub_args=' '.join(bsub_args), args=' '.join(args)))
+
+        bsub_output = self._check_output(bsub_args + [' '.join(args)])
+        self._append_output(bsub_output.splitlines(True))
+        match = re.search(r"Job <(\w+)>", bsub_output)
+        if match is None:
+            raise ValueError("Could not find the job ID in the bsub output: " + bsub_output)
+        with self._cond:
+            self.job_id = match.group(1)
+            if self._cancelled:
+                self._kill()
+
+        while True:
+            status = self._check_output(
+                [self.settings.bjobs_binary, "-noheader", "-o", "stat exit_code", self.job_id]).split()
+            if len(status) > 0 and status[0] in {"DONE", "EXIT"}:
+                break
+            time.sleep(self.settings.poll_interval)
+
+        log_path = log_file if self._cwd is None else os.path.join(self._cwd, log_file)
+        if os.path.exists(log_path):
+            with open(log_path, "rb") as f:
+                for lines in read_output_lines(f.fileno()):
+                    self._append_output(lines)
+
+        if status[0] == "DONE":
+            return 0
+        try:
+            return int(status[1])
+        except (IndexError, ValueError):
+            return 1
+
+    def _check_output(self, args: List[str]) -> str:
+        return subprocess.check_output(args, stderr=subprocess.STDOUT, env=self._env, cwd=self._cwd).decode("utf-8")
+
+    def _kill(self) -> None:
+        assert self.job_id is not None
+        subprocess.call([self.settings.bkill_binary, self.job_id], env=self._env, cwd=self._cwd,
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def cancel(self) -> None:
+        with self._cond:
+            self._cancelled = True
+            # If the job wasn't submitted yet, it will be killed as soon as it is.
+            if self.job_id is not None and not self._finished:
+                self._kill()
+
+
 class HammerLSFSubmitCommand(HammerSubmitCommand):
 
     # TODO(johnwright): log the command output
@@ -209,10 +547,23 @@ class HammerLSFSubmitCommand(HammerSubmitCommand):
     def read_settings(self, settings: Dict[str, Any], tool_namespace: str) -> None:  # pylint: disable=unused-argument
         self.settings = HammerLSFSettings.from_setting(settings)
 
-    def bsub_args(self) -> List[str]:
-        args = [self.settings.bsub_binary, "-K"]  # always use -K to block
-        args.extend(["-o", self.settings.log_file if self.settings.log_file is not None else
-            datetime.datetime.now().strftime("hammer-vlsi-bsub-%Y%m%d-%H%M%S.log")])  # always use -o to log to a file
+    # Used to give non-blocking jobs unique default log files.
+    _job_counter = itertools.count()
+
+    def bsub_args(self, blocking: bool = True, log_file: Optional[str] = None) -> List[str]:
+        """
+        Get the bsub command-line (without the command to run).
+
+        :param blocking: Use -K to block until the job is complete.
+        :param log_file: Log file for the job output (default: settings.log_file or a timestamped file).
+        """
+        args = [self.settings.bsub_binary]
+        if blocking:
+            args.append("-K")
+        if log_file is None:
+            log_file = self.settings.log_file if self.settings.log_file is not None else \
+                datetime.datetime.now().strftime("hammer-vlsi-bsub-%Y%m%d-%H%M%S.log")
+        args.extend(["-o", log_file])  # always use -o to log to a file
         if self.settings.queue is not None:
             args.extend(["-q", self.settings.queue])
         if self.settings.num_cpus is not None:
@@ -221,7 +572,8 @@ class HammerLSFSubmitCommand(HammerSubmitCommand):
         return args
 
     def submit(self, args: List[str], env: Dict[str, str],
-               logger: HammerVLSILoggingContext, cwd: str = None) -> str:
+               logger: HammerVLSILoggingContext, cwd: Optional[str] = None,
+               line_consumers: List[Callable[[str], None]] = []) -> str:
         # TODO fix output capturing
 
         prog_tag = self.get_program_tag(args)
@@ -229,20 +581,41 @@ class HammerLSFSubmitCommand(HammerSubmitCommand):
         subprocess_format_str = 'Executing subprocess: {bsub_args} "{args}"'
         logger.debug(subprocess_format_str.format(bsub_args=' '.join(self.bsub_args()),
                                                   args=' '.join(args)))
-        subprocess_logger = logger.context("Exec " + prog_tag)
+        mirror = RateLimitedLogMirror(logger.context("Exec " + prog_tag),
+                                      HammerSubmitJob.max_logged_lines_per_second)
+        consumers = [mirror] + list(line_consumers)  # type: List[Callable[[str], None]]
         proc = subprocess.Popen(self.bsub_args() + [' '.join(args)],
                                 shell=False, stderr=subprocess.STDOUT,
                                 stdout=subprocess.PIPE, env=env, cwd=cwd)
 
-        output_buf = ""
+        output = SubprocessOutput(HammerSubmitJob.max_output_memory)
         # Log output and also capture output at the same time.
-        while True:
-            line = proc.stdout.readline().decode("utf-8")
-            if line != '':
-                subprocess_logger.debug(line.rstrip())
-                output_buf += line
-            else:
-                break
+        assert proc.stdout is not None
+        try:
+            for lines in read_output_lines(proc.stdout.fileno()):
+                output.append(lines)
+                for line in lines:
+                    for consumer in consumers:
+                        consumer(line)
+        finally:
+            mirror.flush()
+            proc.stdout.close()
+            proc.wait()
         # TODO: check errors
 
-        return output_buf
+        text = output.text()
+        output.close()
+        return text
+
+    def submit_async(self, args: List[str], env: Dict[str, str],
+                     logger: HammerVLSILoggingContext, cwd: Optional[str] = None,
+                     line_consumers: List[Callable[[str], None]] = []) -> HammerLSFSubmitJob:
+        # Concurrent jobs must not share a log file.
+        n = next(self._job_counter)
+        if self.settings.log_file is not None:
+            root, ext = os.path.splitext(self.settings.log_file)
+            log_file = "{root}-{n}{ext}".format(root=root, n=n, ext=ext)
+        else:
+            log_file = datetime.datetime.now().strftime("hammer-vlsi-bsub-%Y%m%d-%H%M%S-") + "{n}.log".format(n=n)
+        return HammerLSFSubmitJob(self.settings, self.bsub_args(blocking=False, log_file=log_file), log_file,
+                                  args, env, logger, cwd, line_consumers)
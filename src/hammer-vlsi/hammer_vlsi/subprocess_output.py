@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  subprocess_output.py
+#  Streaming capture of the output of subprocesses.
+#
+#  See LICENSE for licence details.
+
+import codecs
+import os
+import tempfile
+import time
+from collections import deque
+from typing import IO, Callable, Deque, Iterator, List, Optional
+
+from hammer_logging import HammerVLSILoggingContext, Level
+
+__all__ = ['SubprocessOutput', 'RateLimitedLogMirror', 'read_output_lines']
+
+# Size of the chunks in which subprocess output is read.
+_CHUNK_SIZE = 64 * 1024
+
+
+def read_output_lines(fd: int) -> Iterator[List[str]]:
+    """
+    Read the given pipe in chunks until it is closed, and decode it into lines.
+    Invalid UTF-8 is replaced instead of raising an error.
+
+    :param fd: File descriptor to read from.
+    :return: Iterator over the complete lines (including newlines) of each chunk. The last line may lack a newline.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while True:
+        chunk = os.read(fd, _CHUNK_SIZE)
+        if len(chunk) == 0:
+            break
+        parts = (pending + decoder.decode(chunk)).split("\n")
+        pending = parts.pop()
+        if len(parts) > 0:
+            yield [part + "\n" for part in parts]
+    pending += decoder.decode(b"", final=True)
+    if pending != "":
+        yield [pending]
+
+
+class SubprocessOutput:
+    """
+    Captured output of a subprocess.
+
+    The most recent output (up to max_memory characters) is kept in memory. Once the output grows beyond that, all of
+    it is spilled to a temporary file, so that arbitrarily long logs can be captured in bounded memory.
+    Not thread-safe; HammerSubmitJob guards it with its lock.
+    """
+
+    def __init__(self, max_memory: int, spill: bool = True) -> None:
+        """
+        :param max_memory: Maximum number of characters of output to keep in memory.
+        :param spill: Spill the output to a temporary file once it exceeds max_memory. If False, only the most recent
+                      output is kept.
+        """
+        self.max_memory = max_memory  # type: int
+        self.spill = spill  # type: bool
+        self._lines = deque()  # type: Deque[str]
+        # Number of characters in _lines.
+        self._memory_size = 0  # type: int
+        # Index of the first line in _lines.
+        self._first_index = 0  # type: int
+        self._spill_file = None  # type: Optional[IO[str]]
+
+    @property
+    def line_count(self) -> int:
+        """Total number of lines captured so far."""
+        return self._first_index + len(self._lines)
+
+    @property
+    def spilled(self) -> bool:
+        """Whether the output was spilled to a temporary file."""
+        return self._spill_file is not None
+
+    @property
+    def complete(self) -> bool:
+        """Whether all of the output is still available (i.e. nothing was dropped)."""
+        return self._first_index == 0 or self.spilled
+
+    def append(self, lines: List[str]) -> None:
+        """
+        Capture the given lines.
+
+        :param lines: Lines of output, including newlines.
+        """
+        self._lines.extend(lines)
+        self._memory_size += sum(len(line) for line in lines)
+        if self._spill_file is not None:
+            self._spill_file.writelines(lines)
+        elif self.spill and self._memory_size > self.max_memory:
+            spill_file = tempfile.NamedTemporaryFile("w+", encoding="utf-8", prefix="hammer-output-")
+            spill_file.writelines(self._lines)
+            self._spill_file = spill_file
+        # Keep only the most recent output in memory.
+        while self._memory_size > self.max_memory and len(self._lines) > 1:
+            self._memory_size -= len(self._lines.popleft())
+            self._first_index += 1
+
+    def get_lines(self, start: int = 0) -> List[str]:
+        """
+        Get the lines captured from the given line onwards.
+        If some of them were dropped from memory without being spilled, only the lines still in memory are returned.
+
+        :param start: Index of the first line to get.
+        :return: Captured lines.
+        """
+        if start >= self._first_index or self._spill_file is None:
+            return list(self._lines)[max(0, start - self._first_index):]
+        end = self.line_count
+        self._spill_file.flush()
+        lines = []  # type: List[str]
+        with open(self._spill_file.name, "r", encoding="utf-8", newline="") as f:
+            for i, line in enumerate(f):
+                if i >= end:
+                    break
+                if i >= start:
+                    lines.append(line)
+        return lines
+
+    def tail(self, n: int) -> List[str]:
+        """
+        Get the last lines of output.
+
+        :param n: Maximum number of lines to get.
+        :return: The last (at most) n lines which are still in memory.
+        """
+        return list(self._lines)[-n:] if n > 0 else []
+
+    def text(self) -> str:
+        """Get all of the captured output as a single string."""
+        return "".join(self.get_lines(0))
+
+    def __str__(self) -> str:
+        return self.text()
+
+    def close(self) -> None:
+        """Delete the spilled output, if any. Only the output still in memory remains available."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            if self._first_index > 0:
+                # The spilled lines are gone now.
+                self.spill = False
+
+
+class RateLimitedLogMirror:
+    """
+    Line consumer which mirrors subprocess output to a logger at debug level, printing at most a given number of lines
+    per second on the console. Lines over the limit still go to the other log callbacks (e.g. the log file), but are
+    only counted and summarized on the console, so that very chatty tools don't flood it.
+    """
+
+    def __init__(self, logger: HammerVLSILoggingContext, max_lines_per_second: Optional[int],
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        :param logger: Logger to mirror the output to.
+        :param max_lines_per_second: Maximum number of lines to print on the console per second, or None for no limit.
+        :param clock: Monotonic clock, in seconds.
+        """
+        self.logger = logger  # type: HammerVLSILoggingContext
+        self.max_lines_per_second = max_lines_per_second  # type: Optional[int]
+        self.clock = clock  # type: Callable[[], float]
+        self._window_start = clock()  # type: float
+        self._window_lines = 0  # type: int
+        self._suppressed = 0  # type: int
+
+    def __call__(self, line: str) -> None:
+        if self.max_lines_per_second is not None:
+            now = self.clock()
+            if now - self._window_start >= 1.0:
+                self.flush()
+                self._window_start = now
+                self._window_lines = 0
+            if self._window_lines >= self.max_lines_per_second:
+                self._suppressed += 1
+                self.logger.log(line.rstrip(), Level.DEBUG, console=False)
+                return
+            self._window_lines += 1
+        self.logger.debug(line.rstrip())
+
+    def flush(self) -> None:
+        """Log how many lines were not printed on the console since the last flush, if any."""
+        if self._suppressed > 0:
+            self.logger.debug("({n} lines of output not shown on the console)".format(n=self._suppressed))
+            self._suppressed = 0
@@ -5,8 +5,11 @@
 #
 #  See LICENSE for licence details.
 
-from hammer_utils import LEFUtils
+from hammer_utils import LEFMacro, LEFPin, LEFRect, LEFSizeCache, LEFUtils
 
+import os
+import shutil
+import tempfile
 import unittest
 
 
@@ -115,6 +118,91 @@ END LIBRARY
             ("MY_CELL_1", 3.000, 3.000)
         ])
 
+    def test_get_macros(self) -> None:
+        """
+        Test that macros are streamed from LEF files with their pins and obstructions.
+        """
+        lef_source = """
+VERSION 5.8 ;
+PROPERTYDEFINITIONS
+ MACRO LEF58_EDGETYPE STRING ;
+END PROPERTYDEFINITIONS
+
+MACRO my_macro
+  CLASS BLOCK ;
+  SIZE 10.5 BY 20 ;
+  PIN in
+    DIRECTION INPUT ;
+    USE SIGNAL ;
+    PORT
+      LAYER M1 ;
+        RECT 0.1 0.2 0.3 0.4 ;
+      LAYER M2 ;
+        RECT MASK 1 1 2 3 4 ;
+    END
+  END in
+  OBS
+    LAYER M1 ;
+      RECT -1 -2 5 6 ;
+  END
+END my_macro
+
+MACRO no_size
+  CLASS CORE ;
+END no_size
+
+END LIBRARY
+"""
+        fd, path = tempfile.mkstemp(".lef")
+        with os.fdopen(fd, "w") as f:
+            f.write(lef_source)
+
+        self.assertEqual(LEFUtils.get_sizes_from_file(path), [("my_macro", 10.5, 20.0)])
+        self.assertEqual(LEFUtils.get_sizes_from_file(path), LEFUtils.get_sizes(lef_source))
+        self.assertEqual(LEFUtils.get_macros_from_file(path), [
+            LEFMacro(name="my_macro", width=10.5, height=20.0,
+                     pins=[LEFPin(name="in", direction="INPUT", use="SIGNAL", rects=[
+                         LEFRect("M1", 0.1, 0.2, 0.3, 0.4),
+                         LEFRect("M2", 1.0, 2.0, 3.0, 4.0)
+                     ])],
+                     obstructions=[LEFRect("M1", -1.0, -2.0, 5.0, 6.0)]),
+            LEFMacro(name="no_size", width=None, height=None, pins=[], obstructions=[])
+        ])
+
+        with self.assertRaises(ValueError):
+            LEFUtils.get_sizes("MACRO unterminated\n  SIZE 1 BY 1 ;\n")
+
+        os.remove(path)
+
+    def test_size_cache(self) -> None:
+        """
+        Test that the macro size cache only re-parses LEF files whose contents changed.
+        """
+        temp_dir = tempfile.mkdtemp()
+        lef_path = os.path.join(temp_dir, "macro.lef")
+        cache_path = os.path.join(temp_dir, "cache", "sizes.json")
+        with open(lef_path, "w") as f:
+            f.write("MACRO a\n  SIZE 1 BY 2 ;\nEND a\n")
+
+        cache = LEFSizeCache(cache_path)
+        self.assertIsNone(cache.lookup(lef_path))
+        self.assertEqual(cache.get_sizes(lef_path), [("a", 1.0, 2.0)])
+        cache.save()
+
+        # A new cache reads the saved sizes, even if the file was rewritten with the same contents.
+        with open(lef_path, "w") as f:
+            f.write("MACRO a\n  SIZE 1 BY 2 ;\nEND a\n")
+        self.assertEqual(LEFSizeCache(cache_path).lookup(lef_path), [("a", 1.0, 2.0)])
+
+        # Changed contents are re-parsed.
+        with open(lef_path, "w") as f:
+            f.write("MACRO b\n  SIZE 3 BY 4 ;\nEND b\n")
+        cache = LEFSizeCache(cache_path)
+        self.assertIsNone(cache.lookup(lef_path))
+        self.assertEqual(cache.get_sizes(lef_path), [("b", 3.0, 4.0)])
+
+        shutil.rmtree(temp_dir)
+
 
 if __name__ == '__main__':
     unittest.main()
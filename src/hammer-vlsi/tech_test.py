@@ -19,7 +19,7 @@ from typing import Any, Dict, List, Optional
 from hammer_logging import HammerVLSILogging
 import hammer_tech
 from hammer_tech import LibraryFilter, Stackup, Metal, WidthSpacingTuple
-from hammer_utils import deepdict
+from hammer_utils import LEFSizeCache, deepdict
 from decimal import Decimal
 
 from test_tool_utils import HammerToolTestHelpers, DummyTool
@@ -139,6 +139,86 @@ class HammerTechnologyTest(HasGetTech, unittest.TestCase):
         # Cleanup
         shutil.rmtree(tech_dir_base)
 
+    def test_library_index(self) -> None:
+        """
+        Test that the library index looks up indexed filters and is only rebuilt when the settings change.
+        """
+        import hammer_config
+
+        tech_dir, tech_dir_base = HammerToolTestHelpers.create_tech_dir("dummy28")
+        tech_json_filename = os.path.join(tech_dir, "dummy28.tech.json")
+
+        def add_supplies(in_dict: Dict[str, Any]) -> Dict[str, Any]:
+            out_dict = deepdict(in_dict)
+            out_dict["libraries"].append({
+                "milkyway techfile": "test/low",
+                "supplies": {"VDD": "0.7 V", "GND": "0 V"},
+                "corner": {"nmos": "slow", "pmos": "slow", "temperature": "125 C"}
+            })
+            out_dict["libraries"].append({
+                "milkyway techfile": "test/nominal",
+                "supplies": {"VDD": "0.85 V", "GND": "0 V"},
+                "corner": {"nmos": "typical", "pmos": "typical", "temperature": "25 C"}
+            })
+            return out_dict
+
+        HammerToolTestHelpers.write_tech_json(tech_json_filename, add_supplies)
+        tech = self.get_tech(hammer_tech.HammerTechnology.load_from_dir("dummy28", tech_dir))
+        tech.cache_dir = tech_dir
+        tech.logger = HammerVLSILogging.context("")
+
+        database = hammer_config.HammerDatabase()
+        database.update_core([{
+            "vlsi.inputs.mmmc_corners": [],
+            "vlsi.inputs.supplies.VDD": "0.85 V",
+            "vlsi.inputs.supplies.GND": "0 V"
+        }])
+        tech.set_database(database)
+
+        index = tech.library_index
+        self.assertEqual(len(index.libraries), 8)
+
+        # Indexed filters are looked up in buckets of the index.
+        def temperature_key(lib: hammer_tech.Library) -> Optional[str]:
+            return None if lib.corner is None else str(lib.corner.temperature)
+
+        def paths_func(lib: hammer_tech.Library) -> List[str]:
+            return [] if lib.milkyway_techfile is None else [lib.milkyway_techfile]
+
+        hot = hammer_tech.indexed_library_filter("temperature", temperature_key, "125 C")
+        hot_key = hammer_tech.get_library_index_key(hot)
+        assert hot_key is not None
+        self.assertEqual(len(index.lookup(hot_key)), 1)
+        self.assertIs(index.lookup(hot_key), index.lookup(hot_key))
+        milkyway_filter = hammer_tech.LibraryFilter.new("milkyway_tf", "Milkyway techfile", is_file=True,
+                                                        paths_func=paths_func)
+        self.assertEqual(tech.process_library_filter(pre_filts=[hot], filt=milkyway_filter, must_exist=False,
+                                                     output_func=lambda s, _: [s]),
+                         [os.path.join(tech_dir, "low")])
+        # The supplies pre-filter still applies.
+        self.assertEqual(tech.process_library_filter(pre_filts=[tech.filter_for_supplies, hot], filt=milkyway_filter,
+                                                     must_exist=False, output_func=lambda s, _: [s]),
+                         [])
+
+        # Libraries without supplies are used anyway.
+        self.assertEqual(len(index.supplies_matching), 7)
+        corner = index.supplies_matching[-1].corner
+        assert corner is not None
+        self.assertEqual(str(corner.nmos), "typical")
+
+        # The index is reused as long as the settings don't change.
+        self.assertIs(tech.library_index, index)
+        database.set_setting("vlsi.inputs.supplies.VDD", "0.7 V")
+        new_index = tech.library_index
+        self.assertIsNot(new_index, index)
+        self.assertEqual(len(new_index.supplies_matching), 7)
+        corner = new_index.supplies_matching[-1].corner
+        assert corner is not None
+        self.assertEqual(str(corner.nmos), "slow")
+
+        # Cleanup
+        shutil.rmtree(tech_dir_base)
+
     @staticmethod
     def add_tarballs(in_dict: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -194,6 +274,93 @@ class HammerTechnologyTest(HasGetTech, unittest.TestCase):
         # Cleanup
         shutil.rmtree(tech_dir_base)
 
+    def test_tarball_extraction(self) -> None:
+        """
+        Test that tarballs are extracted atomically with completion markers and only when needed.
+        """
+        import tarfile
+        import tarballs
+
+        tech_dir, tech_dir_base = HammerToolTestHelpers.create_tech_dir("dummy28")
+        logger = HammerVLSILogging.context("")
+
+        def make_tarball(name: str, contents: str) -> str:
+            src_dir = os.path.join(tech_dir_base, "src")
+            os.makedirs(os.path.join(src_dir, "lib"), exist_ok=True)
+            with open(os.path.join(src_dir, "lib", "test.gds"), "w") as f:
+                f.write(contents)
+            tarball_path = os.path.join(tech_dir, name)
+            with tarfile.open(tarball_path, "w:gz") as tar:
+                tar.add(os.path.join(src_dir, "lib"), arcname="lib")
+            return tarball_path
+
+        def read_extracted(target: str) -> str:
+            with open(os.path.join(target, "lib", "test.gds"), "r") as f:
+                return f.read()
+
+        foo_tarball = make_tarball("foo.tar.gz", "foo")
+        bar_tarball = make_tarball("bar.tar.gz", "bar")
+        extracted_dir = os.path.join(tech_dir, "extracted")
+        foo_target = os.path.join(extracted_dir, "foo.tar.gz")
+        bar_target = os.path.join(extracted_dir, "bar.tar.gz")
+
+        tarballs.extract_tarballs([
+            tarballs.TarballExtraction(foo_tarball, foo_target, allow_unmarked=False),
+            tarballs.TarballExtraction(bar_tarball, bar_target, allow_unmarked=False)
+        ], logger, max_workers=2)
+        self.assertEqual(read_extracted(foo_target), "foo")
+        self.assertEqual(read_extracted(bar_target), "bar")
+        self.assertTrue(tarballs.is_extracted(foo_tarball, foo_target))
+        # No staging directories are left behind.
+        self.assertEqual(sorted(filter(lambda n: not n.endswith(".lock"), os.listdir(extracted_dir))),
+                         ["bar.tar.gz", "foo.tar.gz"])
+
+        # Complete extractions are not redone.
+        with open(os.path.join(foo_target, "lib", "test.gds"), "w") as f:
+            f.write("modified")
+        tarballs.extract_tarball(foo_tarball, foo_target, logger)
+        self.assertEqual(read_extracted(foo_target), "modified")
+
+        # Interrupted extractions (no completion marker) are redone unless they may have been extracted by hand.
+        os.remove(os.path.join(foo_target, tarballs.MARKER_NAME))
+        tarballs.extract_tarball(foo_tarball, foo_target, logger, allow_unmarked=True)
+        self.assertEqual(read_extracted(foo_target), "modified")
+        tarballs.extract_tarball(foo_tarball, foo_target, logger)
+        self.assertEqual(read_extracted(foo_target), "foo")
+
+        # A changed tarball is extracted again.
+        make_tarball("bar.tar.gz", "bar2")
+        self.assertFalse(tarballs.is_extracted(bar_tarball, bar_target))
+        tarballs.extract_tarball(bar_tarball, bar_target, logger)
+        self.assertEqual(read_extracted(bar_target), "bar2")
+
+        # Symlinks may point anywhere (like with tar -xf), but nothing is written through them.
+        def add_symlink(tar: tarfile.TarFile, name: str, target: str) -> None:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.SYMTYPE
+            info.linkname = target
+            tar.addfile(info)
+
+        links_tarball = os.path.join(tech_dir, "links.tar")
+        with tarfile.open(links_tarball, "w") as tar:
+            add_symlink(tar, "abs_link", tech_dir_base)
+            add_symlink(tar, "outside_link", "../../..")
+        links_target = os.path.join(extracted_dir, "links.tar")
+        tarballs.extract_tarball(links_tarball, links_target, logger)
+        self.assertEqual(os.readlink(os.path.join(links_target, "abs_link")), tech_dir_base)
+        self.assertEqual(os.readlink(os.path.join(links_target, "outside_link")), "../../..")
+        if hasattr(tarfile, "tar_filter"):
+            evil_tarball = os.path.join(tech_dir, "evil.tar")
+            with tarfile.open(evil_tarball, "w") as tar:
+                add_symlink(tar, "abs_link", tech_dir_base)
+                tar.addfile(tarfile.TarInfo("abs_link/evil"))
+            with self.assertRaises(tarfile.OutsideDestinationError):  # type: ignore
+                tarballs.extract_tarball(evil_tarball, os.path.join(extracted_dir, "evil.tar"), logger)
+            self.assertFalse(os.path.exists(os.path.join(tech_dir_base, "evil")))
+
+        # Cleanup
+        shutil.rmtree(tech_dir_base)
+
     def test_tarballs_pre_extracted(self) -> None:
         """
         Test that tarballs that are pre-extracted also work as expected.
@@ -281,6 +448,61 @@ class HammerTechnologyTest(HasGetTech, unittest.TestCase):
         prefixes2.append(hammer_tech.PathPrefix(prefix="bar", path="/tmp/bar"))
         self.assertEqual(lib.extra_prefixes, prefixes_orig)
 
+    def test_library_copy(self) -> None:
+        """
+        Test that libraries are deep-copied and keep their JSON keys (including keys not in the schema).
+        """
+        lib_dict = {
+            "lef file": "test/lib.lef",
+            "corner": {"nmos": "fast", "pmos": "fast", "temperature": "-40 C"},
+            "provides": [{"lib_type": "stdcell", "vt": "RVT"}],
+            "provide script": "test/provide.sh"
+        }
+        lib = hammer_tech.HammerTechnology.parse_library(lib_dict)
+        assert lib.corner is not None and lib.provides is not None
+        self.assertEqual(lib.lef_file, "test/lib.lef")
+        self.assertEqual(lib.corner.temperature, "-40 C")
+        self.assertEqual(lib.provides[0].lib_type, "stdcell")
+        self.assertEqual(lib["provide script"], "test/provide.sh")
+        self.assertEqual(lib.to_dict(), lib_dict)
+        self.assertEqual(json.loads(lib.serialize()), lib_dict)
+
+        lib.extra_prefixes = [hammer_tech.PathPrefix(prefix="test", path="/tmp/test")]
+        lib_copied = hammer_tech.copy_library(lib)
+        assert lib_copied.corner is not None and lib_copied.provides is not None
+        lib_copied.corner.temperature = "125 C"
+        lib_copied.provides.append(hammer_tech.tech_schema.Provide(lib_type="technology"))
+        self.assertEqual(lib.to_dict(), lib_dict)
+        self.assertEqual(lib_copied.extra_prefixes, lib.extra_prefixes)
+
+        # ExtraLibrary settings (e.g. exported config outputs) are plain JSON and round-trip.
+        prefix = hammer_tech.PathPrefix(prefix="test", path="/tmp/test")
+        for ex in [hammer_tech.ExtraLibrary(prefix=None, library=lib), hammer_tech.ExtraLibrary(prefix=prefix, library=lib)]:
+            setting = ex.to_setting()
+            self.assertEqual(json.loads(json.dumps(setting)), setting)
+            parsed = hammer_tech.ExtraLibrary.from_setting(setting)
+            self.assertEqual(parsed.prefix, ex.prefix)
+            self.assertEqual(parsed.library.to_dict(), lib.to_dict())
+
+    def test_tech_json_validation(self) -> None:
+        """
+        Test that the tech JSON is checked against the schema, unless validation is disabled.
+        """
+        with self.assertRaises(ValueError):
+            hammer_tech.library_from_json('{"lef file": 42}')
+        with self.assertRaises(ValueError):
+            hammer_tech.library_from_json('{"provides": {"lib_type": "stdcell"}}')
+        with self.assertRaises(ValueError):
+            hammer_tech.TechJSON.from_dict({"name": "bad", "libraries": [{"corner": "fast"}]})
+
+        lib = hammer_tech.Library.from_dict({"lef file": 42}, validate=False)
+        self.assertEqual(lib.lef_file, 42)
+
+        tech = hammer_tech.TechJSON.from_dict({"grid_unit": "0.001", "stackups": [{"name": "s", "metals": []}]})
+        assert tech.stackups is not None
+        self.assertEqual(tech.stackups[0]["name"], "s")
+        self.assertEqual(tech.libraries, None)
+
     def test_prepend_dir_path(self) -> None:
         """
         Test that the technology library can prepend directories correctly.
@@ -527,6 +749,45 @@ END LIBRARY
             hammer_tech.MacroSize(library='my_vendor_lib', name='my_awesome_macro',
                                   width=810.522, height=607.525)
         ])
+        # The sizes are cached in the tech cache dir.
+        self.assertTrue(os.path.isfile(os.path.join(tech_dir, "lef-macro-sizes.json")))
+        self.assertEqual(tech.get_macro_sizes(), [
+            hammer_tech.MacroSize(library='my_vendor_lib', name='my_awesome_macro',
+                                  width=810.522, height=607.525)
+        ])
+
+        # Cleanup
+        shutil.rmtree(tech_dir_base)
+
+    def test_parallel_macro_sizes(self) -> None:
+        """
+        Test that LEF files are parsed in parallel, in order and only once.
+        """
+        import hammer_config
+
+        tech_dir, tech_dir_base = HammerToolTestHelpers.create_tech_dir("dummy28")
+        tech_json_filename = os.path.join(tech_dir, "dummy28.tech.json")
+        HammerToolTestHelpers.write_tech_json(tech_json_filename)
+        tech = self.get_tech(hammer_tech.HammerTechnology.load_from_dir("dummy28", tech_dir))
+        tech.cache_dir = tech_dir
+        tech.logger = HammerVLSILogging.context("")
+        database = hammer_config.HammerDatabase()
+        database.update_project([{"vlsi.technology.macro_size_jobs": 2}])
+        tech.set_database(database)
+
+        lefs = []  # type: List[str]
+        for i in range(6):
+            lefs.append(os.path.join(tech_dir, "macro{i}.lef".format(i=i)))
+            with open(lefs[-1], "w") as f:
+                f.write("MACRO macro{i}\n  SIZE {i} BY 1 ;\nEND macro{i}\n".format(i=i))
+
+        size_cache = LEFSizeCache(os.path.join(tech_dir, "sizes.json"))
+        sizes = tech._parse_lef_sizes(lefs + lefs[:1], size_cache)
+        self.assertEqual(list(sizes.keys()), lefs)
+        for i, lef in enumerate(lefs):
+            self.assertEqual(sizes[lef], [("macro{i}".format(i=i), float(i), 1.0)])
+            # Parsed LEF files are cached.
+            self.assertEqual(size_cache.lookup(lef), sizes[lef])
 
         # Cleanup
         shutil.rmtree(tech_dir_base)
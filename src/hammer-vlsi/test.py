@@ -7,8 +7,11 @@
 
 import json
 import os
+import re
 import shutil
 import tempfile
+import threading
+import time
 import unittest
 from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union
 from decimal import Decimal
@@ -20,10 +23,12 @@ from test_tool_utils import HammerToolTestHelpers, DummyTool, SingleStepTool
 import hammer_config
 import hammer_tech
 import hammer_vlsi
-from hammer_logging import HammerVLSIFileLogger, HammerVLSILogging, Level
+from hammer_logging import HammerTrace, HammerVLSIFileLogger, HammerVLSILogging, Level, load_trace, summarize_traces, to_chrome_trace
+from hammer_logging.logging import FullMessage
 from hammer_logging.test import HammerLoggingCaptureContext
 from hammer_tech import LibraryFilter, Library, ExtraLibrary
 from hammer_utils import deeplist, deepdict, add_dicts, get_or_else
+from hammer_vlsi.units import TimeValue
 
 class SDCDummyTool(hammer_vlsi.HasSDCSupport, DummyTool):
     @property
@@ -125,6 +130,97 @@ class HammerVLSILoggingTest(unittest.TestCase):
         # Remove temp file
         os.remove(path)
 
+    def test_remove_callback(self):
+        HammerVLSILogging.clear_callbacks()
+        kept = []  # type: list
+        removed = []  # type: list
+        HammerVLSILogging.add_callback(kept.append)
+        HammerVLSILogging.add_callback(removed.append, lambda messages: removed.extend(messages))
+        log = HammerVLSILogging.context()
+        log.info("Before")
+        HammerVLSILogging.remove_callback(removed.append)
+        log.info("After")
+        self.assertEqual([m.message for m in kept], ["Before", "After"])
+        self.assertEqual([m.message for m in removed], ["Before"])
+        self.assertEqual(HammerVLSILogging.batch_callbacks, {})
+
+    def test_full_message(self):
+        # Messages built without a time and thread (e.g. by plugins) get the current ones.
+        message = FullMessage(message="Hello", level=Level.INFO, context=["test"])
+        self.assertEqual(message.thread, threading.get_ident())
+        self.assertAlmostEqual(message.time, time.time(), delta=60)
+        self.assertEqual(FullMessage("Hello", Level.INFO, [], 1.5, 7)[3:5], (1.5, 7))
+
+    def test_async_file_logging(self):
+        fd, path = tempfile.mkstemp(".log")
+        os.close(fd) # Don't leak file descriptors
+
+        filelogger = HammerVLSIFileLogger(path)
+
+        HammerVLSILogging.clear_callbacks()
+        HammerVLSILogging.add_callback(filelogger.callback, filelogger.batch_callback)
+        messages = []  # type: list
+        HammerVLSILogging.add_callback(messages.append)
+        old_min_level = HammerVLSILogging.min_level
+        HammerVLSILogging.start_async()
+        try:
+            self.assertTrue(HammerVLSILogging.is_async())
+            log = HammerVLSILogging.context("async")
+            for i in range(1000):
+                log.info("Line {i}".format(i=i))
+            # Messages below the minimum level are dropped.
+            HammerVLSILogging.min_level = Level.INFO
+            log.debug("Dropped")
+            HammerVLSILogging.min_level = old_min_level
+            # flush() waits until all queued messages were written.
+            HammerVLSILogging.flush()
+            self.assertEqual(len(messages), 1000)
+        finally:
+            HammerVLSILogging.min_level = old_min_level
+            HammerVLSILogging.stop_async()
+        self.assertFalse(HammerVLSILogging.is_async())
+        filelogger.close()
+
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines, ["[async] Level.INFO: Line {i}".format(i=i) for i in range(1000)])
+
+        # Remove temp file
+        os.remove(path)
+
+    def test_async_logging_in_forked_modules(self):
+        """ Test that messages queued in the forked processes of a hierarchical run are not lost """
+        fd, path = tempfile.mkstemp(".log")
+        os.close(fd) # Don't leak file descriptors
+
+        filelogger = HammerVLSIFileLogger(path)
+
+        HammerVLSILogging.clear_callbacks()
+        HammerVLSILogging.add_callback(filelogger.callback, filelogger.batch_callback)
+        HammerVLSILogging.start_async()
+        try:
+            def run_module(module: str) -> Optional[dict]:
+                log = HammerVLSILogging.context(module)
+                for i in range(500):
+                    log.info("Line {i}".format(i=i))
+                return {}
+
+            scheduler = hammer_vlsi.HierarchicalScheduler(["mod1", "mod2", "top"], {"top": ["mod1", "mod2"]}, 2,
+                                                          HammerVLSILogging.context("scheduler"))
+            results = scheduler.run(run_module)
+            self.assertEqual(results, {"mod1": {}, "mod2": {}, "top": {}})
+        finally:
+            HammerVLSILogging.stop_async()
+            filelogger.close()
+
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+        for module in ["mod1", "mod2", "top"]:
+            self.assertEqual(len([line for line in lines if line.startswith("[{m}] ".format(m=module))]), 500)
+
+        # Remove temp file
+        os.remove(path)
+
 
 class HammerToolTest(HasGetTech, unittest.TestCase):
     def test_read_libs(self) -> None:
@@ -453,6 +549,83 @@ export lol=abc"cat"
         # Cleanup
         shutil.rmtree(tmpdir)
 
+    def test_memoized_accessors(self) -> None:
+        """
+        Test that typed accessors like get_clock_ports are memoized until
+        the settings they depend on change.
+        """
+        tool = DummyTool()
+        tool.logger = HammerVLSILogging.context("")
+        database = hammer_config.HammerDatabase()
+        hammer_vlsi.HammerVLSISettings.load_builtins_and_core(database)
+        database.update_project([{
+            "vlsi.inputs.clocks": [{"name": "clock", "period": "1 ns"}],
+            "vlsi.inputs.mmmc_corners": [{"name": "ss", "type": "setup", "voltage": "0.9 V", "temp": "125 C"}]
+        }])
+        tool.set_database(database)
+
+        clocks = tool.get_clock_ports()
+        self.assertEqual(clocks[0].period, TimeValue("1 ns"))
+        # Callers can't modify the memoized result.
+        clocks.append(clocks[0])
+        self.assertEqual(len(tool.get_clock_ports()), 1)
+        self.assertIs(tool.get_clock_ports()[0], clocks[0])
+
+        # Changing unrelated settings doesn't invalidate it.
+        version = database.version
+        tool.set_setting("vlsi.inputs.foo", "bar")
+        self.assertNotEqual(database.version, version)
+        self.assertIs(tool.get_clock_ports()[0], clocks[0])
+
+        # Changing the settings it depends on does.
+        tool.set_setting("vlsi.inputs.clocks", [{"name": "clock", "period": "2 ns"}])
+        self.assertEqual(tool.get_clock_ports()[0].period, TimeValue("2 ns"))
+        database.update_project([{
+            "vlsi.inputs.mmmc_corners": [{"name": "ff", "type": "hold", "voltage": "1.1 V", "temp": "-40 C"}]
+        }])
+        self.assertEqual(tool.get_mmmc_corners()[0].name, "ff")
+        self.assertEqual(tool.get_clock_ports()[0].period, TimeValue("2 ns"))
+
+        # Memoized results are per-argument.
+        tool.set_setting("vlsi.inputs.supplies.power", [{"name": "VDD", "pin": "VDD"}])
+        tool.set_setting("vlsi.inputs.supplies.ground", [{"name": "VSS", "pin": "VSS"}])
+        self.assertEqual(tool.get_all_power_nets()[0].name, "VDD")
+        self.assertEqual(tool.get_all_ground_nets()[0].name, "VSS")
+
+    def test_dump_database(self) -> None:
+        """
+        Test that the database is only dumped for subprocesses when it changed.
+        """
+        tool = DummyTool()
+        tool.run_dir = tempfile.mkdtemp()
+        database = hammer_config.HammerDatabase()
+        hammer_vlsi.HammerVLSISettings.load_builtins_and_core(database)
+        database.update_project([{"dump_test.a": "a"}])
+        tool.set_database(database)
+
+        env = tool._subprocess_env
+        path = env["HAMMER_DATABASE"]
+        with open(path, "r") as f:
+            self.assertEqual(json.loads(f.read())["dump_test.a"], "a")
+        with hammer_config.HammerDatabase.open_compiled(env["HAMMER_COMPILED_DATABASE"]) as compiled:
+            self.assertEqual(compiled.get_setting("dump_test.a"), "a")
+        mtime = os.stat(path).st_mtime_ns
+        os.utime(path, ns=(mtime - 10**9, mtime - 10**9))
+        # Nothing changed, so the dump (and environment) is reused.
+        self.assertEqual(tool._subprocess_env, env)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime - 10**9)
+
+        tool.set_setting("dump_test.a", "b")
+        tool.set_setting("vlsi.core.compact_database_dump", True)
+        self.assertEqual(tool.dump_database(), path)
+        with open(path, "r") as f:
+            contents = f.read()
+        self.assertNotIn("\n", contents)
+        self.assertEqual(json.loads(contents)["dump_test.a"], "b")
+        self.assertEqual(sorted(os.listdir(tool.run_dir)), ["config_db_tmp.db", "config_db_tmp.json"])
+
+        shutil.rmtree(tool.run_dir)
+
     def test_bumps(self) -> None:
          """
          Test that HammerTool bump support works.
@@ -773,6 +946,58 @@ export lol=abc"cat"
 
 T = TypeVar('T')
 
+class HammerDriverTest(unittest.TestCase):
+    def test_snapshot(self) -> None:
+        """Test that drivers with unchanged inputs are restored from a snapshot."""
+        self.assertTrue(hammer_vlsi.HammerVLSISettings.set_hammer_vlsi_path_from_environment(),
+                        "hammer_vlsi_path must exist")
+        temp_dir = tempfile.mkdtemp()
+        json_path = os.path.join(temp_dir, "project.json")
+
+        def write_project(value: str) -> None:
+            with open(json_path, "w") as f:
+                f.write(json.dumps({
+                    "vlsi.core.technology": "nop",
+                    "test.value": value,
+                    "test.lazy": "${test.value}!",
+                    "test.lazy_meta": "lazysubst"
+                }))
+
+        options = hammer_vlsi.HammerDriverOptions(
+            environment_configs=[],
+            project_configs=[json_path],
+            log_file=os.path.join(temp_dir, "log.txt"),
+            obj_dir=temp_dir
+        )
+        write_project("first")
+        hits = hammer_vlsi.DriverSnapshot.hits
+        driver = hammer_vlsi.HammerDriver(options)
+        restored = hammer_vlsi.HammerDriver(options)
+        self.assertEqual(hammer_vlsi.DriverSnapshot.hits, hits + 1)
+        self.assertEqual(restored.database.get_config(), driver.database.get_config())
+        self.assertEqual(restored.input_files, driver.input_files)
+        self.assertTrue(json_path in restored.input_files)
+        assert restored.tech is not None and driver.tech is not None
+        self.assertEqual(restored.tech.config.to_dict(), driver.tech.config.to_dict())
+        self.assertEqual(restored.tech.cache_dir, driver.tech.cache_dir)
+        # The restored database can be updated like a loaded one.
+        restored.update_project_configs(restored.project_configs + [{"test.value": "updated"}])
+        self.assertEqual(restored.database.get_setting("test.lazy"), "updated!")
+
+        # Changing an input file invalidates the snapshot.
+        write_project("changed")
+        changed = hammer_vlsi.HammerDriver(options)
+        self.assertEqual(hammer_vlsi.DriverSnapshot.hits, hits + 1)
+        self.assertEqual(changed.database.get_setting("test.lazy"), "changed!")
+
+        # A driver with different options gets its own snapshot.
+        self.assertEqual(hammer_vlsi.HammerDriver(options, load_tech=False).tech, None)
+        self.assertEqual(hammer_vlsi.HammerDriver(options).database.get_setting("test.lazy"), "changed!")
+        self.assertEqual(hammer_vlsi.DriverSnapshot.hits, hits + 2)
+
+        shutil.rmtree(temp_dir)
+
+
 class HammerToolHooksTestContext:
     def __init__(self, test: unittest.TestCase) -> None:
         self.test = test  # type: unittest.TestCase
@@ -1038,6 +1263,200 @@ class HammerToolHooksTest(unittest.TestCase):
                     self.assertFalse(os.path.exists(file))
 
 
+class StepCacheTool(hammer_vlsi.DummyHammerTool):
+    """
+    Two-step tool whose steps communicate through the run_dir and a runtime setting.
+    """
+    def __init__(self) -> None:
+        self.ran = []  # type: List[str]
+
+    @property
+    def steps(self) -> List[hammer_vlsi.HammerToolStep]:
+        return self.make_steps_from_methods([
+            self.step1,
+            self.step2
+        ])
+
+    def step1(self) -> bool:
+        self.ran.append("step1")
+        with open(os.path.join(self.run_dir, "step1.txt"), "w") as f:
+            f.write(self.get_setting("step_cache_test.a"))
+        link = os.path.join(self.run_dir, "step1.link")
+        if os.path.lexists(link):
+            os.remove(link)
+        os.symlink("step1.txt", link)
+        self.set_setting("step_cache_test.from_step1", "step1 ran")
+        return True
+
+    def step2(self) -> bool:
+        self.ran.append("step2")
+        with open(os.path.join(self.run_dir, "step1.txt"), "r") as f:
+            contents = f.read()
+        with open(os.path.join(self.run_dir, "step2.txt"), "w") as f:
+            f.write(contents + self.get_setting("step_cache_test.b"))
+        return True
+
+
+class HammerToolStepDependenciesTest(unittest.TestCase):
+    def run_tool(self, temp_dir: str, settings: Dict[str, Any],
+                 hook_actions: List[hammer_vlsi.HammerToolHookAction] = []) -> StepCacheTool:
+        tool = StepCacheTool()
+        tool.logger = HammerVLSILogging.context("")
+        tool.run_dir = os.path.join(temp_dir, "rundir")
+        tool.input_files = [os.path.join(temp_dir, "input.v")]
+        database = hammer_config.HammerDatabase()
+        hammer_vlsi.HammerVLSISettings.load_builtins_and_core(database)
+        database.update_project([settings])
+        tool.set_database(database)
+        self.assertTrue(tool.run(hook_actions))
+        return tool
+
+    def test_step_cache(self) -> None:
+        """Test that unchanged steps are restored from the step cache."""
+        temp_dir = tempfile.mkdtemp()
+        input_file = os.path.join(temp_dir, "input.v")
+        step2_file = os.path.join(temp_dir, "rundir", "step2.txt")
+        with open(input_file, "w") as f:
+            f.write("module dummy; endmodule")
+        settings = {"vlsi.core.step_cache": True, "step_cache_test.a": "a", "step_cache_test.b": "b"}
+
+        self.assertEqual(self.run_tool(temp_dir, settings).ran, ["step1", "step2"])
+        self.assertTrue(os.path.isdir(os.path.join(temp_dir, "step-cache")))
+
+        # Nothing changed, so both steps are restored, including their files, symlinks and runtime settings.
+        os.remove(step2_file)
+        os.remove(os.path.join(temp_dir, "rundir", "step1.link"))
+        tool = self.run_tool(temp_dir, settings)
+        self.assertEqual(tool.ran, [])
+        self.assertEqual(tool.get_setting("step_cache_test.from_step1"), "step1 ran")
+        with open(step2_file, "r") as f:
+            self.assertEqual(f.read(), "ab")
+        self.assertEqual(os.readlink(os.path.join(temp_dir, "rundir", "step1.link")), "step1.txt")
+
+        # Only step2 reads step_cache_test.b.
+        settings["step_cache_test.b"] = "c"
+        self.assertEqual(self.run_tool(temp_dir, settings).ran, ["step2"])
+        with open(step2_file, "r") as f:
+            self.assertEqual(f.read(), "ac")
+
+        # Going back to an older value of a setting is a hit too.
+        settings["step_cache_test.b"] = "b"
+        self.assertEqual(self.run_tool(temp_dir, settings).ran, [])
+        with open(step2_file, "r") as f:
+            self.assertEqual(f.read(), "ab")
+
+        # Changing step1 (through its input files) re-runs everything after it.
+        with open(input_file, "w") as f:
+            f.write("module dummy2; endmodule")
+        self.assertEqual(self.run_tool(temp_dir, settings).ran, ["step1", "step2"])
+
+        # Skipping steps with resume hooks disables the cache for the rest of the run.
+        tool = self.run_tool(temp_dir, settings, [hammer_vlsi.HammerTool.make_post_resume_hook("step1")])
+        self.assertEqual(tool.ran, ["step2"])
+
+        shutil.rmtree(temp_dir)
+
+    def test_step_cache_store(self) -> None:
+        """Test that files which didn't change since the previous step are not hashed again."""
+        temp_dir = tempfile.mkdtemp()
+        run_dir = os.path.join(temp_dir, "rundir")
+        os.makedirs(run_dir)
+        with open(os.path.join(run_dir, "big.txt"), "w") as f:
+            f.write("big")
+        step_cache = hammer_vlsi.StepCache(os.path.join(temp_dir, "cache"))
+        hashed = []  # type: List[str]
+        hash_file = step_cache.hash_file
+
+        def counting_hash_file(path: str) -> str:
+            hashed.append(os.path.basename(path))
+            return hash_file(path)
+        step_cache.hash_file = counting_hash_file  # type: ignore
+
+        step_cache.store("step1", {}, [], None, run_dir)
+        self.assertEqual(hashed, ["big.txt"])
+        with open(os.path.join(run_dir, "new.txt"), "w") as f:
+            f.write("new")
+        entry = step_cache.store("step2", {}, [], None, run_dir)
+        self.assertEqual(hashed, ["big.txt", "new.txt"])
+        self.assertEqual(sorted(entry.files.keys()), ["big.txt", "new.txt"])
+
+        shutil.rmtree(temp_dir)
+
+    def test_timing_trace(self) -> None:
+        """Test that steps, subprocess jobs and config resolution are recorded into the timing trace."""
+        temp_dir = tempfile.mkdtemp()
+        trace_path = os.path.join(temp_dir, "trace.jsonl")
+        with open(os.path.join(temp_dir, "input.v"), "w") as f:
+            f.write("module dummy; endmodule")
+
+        self.assertFalse(HammerTrace.enabled())
+        HammerTrace.start(trace_path)
+        HammerVLSILogging.add_callback(HammerTrace.log_callback, HammerTrace.log_batch_callback)
+        HammerVLSILogging.start_async()
+        try:
+            with HammerTrace.span("test", "action"):
+                tool = self.run_tool(temp_dir, {"step_cache_test.a": "a", "step_cache_test.b": "b"})
+                job = hammer_vlsi.HammerLocalSubmitCommand().submit_async(["sh", "-c", "exit 3"], dict(os.environ),
+                                                                          tool.logger)
+                job.set_trace_span(HammerTrace.span("sh", "subprocess"))
+                self.assertEqual(job.wait(), 3)
+                HammerVLSILogging.context("trace").info("Traced message")
+        finally:
+            HammerVLSILogging.stop_async()
+            HammerVLSILogging.remove_callback(HammerTrace.log_callback)
+            HammerTrace.stop()
+        self.assertFalse(HammerTrace.enabled())
+        # Spans are free once tracing is stopped.
+        with HammerTrace.span("ignored", "action"):
+            pass
+
+        events = load_trace(trace_path)
+        spans = {(e["cat"], e["name"]): e for e in events if e["ph"] == "X"}
+        self.assertIn(("step", "step1"), spans)
+        self.assertIn(("step", "step2"), spans)
+        self.assertIn(("config", "resolve_database"), spans)
+        self.assertEqual(spans[("subprocess", "sh")]["args"]["returncode"], 3)
+        self.assertNotIn(("action", "ignored"), spans)
+        # Log messages are stamped with the time and thread of the log call, even when they are written asynchronously.
+        message = next(e for e in events if e["ph"] == "i" and e["args"]["message"] == "Traced message")
+        self.assertEqual(message["tid"], threading.get_ident())
+        action_span = spans[("action", "test")]
+        self.assertTrue(action_span["ts"] <= message["ts"] <= action_span["ts"] + action_span["dur"])
+
+        hotspots = {(h.category, h.name): h for h in summarize_traces(events)}
+        action = hotspots[("action", "test")]
+        self.assertEqual(action.count, 1)
+        # Time spent in the steps doesn't count as time spent in the action itself.
+        self.assertLessEqual(action.self_us,
+                             action.total_us - hotspots[("step", "step1")].total_us - hotspots[("step", "step2")].total_us)
+        self.assertEqual(to_chrome_trace(events)["traceEvents"], events)
+
+        shutil.rmtree(temp_dir)
+
+    def test_setting_access_tracing(self) -> None:
+        """Test that the settings read by each step are recorded into a manifest."""
+        temp_dir = tempfile.mkdtemp()
+        manifest_path = os.path.join(temp_dir, "rundir", "setting-accesses.json")
+        settings = {"vlsi.core.trace_setting_accesses": True, "step_cache_test.a": "a", "step_cache_test.b": "b"}
+        tool = self.run_tool(temp_dir, settings)
+        self.assertIsNone(tool.setting_tracer)
+        old_manifest = hammer_config.SettingAccessTracer.load_manifest(manifest_path)
+        self.assertEqual(list(old_manifest["steps"].keys()), ["step1", "step2"])
+        self.assertEqual(list(old_manifest["steps"]["step1"].keys()), ["step_cache_test.a"])
+        self.assertEqual(list(old_manifest["steps"]["step2"].keys()), ["step_cache_test.b"])
+
+        settings["step_cache_test.b"] = "c"
+        tool = self.run_tool(temp_dir, settings)
+        diff = hammer_config.SettingAccessTracer.diff(
+            old_manifest, hammer_config.SettingAccessTracer.load_manifest(manifest_path))
+        self.assertEqual(diff.changed_settings, {"step2": ["step_cache_test.b"]})
+        self.assertEqual(hammer_config.SettingAccessTracer.stale_steps(old_manifest, tool._database), ["step2"])
+        self.assertEqual(hammer_config.SettingAccessTracer.unread_settings(
+            [old_manifest], tool._database, "step_cache_test."), ["step_cache_test.from_step1"])
+
+        shutil.rmtree(temp_dir)
+
+
 class HammerSubmitCommandTestContext:
 
     def __init__(self, test: unittest.TestCase, cmd_type: str) -> None:
@@ -1085,6 +1504,9 @@ class HammerSubmitCommandTestContext:
                     "log_file": "test_log.log",
                     "bsub_binary": os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test",
                                                 "mock_bsub.sh"),
+                    "bjobs_binary": os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "test",
+                                                 "mock_bjobs.sh"),
+                    "poll_interval": 0.1,
                     "extra_args": ("-R", "myresources")
                 }}],
                 "synthesis.submit.settings_meta": "lazyappend",
@@ -1159,6 +1581,114 @@ class HammerSubmitCommandTest(unittest.TestCase):
             self.assertEqual(output[4 + has_resource], "COMMAND is: %s" % ' '.join(c.echo_command))
             self.assertEqual(output[5 + has_resource], ' '.join(c.echo_command_args))
 
+    def test_local_submit_async(self) -> None:
+        """ Test that local jobs can run concurrently, stream their output, and be cancelled """
+        with self.create_context("local") as c:
+            cmd = c.submit_command
+            jobs = [cmd.submit_async(["sh", "-c", "echo start {i}; sleep 0.2; echo end {i}; exit {i}".format(i=i)],
+                                     c.env, c.logger) for i in range(3)]
+            for i, job in enumerate(jobs):
+                self.assertEqual(list(job.output_lines()), ["start %d\n" % i, "end %d\n" % i])
+                self.assertEqual(job.wait(), i)
+                self.assertTrue(job.done())
+                self.assertEqual(job.result(), "start %d\nend %d\n" % (i, i))
+
+            job = cmd.submit_async(["sleep", "60"], c.env, c.logger)
+            job.cancel()
+            job.wait(timeout=10)
+            self.assertTrue(job.done())
+            self.assertTrue(job.cancelled)
+
+            # The blocking API is unchanged, and doesn't wait for job slots taken by background jobs.
+            slots = hammer_vlsi.HammerLocalSubmitCommand.job_slots()
+            taken = 0
+            while slots.acquire(blocking=False):
+                taken += 1
+            try:
+                self.assertEqual(cmd.submit(c.echo_command, c.env, c.logger), ' '.join(c.echo_command_args) + "\n")
+            finally:
+                for _ in range(taken):
+                    slots.release()
+
+    def test_local_submit_streaming(self) -> None:
+        """ Test that long outputs are streamed to line consumers and spilled to disk """
+        old_max_output_memory = hammer_vlsi.HammerSubmitJob.max_output_memory
+        hammer_vlsi.HammerSubmitJob.max_output_memory = 1000
+        try:
+            with self.create_context("local") as c:
+                errors = []  # type: List[str]
+                script = "for i in range(5000): print('ERROR' if i % 1000 == 0 else 'line', i)\nprint('no newline', end='')"
+                job = c.submit_command.submit_async(
+                    ["python3", "-c", script], c.env, c.logger,
+                    line_consumers=[lambda line: errors.append(line) if line.startswith("ERROR") else None])
+                self.assertEqual(job.wait(), 0)
+                self.assertEqual(errors, ["ERROR %d\n" % i for i in range(0, 5000, 1000)])
+                captured = job.captured_output
+                self.assertTrue(captured.spilled)
+                self.assertTrue(captured.complete)
+                self.assertEqual(captured.line_count, 5001)
+                self.assertEqual(captured.tail(2), ["line 4999\n", "no newline"])
+                self.assertEqual(len(list(job.output_lines())), 5001)
+                self.assertEqual(job.result().splitlines()[:2], ["ERROR 0", "line 1"])
+                # Closing the job deletes the spilled output.
+                job.close()
+                self.assertFalse(captured.spilled)
+                self.assertEqual(captured.tail(1), ["no newline"])
+        finally:
+            hammer_vlsi.HammerSubmitJob.max_output_memory = old_max_output_memory
+
+        # Without spilling, only the most recent output is kept.
+        output = hammer_vlsi.SubprocessOutput(10, spill=False)
+        output.append(["abcd\n", "efgh\n", "ijkl\n"])
+        self.assertFalse(output.complete)
+        self.assertEqual(output.text(), "efgh\nijkl\n")
+
+    def test_output_log_rate_limit(self) -> None:
+        """ Test that subprocess output printed on the console is rate-limited, but the log file keeps every line """
+        fd, path = tempfile.mkstemp(".log")
+        os.close(fd) # Don't leak file descriptors
+        filelogger = HammerVLSIFileLogger(path)
+        file_callback = filelogger.callback
+        HammerVLSILogging.add_callback(file_callback, filelogger.batch_callback)
+        now = [0.0]
+        try:
+            with HammerLoggingCaptureContext() as c:
+                mirror = hammer_vlsi.RateLimitedLogMirror(HammerVLSILogging.context("rate"), 2, lambda: now[0])
+                for i in range(5):
+                    mirror("line %d\n" % i)
+                now[0] = 1.5
+                mirror("line 5\n")
+                mirror.flush()
+        finally:
+            HammerVLSILogging.remove_callback(file_callback)
+            filelogger.close()
+        self.assertTrue(c.log_contains("line 1"))
+        self.assertFalse(c.log_contains("line 2"))
+        self.assertTrue(c.log_contains("(3 lines of output not shown on the console)"))
+        self.assertTrue(c.log_contains("line 5"))
+
+        with open(path, "r") as f:
+            logged = [line for line in f.read().splitlines() if "(" not in line]
+        self.assertEqual(logged, ["[rate] Level.DEBUG: line %d" % i for i in range(6)])
+        os.remove(path)
+
+    def test_lsf_submit_async(self) -> None:
+        """ Test that a non-blocking LSF submission is polled until completion """
+        with self.create_context("lsf") as c:
+            cmd = c.submit_command
+            assert isinstance(cmd, hammer_vlsi.HammerLSFSubmitCommand)
+            job = cmd.submit_async(c.echo_command, c.env, c.logger, cwd=c.temp_dir)
+            self.assertEqual(job.wait(timeout=30), 0)
+            output = job.result().splitlines()
+
+            self.assertNotIn("BLOCKING is: 1", output)
+            self.assertIn("COMMAND is: %s" % ' '.join(c.echo_command), output)
+            match = re.search(r"Job <(\w+)>", job.result())
+            assert match is not None
+            self.assertEqual(job.job_id, match.group(1))
+            # The job output is read from the log file once the job is done.
+            self.assertEqual(output[-1], ' '.join(c.echo_command_args))
+
 
 class HammerSignoffToolTestContext:
 
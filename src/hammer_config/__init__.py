@@ -2,4 +2,7 @@
 
 # https://stackoverflow.com/questions/34461987/python3-importerror-no-module-named-xxxx
 from .config_src import *
+from .config_cache import ConfigCache
 from .yaml2json import load_yaml
+from .access_tracer import *
+from .compiled import *
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  access_tracer.py
+#  Record which settings each step of a tool reads, and compare such records.
+#
+#  See LICENSE for licence details.
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from .config_src import HammerDatabase
+
+__all__ = ['MISSING_SETTING_HASH', 'hash_setting_value', 'setting_hash', 'SettingAccessTracer', 'ManifestDiff']
+
+# Hash recorded for settings which don't exist in the database.
+MISSING_SETTING_HASH = "missing"
+
+# Version of the manifest format written by SettingAccessTracer.
+_MANIFEST_VERSION = 1
+
+
+def hash_setting_value(value: Any) -> str:
+    """
+    Get a stable hash of a setting value.
+
+    :param value: JSON-like value of a setting.
+    :return: Hash of the value.
+    """
+    encoded = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def setting_hash(database: HammerDatabase, key: str) -> str:
+    """
+    Get the hash of the current value of the given setting.
+
+    :param database: Database to read the setting from.
+    :param key: Key of the setting.
+    :return: Hash of its value, or MISSING_SETTING_HASH if the setting doesn't exist.
+    """
+    config = database.get_config()
+    if key not in config:
+        return MISSING_SETTING_HASH
+    return hash_setting_value(config[key])
+
+
+# Struct that holds the differences between two setting access manifests.
+class ManifestDiff(NamedTuple('ManifestDiff', [
+    # Steps which only ran in the new manifest.
+    ('added_steps', List[str]),
+    # Steps which only ran in the old manifest.
+    ('removed_steps', List[str]),
+    # Map of step -> settings which the step read in only one of the manifests or whose values differ.
+    ('changed_settings', Dict[str, List[str]])
+])):
+    __slots__ = ()
+
+    @property
+    def changed_steps(self) -> List[str]:
+        """Steps which ran in both manifests but read different settings or values."""
+        return list(self.changed_settings.keys())
+
+    def is_empty(self) -> bool:
+        """Whether the manifests are equivalent."""
+        return len(self.added_steps) == 0 and len(self.removed_steps) == 0 and len(self.changed_settings) == 0
+
+
+class SettingAccessTracer:
+    """
+    Records the settings (and the hashes of their values) which each step of a tool run reads through get_setting
+    or checks with has_setting, and writes them into a dependency manifest.
+
+    The manifest is a JSON object of the form {"version": 1, "steps": {step name: {setting key: value hash}}}, with
+    the steps in the order in which they ran.
+    """
+
+    def __init__(self) -> None:
+        # Name of the step currently running, or None if accesses should not be recorded.
+        self.current_step = None  # type: Optional[str]
+        # Map of step -> (map of setting key -> hash of the value read).
+        self._accesses = {}  # type: Dict[str, Dict[str, str]]
+
+    def record_hash(self, key: str, value_hash: str) -> None:
+        """
+        Record that the current step read the given setting.
+
+        :param key: Key of the setting.
+        :param value_hash: Hash of the value which was read (see hash_setting_value), or MISSING_SETTING_HASH.
+        """
+        if self.current_step is not None:
+            self._accesses.setdefault(self.current_step, {})[key] = value_hash
+
+    def record_get(self, key: str, value: Any) -> None:
+        """
+        Record that the current step read the given value of the given setting.
+
+        :param key: Key of the setting.
+        :param value: Value which was read.
+        """
+        if self.current_step is not None:
+            self.record_hash(key, hash_setting_value(value))
+
+    def record_has(self, database: HammerDatabase, key: str) -> None:
+        """
+        Record that the current step checked whether the given setting exists.
+        Since the step might read it afterwards, its current value is recorded too.
+
+        :param database: Database which the setting was looked up in.
+        :param key: Key of the setting.
+        """
+        if self.current_step is not None:
+            self.record_hash(key, setting_hash(database, key))
+
+    def manifest(self) -> dict:
+        """
+        Get the dependency manifest of everything recorded so far.
+
+        :return: Manifest dictionary.
+        """
+        return {
+            "version": _MANIFEST_VERSION,
+            "steps": {step: dict(sorted(reads.items())) for step, reads in self._accesses.items()}
+        }
+
+    def write_manifest(self, path: str) -> None:
+        """
+        Atomically write the dependency manifest of everything recorded so far.
+
+        :param path: Path of the manifest file.
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(json.dumps(self.manifest(), separators=(',', ':')))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def load_manifest(path: str) -> dict:
+        """
+        Load a dependency manifest written by write_manifest.
+
+        :param path: Path of the manifest file.
+        :return: Manifest dictionary.
+        """
+        with open(path, "r") as f:
+            manifest = json.loads(f.read())
+        if not isinstance(manifest, dict) or manifest.get("version") != _MANIFEST_VERSION:
+            raise ValueError("{path} is not a setting access manifest".format(path=path))
+        return manifest
+
+    @staticmethod
+    def diff(old: dict, new: dict) -> ManifestDiff:
+        """
+        Compare two dependency manifests (e.g. of two runs of the same tool).
+
+        :param old: Old manifest.
+        :param new: New manifest.
+        :return: Differences between the manifests.
+        """
+        old_steps = old["steps"]  # type: Dict[str, Dict[str, str]]
+        new_steps = new["steps"]  # type: Dict[str, Dict[str, str]]
+        changed = {}  # type: Dict[str, List[str]]
+        for step, new_reads in new_steps.items():
+            if step not in old_steps:
+                continue
+            old_reads = old_steps[step]
+            keys = sorted(k for k in set(old_reads.keys()) | set(new_reads.keys()) if old_reads.get(k) != new_reads.get(k))
+            if len(keys) > 0:
+                changed[step] = keys
+        return ManifestDiff(
+            added_steps=[step for step in new_steps if step not in old_steps],
+            removed_steps=[step for step in old_steps if step not in new_steps],
+            changed_settings=changed
+        )
+
+    @staticmethod
+    def stale_steps(manifest: dict, database: HammerDatabase) -> List[str]:
+        """
+        Find the steps of a previous run whose settings have changed since, i.e. the steps which must be re-run.
+        Note that steps after a stale step may also need to be re-run if they depend on its outputs.
+
+        :param manifest: Manifest of the previous run.
+        :param database: Current database.
+        :return: Steps which read settings whose values differ in the given database, in the order they ran.
+        """
+        steps = manifest["steps"]  # type: Dict[str, Dict[str, str]]
+        return [step for step, reads in steps.items()
+                if any(setting_hash(database, key) != value_hash for key, value_hash in reads.items())]
+
+    @staticmethod
+    def unread_settings(manifests: Iterable[dict], database: HammerDatabase, prefix: str = "") -> List[str]:
+        """
+        Find the settings in the database which none of the given runs read (e.g. to find misspelled or obsolete
+        settings in a project config).
+
+        :param manifests: Manifests of the runs to consider.
+        :param database: Database to check.
+        :param prefix: Only consider settings starting with this prefix (e.g. "par.").
+        :return: Sorted list of settings which were never read.
+        """
+        read = set()  # type: Set[str]
+        for manifest in manifests:
+            for reads in manifest["steps"].values():
+                read.update(reads.keys())
+        internal = HammerDatabase.internal_keys()
+        return sorted(key for key in database.get_config().keys()
+                      if key.startswith(prefix) and key not in read and key not in internal
+                      and not key.endswith("_meta"))
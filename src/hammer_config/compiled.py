@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  compiled.py
+#  Read-only, memory-mapped, key-indexed database of resolved settings.
+#
+#  See LICENSE for licence details.
+
+import json
+import mmap
+import os
+import struct
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+__all__ = ['CompiledHammerDatabase', 'write_compiled_database', 'is_compiled_database']
+
+# File layout:
+#   header: magic, format version, number of keys, offset of the key blob, offset of the value blob
+#   index: one (key offset, key length, value offset, value length) entry per key, sorted by key
+#   key blob: UTF-8 keys
+#   value blob: compact JSON values
+# Offsets in the index are relative to the start of their blob.
+_MAGIC = b"HAMMERDB"
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sIIQQ")
+_INDEX_ENTRY = struct.Struct("<QQQQ")
+
+
+def write_compiled_database(config: Dict[str, Any], path: str) -> None:
+    """
+    Atomically write the given resolved config (e.g. HammerDatabase.get_config()) as a compiled database.
+
+    :param config: Map of setting key -> resolved value.
+    :param path: Path of the compiled database.
+    """
+    items = sorted((key.encode("utf-8"), json.dumps(value, sort_keys=True, separators=(',', ':')).encode("utf-8"))
+                   for key, value in config.items())
+    index = []  # type: List[bytes]
+    key_offset = 0
+    value_offset = 0
+    for key, value in items:
+        index.append(_INDEX_ENTRY.pack(key_offset, len(key), value_offset, len(value)))
+        key_offset += len(key)
+        value_offset += len(value)
+    keys_start = _HEADER.size + _INDEX_ENTRY.size * len(items)
+    values_start = keys_start + key_offset
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, len(items), keys_start, values_start))
+            f.write(b"".join(index))
+            f.write(b"".join(key for key, value in items))
+            f.write(b"".join(value for key, value in items))
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def is_compiled_database(path: str) -> bool:
+    """
+    Check whether the given file is a compiled database (as opposed to e.g. a JSON database).
+
+    :param path: Path of the file.
+    :return: True if the file starts with the compiled database header.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(_MAGIC)) == _MAGIC
+    except OSError:
+        return False
+
+
+class CompiledHammerDatabase:
+    """
+    Read-only database of resolved settings, backed by a memory-mapped file written by write_compiled_database.
+    Opening it doesn't read or parse the whole file; each lookup is a binary search over the key index, and only
+    the values which are looked up are decoded.
+    """
+
+    def __init__(self, path: str) -> None:
+        """
+        Open a compiled database.
+
+        :param path: Path of the compiled database.
+        """
+        self.path = path  # type: str
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap.size() < _HEADER.size:
+            self.close()
+            raise ValueError("{path} is not a compiled hammer database".format(path=path))
+        magic, version, self._count, self._keys_start, self._values_start = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != _FORMAT_VERSION:
+            self.close()
+            raise ValueError("{path} is not a version {v} compiled hammer database".format(path=path, v=_FORMAT_VERSION))
+        # Map of key -> decoded value of the keys looked up so far.
+        self._values = {}  # type: Dict[str, Any]
+
+    def close(self) -> None:
+        """Unmap the database."""
+        self._mmap.close()
+
+    def __enter__(self) -> "CompiledHammerDatabase":
+        return self
+
+    def __exit__(self, type, value, traceback) -> bool:
+        self.close()
+        # Propagate any exception.
+        return False
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, i: int) -> Tuple[int, int, int, int]:
+        return _INDEX_ENTRY.unpack_from(self._mmap, _HEADER.size + _INDEX_ENTRY.size * i)
+
+    def _key(self, i: int) -> bytes:
+        key_offset, key_length, value_offset, value_length = self._entry(i)
+        start = self._keys_start + key_offset
+        return self._mmap[start:start + key_length]
+
+    def _find(self, key: str) -> Optional[int]:
+        """Find the index entry of the given key, or None if it doesn't exist."""
+        target = key.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key(mid) < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self._count and self._key(low) == target:
+            return low
+        return None
+
+    def keys(self) -> Iterator[str]:
+        """Iterate over all keys, in sorted order."""
+        for i in range(self._count):
+            yield self._key(i).decode("utf-8")
+
+    def has_setting(self, key: str) -> bool:
+        """
+        Check if the given key exists.
+
+        :param key: Desired key.
+        """
+        return key in self._values or self._find(key) is not None
+
+    def __contains__(self, item: str) -> bool:
+        """Alias for has_setting()."""
+        return self.has_setting(item)
+
+    def get_setting(self, key: str, nullvalue: Any = None) -> Any:
+        """
+        Retrieve the given key.
+
+        :param key: Desired key.
+        :param nullvalue: Value to return out for nulls.
+        :return: The given config
+        """
+        if key in self._values:
+            value = self._values[key]
+        else:
+            i = self._find(key)
+            if i is None:
+                raise KeyError("Key " + key + " is missing")
+            key_offset, key_length, value_offset, value_length = self._entry(i)
+            start = self._values_start + value_offset
+            value = json.loads(self._mmap[start:start + value_length].decode("utf-8"))
+            self._values[key] = value
+        return nullvalue if value is None else value
+
+    def get_settings(self, keys: Iterable[str], nullvalue: Any = None) -> Dict[str, Any]:
+        """
+        Retrieve many keys at once.
+
+        :param keys: Desired keys.
+        :param nullvalue: Value to return out for nulls.
+        :return: Map of key -> value of each key. Raises KeyError if any of them is missing.
+        """
+        return {key: self.get_setting(key, nullvalue) for key in keys}
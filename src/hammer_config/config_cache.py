@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  config_cache.py
+#  On-disk cache of parsed and unpacked config files.
+#
+#  See LICENSE for licence details.
+
+# pylint: disable=invalid-name
+
+from typing import Callable, List, Optional, Tuple
+
+import hashlib
+import marshal
+import os
+import sys
+import tempfile
+
+__all__ = ['ConfigCache']
+
+# Bump this whenever the format of cache entries or the way configs are
+# parsed/unpacked changes.
+_FORMAT_VERSION = 1
+
+_ENTRY_SUFFIX = ".config"
+
+
+def _default_cache_dir() -> str:
+    """Get the default location of the cache (the HAMMER_CONFIG_CACHE_DIR environment variable or the user cache)."""
+    if "HAMMER_CONFIG_CACHE_DIR" in os.environ:
+        return os.environ["HAMMER_CONFIG_CACHE_DIR"]
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(xdg_cache_home, "hammer", "configs")
+
+
+class ConfigCache:
+    """
+    Cache of parsed and unpacked config files (defaults.yml, builtins.yml,
+    tech JSONs, project YAMLs, ...) so that repeated hammer invocations don't
+    have to re-parse them.
+
+    Entries are keyed by absolute path and validated against the file's mtime
+    and size; if those changed, the entry is still used when the contents
+    hash to the same value. Entries are serialized with marshal and the least
+    recently used entries are evicted once the cache exceeds max_size bytes.
+
+    The cache is opt-in: it is enabled by setting enabled to True (or the
+    HAMMER_CONFIG_CACHE environment variable to 1).
+    """
+
+    enabled = os.environ.get("HAMMER_CONFIG_CACHE", "0") == "1"  # type: bool
+
+    # Directory in which cache entries are stored.
+    cache_dir = _default_cache_dir()  # type: str
+
+    # Maximum total size of all cache entries in bytes.
+    max_size = 64 * 1024 * 1024  # type: int
+
+    # Statistics, mainly for testing and debugging.
+    hits = 0  # type: int
+    misses = 0  # type: int
+
+    @classmethod
+    def entry_path(cls, filename: str) -> str:
+        """
+        Get the path of the cache entry for the given config file.
+
+        :param filename: Path to the config file.
+        :return: Path to the cache entry.
+        """
+        key = "{version}:{python}:{path}".format(version=_FORMAT_VERSION, python=sys.version_info[:2],
+                                                 path=os.path.abspath(filename))
+        return os.path.join(cls.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + _ENTRY_SUFFIX)
+
+    @classmethod
+    def load(cls, filename: str, contents_func: Callable[[], str],
+             parse_func: Callable[[str], Optional[dict]]) -> Optional[dict]:
+        """
+        Load the given config file through the cache.
+
+        :param filename: Path to the config file.
+        :param contents_func: Function which reads the contents of the config file.
+        :param parse_func: Function which parses the contents of the config file. Its result must be serializable
+                           with marshal.
+        :return: Parsed config, as returned by parse_func.
+        """
+        if not cls.enabled:
+            return parse_func(contents_func())
+
+        stat = os.stat(filename)
+        entry_path = cls.entry_path(filename)
+        entry = cls._read_entry(entry_path)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            cls.hits += 1
+            cls._touch(entry_path)
+            return entry[3]
+
+        contents = contents_func()
+        contents_hash = hashlib.sha256(contents.encode("utf-8")).hexdigest()
+        if entry is not None and entry[2] == contents_hash:
+            cls.hits += 1
+            parsed = entry[3]
+        else:
+            cls.misses += 1
+            parsed = parse_func(contents)
+        cls._write_entry(entry_path, (stat.st_mtime_ns, stat.st_size, contents_hash, parsed))
+        return parsed
+
+    @classmethod
+    def clear(cls) -> None:
+        """Remove all entries from the cache."""
+        for entry_path, _, _ in cls._list_entries():
+            cls._remove(entry_path)
+
+    @classmethod
+    def _read_entry(cls, entry_path: str) -> Optional[Tuple[int, int, str, Optional[dict]]]:
+        """Read the given cache entry, returning None if it doesn't exist or is unreadable."""
+        try:
+            with open(entry_path, "rb") as f:
+                entry = marshal.load(f)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(entry, tuple) or len(entry) != 4:
+            return None
+        return entry
+
+    @classmethod
+    def _write_entry(cls, entry_path: str, entry: Tuple[int, int, str, Optional[dict]]) -> None:
+        """Atomically write the given cache entry and evict old entries if necessary."""
+        try:
+            data = marshal.dumps(entry)
+        except ValueError:
+            # Not serializable; just don't cache it.
+            return
+        try:
+            os.makedirs(cls.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=cls.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, entry_path)
+            except OSError:
+                cls._remove(temp_path)
+                raise
+        except OSError:
+            # The cache is only an optimization.
+            return
+        cls._evict()
+
+    @classmethod
+    def _list_entries(cls) -> List[Tuple[str, float, int]]:
+        """Get a list of (path, last use time, size) of all cache entries."""
+        try:
+            names = os.listdir(cls.cache_dir)
+        except OSError:
+            return []
+        entries = []  # type: List[Tuple[str, float, int]]
+        for name in names:
+            if not name.endswith(_ENTRY_SUFFIX):
+                continue
+            entry_path = os.path.join(cls.cache_dir, name)
+            try:
+                stat = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((entry_path, stat.st_mtime, stat.st_size))
+        return entries
+
+    @classmethod
+    def _evict(cls) -> None:
+        """Remove the least recently used entries until the cache fits within max_size."""
+        entries = cls._list_entries()
+        total_size = sum(map(lambda entry: entry[2], entries))
+        for entry_path, _, size in sorted(entries, key=lambda entry: entry[1]):
+            if total_size <= cls.max_size:
+                break
+            cls._remove(entry_path)
+            total_size -= size
+
+    @staticmethod
+    def _touch(entry_path: str) -> None:
+        """Mark the given entry as recently used."""
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        """Remove the given file if it exists."""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -9,12 +9,18 @@
 
 # pylint: disable=invalid-name
 
-from typing import Iterable, List, Union, Callable, Any, Dict, Set, NamedTuple, Tuple, Optional
+from typing import Iterable, Iterator, List, Union, Callable, Any, Deque, Dict, Set, NamedTuple, Tuple, Optional
 
-from hammer_utils import deepdict, topological_sort
+from hammer_logging import HammerTrace
+from hammer_utils import deepdict
+from .compiled import CompiledHammerDatabase, write_compiled_database
+from .config_cache import ConfigCache
 from .yaml2json import load_yaml  # grumble grumble
 
+from collections import deque
+from contextlib import contextmanager
 from functools import reduce, lru_cache
+import copy
 import json
 import numbers
 import os
@@ -99,7 +105,8 @@ def get_meta_directives() -> Dict[str, MetaDirective]:
             raise ValueError("Trying to append to non-list setting %s" % (key))
         if not isinstance(value, list):
             raise ValueError("Trying to append to list %s with non-list %s" % (key, str(value)))
-        config_dict[key] += value
+        # Don't append in place since the list may be shared with other configs.
+        config_dict[key] = config_dict[key] + value
 
     def append_rename(key: str, value: Any, target_setting: str, replacement_setting: str) -> Optional[Tuple[Any, str]]:
         return [replacement_setting, value], "crossappend"
@@ -179,10 +186,6 @@ def get_meta_directives() -> Dict[str, MetaDirective]:
                                                  target_settings=crossappendref_targets,
                                                  rename_target=crossappendref_rename)
 
-    def subst_str(input_str: str, replacement_func: Callable[[str], str]) -> str:
-        """Substitute ${...}"""
-        return re.sub(__VARIABLE_EXPANSION_REGEX, lambda x: replacement_func(x.group(1)), input_str)
-
     def subst_action(config_dict: dict, key: str, value: Any, params: MetaDirectiveParams) -> None:
         def perform_subst(value: Union[str, List[str]]) -> Union[str, List[str]]:
             """
@@ -195,9 +198,9 @@ def get_meta_directives() -> Dict[str, MetaDirective]:
             newval = ""  # type: Union[str, List[str]]
 
             if isinstance(value, list):
-                newval = list(map(lambda input_str: subst_str(input_str, lambda key: config_dict[key]), value))
+                newval = list(map(lambda input_str: _subst_str(input_str, config_dict.__getitem__), value))
             else:
-                newval = subst_str(value, lambda key: config_dict[key])
+                newval = _subst_str(value, config_dict.__getitem__)
             return newval
 
         config_dict[key] = perform_subst(value)
@@ -219,9 +222,7 @@ def get_meta_directives() -> Dict[str, MetaDirective]:
         output_vars = []  # type: List[str]
 
         for subst_value in subst_strings:
-            matches = re.finditer(__VARIABLE_EXPANSION_REGEX, subst_value, re.DOTALL)
-            for match in matches:
-                output_vars.append(match.group(1))
+            output_vars.extend(_parse_subst_template(subst_value)[1::2])
 
         return output_vars
 
@@ -231,7 +232,7 @@ def get_meta_directives() -> Dict[str, MetaDirective]:
         if target_setting not in subst_targets(key, value):
             return None
 
-        new_value = subst_str(value, lambda key: "${" + replacement_setting + "}" if key == target_setting else key)
+        new_value = _subst_str(value, lambda key: "${" + (replacement_setting if key == target_setting else key) + "}")
         return new_value, "subst"
 
     directives['subst'] = MetaDirective(action=subst_action,
@@ -413,7 +414,39 @@ def reverse_unpack(input_dict: dict) -> dict:
     return output_dict
 
 
-__VARIABLE_EXPANSION_REGEX = r'\${([a-zA-Z_\-\d.]+)}'
+__VARIABLE_EXPANSION_REGEX = re.compile(r'\${([a-zA-Z_\-\d.]+)}')
+
+
+@lru_cache(maxsize=16384)
+def _parse_subst_template(template: str) -> Tuple[str, ...]:
+    """
+    Parse a subst template into a token list, alternating between literal
+    text and referenced settings, which always starts and ends with literal
+    text. e.g. "${a}/b/${c}" becomes ("", "a", "/b/", "c", "").
+    Parsed templates are cached since the same templates get expanded every
+    time configs are combined.
+
+    :param template: Template string containing ${...} references.
+    :return: Token list of the template.
+    """
+    return tuple(__VARIABLE_EXPANSION_REGEX.split(template))
+
+
+def _subst_str(template: str, replacement_func: Callable[[str], str]) -> str:
+    """
+    Substitute the ${...} references in the given template.
+
+    :param template: Template string containing ${...} references.
+    :param replacement_func: Function which gets the replacement for a referenced setting.
+    :return: Substituted string.
+    """
+    tokens = _parse_subst_template(template)
+    if len(tokens) == 1:
+        return template
+    pieces = list(tokens)
+    for i in range(1, len(pieces), 2):
+        pieces[i] = replacement_func(pieces[i])
+    return "".join(pieces)
 
 
 def update_and_expand_meta(config_dict: dict, meta_dict: dict) -> dict:
@@ -421,6 +454,11 @@ def update_and_expand_meta(config_dict: dict, meta_dict: dict) -> dict:
     Expand the meta directives for the given config dict and return a new
     dictionary containing the updated settings with respect to the base config_dict.
 
+    Neither config_dict nor meta_dict are modified, and the returned
+    dictionary shares values with both of them (values are never modified in
+    place by meta directives), so it must be deep copied before it is handed
+    out to code which might modify it.
+
     :param config_dict: Base config.
     :param meta_dict: Dictionary with potentially new meta directives.
     :return: New dictionary with meta_dict updating config_dict.
@@ -428,10 +466,10 @@ def update_and_expand_meta(config_dict: dict, meta_dict: dict) -> dict:
     assert isinstance(config_dict, dict)
     assert isinstance(meta_dict, dict)
 
-    newdict = deepdict(config_dict)
+    newdict = dict(config_dict)
 
     # Find meta directives.
-    meta_dict = deepdict(meta_dict)  # create a copy so we can remove items.
+    meta_dict = dict(meta_dict)  # create a copy so we can remove items.
     meta_dict_keys = list(meta_dict.keys())
     meta_keys = filter(lambda k: k.endswith("_meta"), meta_dict_keys)
 
@@ -528,10 +566,24 @@ def update_and_expand_meta(config_dict: dict, meta_dict: dict) -> dict:
         del meta_dict[meta_key]
         del meta_dict[setting]
 
-    newdict.update(deepdict(meta_dict))  # Update everything else.
+    newdict.update(meta_dict)  # Update everything else.
     return newdict
 
 
+# What pop_overlay needs to undo push_overlay.
+_OverlayUndo = NamedTuple('_OverlayUndo', [
+    # Version of the database right after the push.
+    ('version', int),
+    # Entries of the layer cache from the overlays layer upwards before the push.
+    ('layer_cache', List[dict]),
+    # Settings changed in the cached config by the push and their previous
+    # values, or None if the push did not update the cached config in place.
+    ('previous', Optional[Dict[str, Any]]),
+    # Settings added to the cached config by the push.
+    ('added', List[str])
+])
+
+
 class HammerDatabase:
     """
     Define a database which is composed of a set of overridable configs.
@@ -550,6 +602,7 @@ class HammerDatabase:
     - technology
     - environment
     - project
+    - overlays (temporary configs, e.g. for a single module in a hierarchical run)
     - runtime (settings lazyally updated during the run a hammer run)
     """
 
@@ -560,36 +613,148 @@ class HammerDatabase:
         self.technology = []  # type: List[dict]
         self.environment = []  # type: List[dict]
         self.project = []  # type: List[dict]
+        # Stack of temporary configs; see push_overlay.
+        self.overlays = []  # type: List[dict]
         self._runtime = {}  # type: Dict[str, Any]
 
         self.__config_cache = {}  # type: dict
         self.__config_cache_dirty = False  # type: bool
 
+        # Merged and meta-expanded (but with lazy metas still unresolved)
+        # config after each layer in __layers(), so that updating one layer
+        # only recombines that layer and the ones above it.
+        self.__layer_cache = []  # type: List[dict]
+        # Incremented whenever anything in the database changes.
+        self.__version = 0  # type: int
+
+        # Execution plan of the lazy metas in __config_cache.
+        self.__lazy_plan = _LazyMetaPlan(order=[], templates={}, dependents={})  # type: _LazyMetaPlan
+
+        # How to undo each overlay in overlays.
+        self.__overlay_undo = []  # type: List[_OverlayUndo]
+
     @property
     def runtime(self) -> List[dict]:
         return [self._runtime]
 
+    @property
+    def version(self) -> int:
+        """
+        Version of this database, which changes whenever any setting might
+        have changed. Useful to know when anything derived from the database
+        needs to be recomputed.
+        """
+        return self.__version
+
     @staticmethod
     def internal_keys() -> Set[str]:
         """Internal keys that shouldn't show up in any final config."""
         return {_CONFIG_PATH_KEY, _NEXT_FREE_INDEX_KEY}
 
+    # Indices of each layer in __layers().
+    _BUILTINS_LAYER = 0
+    _CORE_LAYER = 1
+    _TOOLS_LAYER = 2
+    _TECHNOLOGY_LAYER = 3
+    _ENVIRONMENT_LAYER = 4
+    _PROJECT_LAYER = 5
+    _OVERLAYS_LAYER = 6
+    _RUNTIME_LAYER = 7
+
+    def __layers(self) -> List[List[dict]]:
+        """Get all layers of configs in increasing order of precedence."""
+        return [self.builtins, self.core, self.tools, self.technology, self.environment, self.project, self.overlays,
+                self.runtime]
+
+    def __invalidate(self, layer: int) -> None:
+        """
+        Mark the given layer (and therefore every layer above it) as changed.
+
+        :param layer: Index of the layer in __layers().
+        """
+        del self.__layer_cache[layer:]
+        self.__config_cache_dirty = True
+        self.__version += 1
+
     def get_config(self) -> dict:
         """
         Get the config of this database after all the overrides have been dealt with.
         """
         if self.__config_cache_dirty:
-            self.__config_cache = combine_configs(
-                [{}] + self.builtins + self.core + self.tools + self.technology + self.environment +
-                self.project + self.runtime)
+            layers = self.__layers()
+            with HammerTrace.span("resolve_database", "config", cached_layers=len(self.__layer_cache),
+                                  layers=len(layers)):
+                expanded = self.__layer_cache[-1] if len(self.__layer_cache) > 0 else {}  # type: dict
+                for layer in layers[len(self.__layer_cache):]:
+                    expanded = reduce(update_and_expand_meta, layer, expanded)
+                    self.__layer_cache.append(expanded)
+                self.__config_cache, self.__lazy_plan = _resolve_lazy_metas(expanded)
             self.__config_cache_dirty = False
         return self.__config_cache
 
-    def get_database_json(self) -> str:
+    def get_snapshot(self) -> dict:
+        """
+        Get the whole state of this database (all layers and their resolved config) as plain values which can be
+        serialized with marshal or JSON, e.g. to save a fully loaded database. See from_snapshot.
+        Overlays are temporary, so the database must not have any.
+        """
+        if len(self.overlays) > 0:
+            raise ValueError("Cannot snapshot a database with overlays")
+        config = self.get_config()
+        return {
+            "layers": [self.builtins, self.core, self.tools, self.technology, self.environment, self.project,
+                       self.overlays, self._runtime],
+            "layer_cache": self.__layer_cache,
+            "config": config,
+            "lazy_plan": list(self.__lazy_plan)
+        }
+
+    @staticmethod
+    def from_snapshot(snapshot: dict) -> "HammerDatabase":
+        """
+        Create a database from a snapshot made by get_snapshot, without recombining any configs.
+        The database takes ownership of the snapshot's values.
+
+        :param snapshot: Snapshot of a database.
+        :return: Database with the same state as the database of the snapshot.
+        """
+        database = HammerDatabase()
+        (database.builtins, database.core, database.tools, database.technology, database.environment,
+         database.project, database.overlays, database._runtime) = snapshot["layers"]
+        database.__layer_cache = list(snapshot["layer_cache"])
+        database.__config_cache = snapshot["config"]
+        order, templates, dependents = snapshot["lazy_plan"]
+        database.__lazy_plan = _LazyMetaPlan(order=list(order), templates=dict(templates),
+                                             dependents=dict(dependents))
+        database.__config_cache_dirty = False
+        return database
+
+    def get_database_json(self, compact: bool = False) -> str:
         """Get the database (get_config) in JSON form as a string.
+
+        :param compact: Omit all indentation and whitespace (faster and smaller, but not human-readable).
         """
+        if compact:
+            return json.dumps(self.get_config(), sort_keys=True, separators=(',', ':'))
         return json.dumps(self.get_config(), sort_keys=True, indent=4, separators=(',', ': '))
 
+    def write_compiled(self, path: str) -> None:
+        """Write the database (get_config) as a compiled database, which can be read with open_compiled().
+
+        :param path: Path of the compiled database.
+        """
+        write_compiled_database(self.get_config(), path)
+
+    @staticmethod
+    def open_compiled(path: str) -> CompiledHammerDatabase:
+        """Open a compiled database written by write_compiled(), for fast read-only lookups of single keys without
+        loading the whole database.
+
+        :param path: Path of the compiled database.
+        :return: Read-only compiled database.
+        """
+        return CompiledHammerDatabase(path)
+
     def get(self, key: str) -> Any:
         """Alias for get_setting()."""
         return self.get_setting(key)
@@ -619,12 +784,142 @@ class HammerDatabase:
     def set_setting(self, key: str, value: Any) -> None:
         """
         Set the given key. The setting will be placed into the runtime dictionary.
+        If possible, only the given key and the lazy settings which depend on
+        it are re-resolved instead of recombining the whole database.
 
         :param key: Key
         :param value: Value for key
         """
         self._runtime[key] = value
-        self.__config_cache_dirty = True
+        del self.__layer_cache[self._RUNTIME_LAYER:]
+        self.__version += 1
+        if self.__config_cache_dirty or not self.__update_incrementally(key, value):
+            self.__config_cache_dirty = True
+
+    def __update_incrementally(self, key: str, value: Any) -> bool:
+        """
+        Try to update the cached config for a new runtime value of the given
+        key by re-resolving only the lazy settings which depend on it.
+
+        :param key: Key which was set.
+        :param value: New value of the key.
+        :return: True if the cached config was updated, False if the whole
+                 database needs to be recombined instead.
+        """
+        # Meta directives, lazy settings (whose templates get applied to the
+        # runtime value) and internal keys need the full treatment.
+        if key.endswith("_meta") or key in self.__lazy_plan.templates or key in self.internal_keys():
+            return False
+
+        config = self.__config_cache
+        config[key] = copy.deepcopy(value)
+        try:
+            for setting in self.__lazy_plan.affected_by(key):
+                self.__lazy_plan.resolve(config, setting)
+        except Exception:  # pylint: disable=broad-except
+            # Leave any errors to be reported by the full recombine.
+            return False
+        return True
+
+    def push_overlay(self, config: dict) -> None:
+        """
+        Temporarily add a config on top of the project configs (but below the
+        runtime settings), e.g. the config snippet of a single module in a
+        hierarchical run. Remove it again with pop_overlay, or use overlay.
+        If possible, only the overlay's settings and the lazy settings which
+        depend on them are resolved against the cached config instead of
+        recombining the database.
+
+        :param config: Unpacked config to add.
+        """
+        layer_cache = self.__layer_cache[self._OVERLAYS_LAYER:]
+        self.overlays.append(config)
+        del self.__layer_cache[self._OVERLAYS_LAYER:]
+        self.__version += 1
+        previous = None  # type: Optional[Dict[str, Any]]
+        added = []  # type: List[str]
+        if not self.__config_cache_dirty:
+            previous, added = self.__overlay_incrementally(config)
+        if previous is None:
+            self.__config_cache_dirty = True
+        self.__overlay_undo.append(_OverlayUndo(version=self.__version, layer_cache=layer_cache,
+                                                previous=previous, added=added))
+
+    def __overlay_incrementally(self, config: dict) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+        """
+        Try to update the cached config for a new overlay by re-resolving only
+        the overlay's settings and the lazy settings which depend on them.
+
+        :param config: Overlay which was pushed.
+        :return: Tuple of (previous values of the changed settings, added
+                 settings), or (None, []) if the whole database needs to be
+                 recombined instead.
+        """
+        internal_keys = self.internal_keys()
+        keys = [key for key in config if key not in internal_keys]
+        # Meta directives and lazy settings need the full treatment, and
+        # runtime settings take precedence over overlays.
+        if any(key.endswith("_meta") or key in self.__lazy_plan.templates or key in self._runtime for key in keys):
+            return None, []
+
+        config_cache = self.__config_cache
+        changed = keys + self.__lazy_plan.affected_by(*keys)
+        previous = {key: config_cache[key] for key in changed if key in config_cache}  # type: Dict[str, Any]
+        added = [key for key in changed if key not in config_cache]
+        try:
+            for key in keys:
+                config_cache[key] = copy.deepcopy(config[key])
+            for setting in changed[len(keys):]:
+                self.__lazy_plan.resolve(config_cache, setting)
+        except Exception:  # pylint: disable=broad-except
+            # Leave any errors to be reported by the full recombine.
+            self.__restore_settings(previous, added)
+            return None, []
+        return previous, added
+
+    def __restore_settings(self, previous: Dict[str, Any], added: List[str]) -> None:
+        """Undo changes to the cached config (see __overlay_incrementally)."""
+        self.__config_cache.update(previous)
+        for key in added:
+            self.__config_cache.pop(key, None)
+
+    def pop_overlay(self) -> dict:
+        """
+        Remove the most recently pushed overlay (see push_overlay).
+        If nothing else changed since it was pushed, the cached config is
+        restored without recombining the database.
+
+        :return: The removed overlay.
+        """
+        if len(self.overlays) == 0:
+            raise ValueError("No overlay to pop")
+        undo = self.__overlay_undo.pop()
+        config = self.overlays.pop()
+        if undo.previous is not None and undo.version == self.__version:
+            self.__restore_settings(undo.previous, undo.added)
+            self.__layer_cache.extend(undo.layer_cache)
+            self.__version += 1
+            if len(self.__overlay_undo) > 0:
+                # The database is back to how it was right after the outer
+                # push, so that overlay can still be popped in place.
+                self.__overlay_undo[-1] = self.__overlay_undo[-1]._replace(version=self.__version)
+        else:
+            self.__invalidate(self._OVERLAYS_LAYER)
+        return config
+
+    @contextmanager
+    def overlay(self, config: dict) -> Iterator[None]:
+        """
+        Context manager which adds a config on top of the project configs for
+        the duration of the with block. See push_overlay.
+
+        :param config: Unpacked config to add.
+        """
+        self.push_overlay(config)
+        try:
+            yield
+        finally:
+            self.pop_overlay()
 
     def has_setting(self, key: str) -> bool:
         """
@@ -640,42 +935,42 @@ class HammerDatabase:
         Update the core config with the given core config.
         """
         self.core = core_config
-        self.__config_cache_dirty = True
+        self.__invalidate(self._CORE_LAYER)
 
     def update_tools(self, tools_config: List[dict]) -> None:
         """
         Update the tools config with the given tools config.
         """
         self.tools = tools_config
-        self.__config_cache_dirty = True
+        self.__invalidate(self._TOOLS_LAYER)
 
     def update_technology(self, technology_config: List[dict]) -> None:
         """
         Update the technology config with the given technology config.
         """
         self.technology = technology_config
-        self.__config_cache_dirty = True
+        self.__invalidate(self._TECHNOLOGY_LAYER)
 
     def update_environment(self, environment_config: List[dict]) -> None:
         """
         Update the environment config with the given environment config.
         """
         self.environment = environment_config
-        self.__config_cache_dirty = True
+        self.__invalidate(self._ENVIRONMENT_LAYER)
 
     def update_project(self, project_config: List[dict]) -> None:
         """
         Update the project config with the given project config.
         """
         self.project = project_config
-        self.__config_cache_dirty = True
+        self.__invalidate(self._PROJECT_LAYER)
 
     def update_builtins(self, builtins_config: List[dict]) -> None:
         """
         Update the builtins config with the given builtins config.
         """
         self.builtins = builtins_config
-        self.__config_cache_dirty = True
+        self.__invalidate(self._BUILTINS_LAYER)
 
 
 def load_config_from_string(contents: str, is_yaml: bool, path: str = "unspecified") -> dict:
@@ -697,6 +992,7 @@ def load_config_from_file(filename: str, strict: bool = False) -> dict:
     Load config from a filename, returning a blank dictionary if the file is
     empty, instead of an error.
     Supports .yml and .json, and will raise an error otherwise.
+    Parsed files are cached on disk (see ConfigCache).
 
     :param filename: Filename to the config in .yml or .json.
     :param strict: Set to true to error if the file is not found.
@@ -709,9 +1005,18 @@ def load_config_from_file(filename: str, strict: bool = False) -> dict:
     else:
         raise ValueError("Invalid config type " + filename)
 
-    try:
+    def read_contents() -> str:
         with open(filename, "r") as f:
-            file_contents = f.read()
+            return f.read()
+
+    def parse_contents(file_contents: str) -> Optional[dict]:
+        if file_contents.strip() == "":
+            return None
+        else:
+            return unpack(load_yaml(file_contents) if is_yaml else json.loads(file_contents))
+
+    try:
+        unpacked = ConfigCache.load(filename, read_contents, parse_contents)
     except FileNotFoundError as e:
         if strict:
             raise e
@@ -719,102 +1024,153 @@ def load_config_from_file(filename: str, strict: bool = False) -> dict:
             # If the config didn't exist, just return a blank dictionary.
             return {}
 
-    if file_contents.strip() == "":
+    if unpacked is None:
         return {}
     else:
-        return load_config_from_string(file_contents, is_yaml, path=os.path.dirname(filename))
-
+        unpacked[_CONFIG_PATH_KEY] = os.path.dirname(filename)
+        return unpacked
+
+
+# Execution plan for the lazy meta directives of a combined config, compiled
+# once from the lazy-meta dependency graph. HammerDatabase keeps it around so
+# that it can re-resolve only the lazy settings affected by a change instead
+# of recombining every config.
+class _LazyMetaPlan(NamedTuple('_LazyMetaPlan', [
+    # Lazy settings in the order in which they must be resolved.
+    ('order', List[str]),
+    # Template value and (non-lazy) meta type of each lazy setting.
+    ('templates', Dict[str, Tuple[Any, str]]),
+    # Map of setting -> lazy settings which directly reference that setting.
+    ('dependents', Dict[str, List[str]])
+])):
+    __slots__ = ()
 
-def combine_configs(configs: Iterable[dict]) -> dict:
-    """
-    Combine the given list of *unpacked* configs into a single config.
-    Later configs in the list will override the earlier configs.
+    @staticmethod
+    def compile(expanded_config: dict) -> "_LazyMetaPlan":
+        """
+        Compile the lazy meta directives left in a config produced by
+        reducing configs with update_and_expand_meta into an execution plan.
 
-    :param configs: List of configs.
-    :param handle_meta: Handle meta configs?
-    :return: A loaded config dictionary.
-    """
-    expanded_config_reduce = reduce(update_and_expand_meta, configs, {})  # type: dict
-    expanded_config = deepdict(expanded_config_reduce)  # type: dict
-    expanded_config_orig = deepdict(expanded_config)  # type: dict
+        :param expanded_config: Merged config with only lazy metas left.
+        :return: Execution plan for the lazy metas.
+        """
+        meta_len = len("_meta")
+        templates = {}  # type: Dict[str, Tuple[Any, str]]
+        for meta_key, lazy_meta_type in expanded_config.items():
+            if not meta_key.endswith("_meta"):
+                continue
+            assert lazy_meta_type.startswith("lazy"), "Should have only lazy metas left now"
+            # e.g. what used to be a lazysubst just becomes a plain subst since everything is fully resolved now.
+            setting = meta_key[:-meta_len]
+            templates[setting] = (expanded_config[setting], lazy_meta_type[len("lazy"):])
+
+        # Map of setting -> lazy settings that reference it (lazy or not).
+        dependents = {}  # type: Dict[str, List[str]]
+        # Lazy settings referenced by each lazy setting.
+        lazy_targets = {}  # type: Dict[str, Set[str]]
+        for setting, (template, meta_type) in templates.items():
+            targets = set(get_meta_directives()[meta_type].target_settings(setting, template))
+            for target in targets:
+                dependents.setdefault(target, []).append(setting)
+            lazy_targets[setting] = set(filter(lambda target: target in templates, targets))
+
+        # Kahn's algorithm: resolve each lazy setting once all the lazy
+        # settings that it references have been resolved.
+        remaining = {setting: len(targets) for setting, targets in lazy_targets.items()}  # type: Dict[str, int]
+        queue = deque(sorted(filter(lambda setting: remaining[setting] == 0, remaining)))  # type: Deque[str]
+        order = []  # type: List[str]
+        while len(queue) > 0:
+            setting = queue.popleft()
+            order.append(setting)
+            for dependent in dependents.get(setting, []):
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    queue.append(dependent)
+
+        if len(order) < len(templates):
+            # Follow references between unresolved settings until one repeats.
+            setting = min(filter(lambda setting: remaining[setting] > 0, remaining))
+            chain = []  # type: List[str]
+            while setting not in chain:
+                chain.append(setting)
+                setting = min(filter(lambda target: remaining[target] > 0, lazy_targets[setting]))
+            loop = chain[chain.index(setting):] + [setting]
+            raise ValueError("There appears to be a loop of lazy settings: " + " -> ".join(loop))
+
+        return _LazyMetaPlan(order=order, templates=templates, dependents=dependents)
+
+    def affected_by(self, *keys: str) -> List[str]:
+        """
+        Get the lazy settings which (transitively) depend on any of the given keys.
 
-    # Now, we need to handle lazy* metas.
-    lazy_metas = {}
+        :param keys: Settings that changed.
+        :return: Affected lazy settings in the order in which they must be re-resolved.
+        """
+        affected = set()  # type: Set[str]
+        stack = list(keys)  # type: List[str]
+        while len(stack) > 0:
+            for dependent in self.dependents.get(stack.pop(), []):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    stack.append(dependent)
+        return list(filter(lambda setting: setting in affected, self.order))
+
+    def resolve(self, config_dict: dict, setting: str) -> None:
+        """
+        (Re-)resolve the given lazy setting in place against config_dict.
 
-    meta_dict_keys = list(expanded_config.keys())
-    meta_keys = list(filter(lambda k: k.endswith("_meta"), meta_dict_keys))
+        :param config_dict: Config dictionary with all of the setting's targets already resolved.
+        :param setting: Lazy setting to resolve.
+        """
+        template, meta_type = self.templates[setting]
+        get_meta_directives()[meta_type].action(config_dict, setting, copy.deepcopy(template),
+                                                MetaDirectiveParams(meta_path="unspecified"))
 
-    # Graph to keep track of which lazy settings depend on others.
-    # key1 -> key2 means key2 depends on key1
-    graph = {}  # type: Dict[str, Tuple[List[str], List[str]]]
+    def execute(self, config_dict: dict) -> None:
+        """
+        Resolve all lazy settings in place against config_dict.
 
-    meta_len = len("_meta")
-    for meta_key in meta_keys:
-        setting = meta_key[:-meta_len]  # type: str
-        lazy_meta_type = expanded_config[meta_key]  # type: str
-
-        assert lazy_meta_type.startswith("lazy"), "Should have only lazy metas left now"
-
-        # Create lazy_metas without the lazy part.
-        # e.g. what used to be a lazysubst just becomes a plain subst since everything is fully resolved now.
-        meta_type = lazy_meta_type[len("lazy"):]
-        lazy_metas[meta_key] = meta_type
-        lazy_metas[setting] = expanded_config[setting]  # copy over the template too
-
-        # Build the graph of which lazy settings depend on what.
-
-        # Always ensure that this lazy setting's node exists even if it has no dependencies.
-        if setting not in graph:
-            graph[setting] = ([], [])
-
-        for target_var in get_meta_directives()[meta_type].target_settings(setting, expanded_config[setting]):
-            # Make sure the order in which we delete doesn't affect this
-            # search, since expanded_config might have some deleted stuff.
-            if target_var + "_meta" in expanded_config_orig:
-                # Add a dependency for target -> this setting
-                if target_var not in graph:
-                    graph[target_var] = ([], [])
-                graph[target_var][0].append(setting)
-                graph[setting][1].append(target_var)
-            else:
-                # The target setting that this depends on is not a lazy setting.
-                pass
+        :param config_dict: Config dictionary without any meta keys.
+        """
+        for setting in self.order:
+            self.resolve(config_dict, setting)
 
-        # Delete from expanded_config
-        del expanded_config[meta_key]
-        del expanded_config[setting]
 
-    if len(graph) > 0:
-        # Find all the starting nodes (no incoming edges).
-        starting_nodes = list(
-            map(lambda key_val: key_val[0], filter(lambda key_val: len(key_val[1][1]) == 0, graph.items())))
+def _resolve_lazy_metas(expanded_config_reduce: dict) -> Tuple[dict, _LazyMetaPlan]:
+    """
+    Resolve the lazy meta directives left in a config produced by reducing
+    configs with update_and_expand_meta.
 
-        # Sort starting nodes for determinism.
-        starting_nodes = sorted(starting_nodes)
+    :param expanded_config_reduce: Merged config with only lazy metas left.
+    :return: Tuple of (final config, execution plan of the lazy metas).
+    """
+    plan = _LazyMetaPlan.compile(expanded_config_reduce)
 
-        if len(starting_nodes) == 0:
-            raise ValueError("There appears to be a loop of lazy settings")
+    # Remove the lazy metas and any temporary keys.
+    internal_keys = HammerDatabase.internal_keys()
+    final_dict = {key: value for key, value in expanded_config_reduce.items()
+                  if not key.endswith("_meta") and key not in internal_keys}
 
-        # List of settings to expand first according to topological sort.
-        settings_ordered = topological_sort(graph, starting_nodes)  # type: List[str]
+    # Everything up to here shares values with the input configs; give the
+    # caller its own copy.
+    final_dict = deepdict(final_dict)
 
-        def combine_meta(config_dict: dict, meta_setting: str) -> dict:
-            # Merge in the metas in the given order.
-            return update_and_expand_meta(config_dict, {
-                meta_setting: lazy_metas[meta_setting],
-                meta_setting + "_meta": lazy_metas[meta_setting + "_meta"]
-            })
+    plan.execute(final_dict)
+    return final_dict, plan
 
-        final_dict = reduce(combine_meta, settings_ordered, expanded_config)  # type: dict
-    else:
-        final_dict = deepdict(expanded_config)
 
-    # Remove any temporary keys.
-    for key in HammerDatabase.internal_keys():
-        if key in final_dict:
-            del final_dict[key]
+def combine_configs(configs: Iterable[dict]) -> dict:
+    """
+    Combine the given list of *unpacked* configs into a single config.
+    Later configs in the list will override the earlier configs.
 
-    return final_dict
+    :param configs: List of configs.
+    :param handle_meta: Handle meta configs?
+    :return: A loaded config dictionary.
+    """
+    with HammerTrace.span("combine_configs", "config"):
+        expanded_config_reduce = reduce(update_and_expand_meta, configs, {})  # type: dict
+        return _resolve_lazy_metas(expanded_config_reduce)[0]
 
 
 def load_config_from_paths(config_paths: Iterable[str], strict: bool = False) -> List[dict]:
@@ -5,23 +5,41 @@
 
 import os
 import sys
+import json
+import math
+from typing import Any
+
 
-# Try to use the system yaml if present, else use the HAMMER-shipped yaml.
-try:
-    import yaml
-except ImportError:
+def _import_yaml() -> Any:
+    """
+    Import yaml. This is deferred until the first YAML file is parsed, since
+    most config files are usually read from the parsed config cache and
+    importing yaml is a noticeable part of the hammer-vlsi startup time.
+    """
+    # Try to use the system yaml if present, else use the HAMMER-shipped yaml.
     try:
-        sys.path.append("src/tools/pyyaml/lib3")
         import yaml
     except ImportError:
-        if "HAMMER_PYYAML_PATH" not in os.environ:
-            print("pyyaml not found. Set $HAMMER_PYYAML_PATH to pyyaml/lib3", file=sys.stderr)
-            sys.exit(1)
-        else:
-            sys.path.append(os.environ["HAMMER_PYYAML_PATH"])
+        try:
+            sys.path.append("src/tools/pyyaml/lib3")
             import yaml
+        except ImportError:
+            if "HAMMER_PYYAML_PATH" not in os.environ:
+                print("pyyaml not found. Set $HAMMER_PYYAML_PATH to pyyaml/lib3", file=sys.stderr)
+                sys.exit(1)
+            else:
+                sys.path.append(os.environ["HAMMER_PYYAML_PATH"])
+                import yaml
+    return yaml
+
+
+def _safe_loader(yaml: Any) -> Any:
+    """
+    Use libyaml's C loader when pyyaml was built with it; it is an order of
+    magnitude faster than the pure-Python one.
+    """
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
-import json
 
 def convertArrays(o):
     """
@@ -90,25 +108,62 @@ def compare(o1, o2):
     return (o1 == o2)
 
 
-def load_yaml(yamlStr: str) -> dict:
+def to_json_compatible(o: Any) -> Any:
+    """
+    Convert a python tree loaded from YAML into one which is identical to its
+    JSON round-trip in a single pass, raising an error if that's impossible.
+    Like convertArrays, dicts whose keys are all ints become arrays ordered
+    by key.
+
+    :param o: Python tree loaded from YAML.
+    :return: Equivalent tree containing only JSON types.
+    """
+    if isinstance(o, str) or isinstance(o, bool) or isinstance(o, int) or o is None:
+        return o
+    elif isinstance(o, float):
+        if math.isnan(o):
+            raise ValueError("YAML -> JSON structures don't match: NaN is not supported")
+        return o
+    elif isinstance(o, list):
+        return [to_json_compatible(x) for x in o]
+    elif isinstance(o, dict):
+        if len(o) > 0 and all(type(k) == int for k in o):
+            return [to_json_compatible(o[k]) for k in sorted(o)]
+        for k in o:
+            if not isinstance(k, str):
+                raise ValueError("YAML -> JSON structures don't match: key %s in %s is not a string" % (repr(k), str(o)))
+        return {k: to_json_compatible(v) for k, v in o.items()}
+    else:
+        raise ValueError("YAML -> JSON structures don't match: %s is not a JSON type" % (repr(o)))
+
+
+def load_yaml(yamlStr: str, fast: bool = True) -> dict:
     """
     Load a YAML database as JSON.
 
-    The input file is parsed as YAML and converted to a python dict tree, then
-    that tree is converted to the JSON output. There is a check to make sure the
-    two dict trees are structurally identical.
+    The input file is parsed as YAML and converted to a python dict tree
+    which only contains JSON types.
+
+    In fast mode (the default), the YAML is parsed with libyaml's C loader
+    when it is available and the tree is converted and checked in a single
+    pass. Otherwise, the tree is converted to JSON and back, and there is a
+    check to make sure the two dict trees are structurally identical.
 
     :param yamlStr: A string containing the yaml database.
+    :param fast: Use the fast loader.
     :return: A dictionary object representing the yaml database.
     """
-    obj = convertArrays(yaml.safe_load(yamlStr))
-    obj2 = json.loads(json.dumps(obj))
-    if not compare(obj, obj2):
-        raise ValueError("YAML -> JSON structures don't match: %s and %s do not match" % (str(obj), str(obj2)))
+    yaml = _import_yaml()
+    if fast:
+        obj2 = to_json_compatible(yaml.load(yamlStr, Loader=_safe_loader(yaml)))
     else:
-        if obj2 is None:
-            # Loading a YAML file with nothing (except comments) can return None.
-            return {}
-        else:
-            assert isinstance(obj2, dict), "Config databases should be a dictionary"
-            return obj2
+        obj = convertArrays(yaml.safe_load(yamlStr))
+        obj2 = json.loads(json.dumps(obj))
+        if not compare(obj, obj2):
+            raise ValueError("YAML -> JSON structures don't match: %s and %s do not match" % (str(obj), str(obj2)))
+    if obj2 is None:
+        # Loading a YAML file with nothing (except comments) can return None.
+        return {}
+    else:
+        assert isinstance(obj2, dict), "Config databases should be a dictionary"
+        return obj2
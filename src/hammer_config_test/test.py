@@ -5,7 +5,9 @@
 #
 #  See LICENSE for licence details.
 
+import copy
 import os
+import shutil
 import tempfile
 import unittest
 
@@ -574,6 +576,30 @@ foo:
         """
         self.assertEqual(hammer_config.load_yaml("x: {}"), {"x": {}})
 
+    def test_load_yaml_fast(self) -> None:
+        """
+        Test that the fast YAML loader matches the original one and rejects
+        things that aren't JSON.
+        """
+        contents = """
+foo:
+  bar: [1, 2.5, "three", true, null]
+  baz: {}
+  "0": zero
+libraries:
+  - name: lib1
+    supplies: {VDD: "0.85 V"}
+"""
+        self.assertEqual(hammer_config.load_yaml(contents, fast=True), hammer_config.load_yaml(contents, fast=False))
+        self.assertEqual(hammer_config.load_yaml("# nothing"), {})
+        self.assertEqual(hammer_config.load_yaml("x:\n  1: b\n  0: a\n"), {"x": ["a", "b"]})
+        with self.assertRaises(ValueError):
+            hammer_config.load_yaml("x: 2018-01-01")
+        with self.assertRaises(ValueError):
+            hammer_config.load_yaml("x:\n  1: a\n  b: c\n")
+        with self.assertRaises(ValueError):
+            hammer_config.load_yaml("x: .nan")
+
     def test_meta_lazy_referencing_other_lazy(self) -> None:
         """
         Test that lazy settings can reference other lazy settings.
@@ -750,6 +776,35 @@ derivative_str_meta: "lazysubst"
         db.update_core([base, config1, config2])
         self.assertEqual(db.get_setting("derivative_str"), "hello_1_2")
 
+    def test_self_reference_lazysubst_other_references(self) -> None:
+        """
+        Test that self-referencing lazy subst keeps its other references.
+        """
+        db = hammer_config.HammerDatabase()
+        db.update_core([{"path": "a", "dir": "/tmp"}, {"path": "${dir}/${path}/${dir}", "path_meta": "lazysubst"}])
+        self.assertEqual(db.get_setting("path"), "/tmp/a//tmp")
+        db.set_setting("dir", "/home")
+        self.assertEqual(db.get_setting("path"), "/home/a//home")
+
+    def test_subst_templates(self) -> None:
+        """
+        Test that subst templates with several or no references work.
+        """
+        db = hammer_config.HammerDatabase()
+        db.update_core([{"a": "1", "b.c": "2", "d": 3}, {
+            "x": "${a}${b.c}$${a}{a} ${", "x_meta": "subst",
+            "y": ["", "plain", "${a}"], "y_meta": "subst",
+            "z": "${d}", "z_meta": "lazysubst"
+        }])
+        with self.assertRaises(TypeError):
+            db.get_config()
+        db.update_core([{"a": "1", "b.c": "2"}, {
+            "x": "${a}${b.c}$${a}{a} ${", "x_meta": "subst",
+            "y": ["", "plain", "${a}"], "y_meta": "subst"
+        }])
+        self.assertEqual(db.get_setting("x"), "12$1{a} ${")
+        self.assertEqual(db.get_setting("y"), ["", "plain", "1"])
+
     def test_self_reference_lazycrossref(self) -> None:
         """
         Test that self-referencing lazy crossref works.
@@ -802,5 +857,352 @@ global: ["hello", "world"]
         self.assertEqual(db.get_setting("global"), ["hello", "world", "scala", "python"])
 
 
+    def test_set_setting_lazy_dependents(self) -> None:
+        """
+        Test that runtime settings are propagated to (chains of) lazy settings
+        which depend on them, and that the result matches a full recombine.
+        """
+        db = hammer_config.HammerDatabase()
+        base = hammer_config.load_config_from_string("""
+foo.name: "chip"
+foo.dir: "/tmp"
+foo.path: "${foo.dir}/${foo.name}"
+foo.path_meta: lazysubst
+foo.paths: ["foo.path", "foo.dir"]
+foo.paths_meta: lazycrossref
+""", is_yaml=True)
+        eager = hammer_config.load_config_from_string("""
+foo.unrelated: "${foo.dir}"
+foo.unrelated_meta: subst
+""", is_yaml=True)
+        db.update_core([base, eager])
+        self.assertEqual(db.get_setting("foo.path"), "/tmp/chip")
+        db.set_setting("foo.name", "core")
+        self.assertEqual(db.get_setting("foo.path"), "/tmp/core")
+        self.assertEqual(db.get_setting("foo.paths"), ["/tmp/core", "/tmp"])
+        db.set_setting("foo.dir", "/home")
+        self.assertEqual(db.get_setting("foo.paths"), ["/home/core", "/home"])
+        # Eager metas were already expanded in their own layer.
+        self.assertEqual(db.get_setting("foo.unrelated"), "/tmp")
+        self.assertEqual(db.get_config(), hammer_config.combine_configs([base, eager, db.runtime[0]]))
+
+        # Setting a lazy setting itself re-applies its template.
+        db.set_setting("foo.path", "${foo.name}!")
+        self.assertEqual(db.get_setting("foo.path"), "core!")
+        self.assertEqual(db.get_setting("foo.paths"), ["core!", "/home"])
+
+        # Updating a lower layer keeps the runtime settings on top.
+        db.update_technology([{"foo.name": "tech"}])
+        self.assertEqual(db.get_setting("foo.path"), "core!")
+        db.update_core([base, eager, {"foo.other": 1}])
+        self.assertEqual(db.get_setting("foo.other"), 1)
+        self.assertEqual(db.get_setting("foo.paths"), ["core!", "/home"])
+
+    def test_set_setting_lazy_error(self) -> None:
+        """
+        Test that errors in lazy settings caused by a runtime setting are still reported.
+        """
+        db = hammer_config.HammerDatabase()
+        db.update_core([hammer_config.load_config_from_string("""
+foo.list: ["a"]
+foo.other: ["b"]
+foo.both: ["foo.list", "foo.other"]
+foo.both_meta: lazycrossappendref
+""", is_yaml=True)])
+        self.assertEqual(db.get_setting("foo.both"), ["a", "b"])
+        db.set_setting("foo.other", 42)
+        with self.assertRaises(TypeError):
+            db.get_setting("foo.both")
+        db.set_setting("foo.other", ["c"])
+        self.assertEqual(db.get_setting("foo.both"), ["a", "c"])
+
+    def test_overlay(self) -> None:
+        """
+        Test that overlays sit between the project and runtime settings and
+        that popping them restores the previous state.
+        """
+        db = hammer_config.HammerDatabase()
+        base = hammer_config.load_config_from_string("""
+foo.name: "chip"
+foo.dir: "/tmp"
+foo.path: "${foo.dir}/${foo.name}"
+foo.path_meta: lazysubst
+foo.list: ["a"]
+""", is_yaml=True)
+        db.update_core([base])
+        db.update_project([{"foo.dir": "/proj"}])
+        db.set_setting("foo.runtime", 1)
+        before = copy.deepcopy(db.get_config())
+
+        overlay = {"foo.name": "mod", "foo.dir": "/mod", "foo.new": True}
+        with db.overlay(overlay):
+            self.assertEqual(db.get_setting("foo.path"), "/mod/mod")
+            self.assertEqual(db.get_setting("foo.new"), True)
+            self.assertEqual(db.get_config(), hammer_config.combine_configs([base, {"foo.dir": "/proj"}, overlay,
+                                                                             db.runtime[0]]))
+        self.assertEqual(db.get_config(), before)
+        with db.overlay({"foo.runtime": 2}):
+            # Runtime settings still take precedence.
+            self.assertEqual(db.get_setting("foo.runtime"), 1)
+        self.assertEqual(db.get_config(), before)
+        self.assertEqual(db.overlays, [])
+
+        # Overlays which can't be resolved in place (meta directives) and
+        # changes while an overlay is active.
+        version = db.version
+        db.push_overlay({"foo.name": "mod"})
+        db.push_overlay({"foo.list": ["b"], "foo.list_meta": "append"})
+        self.assertGreater(db.version, version)
+        self.assertEqual(db.get_setting("foo.list"), ["a", "b"])
+        self.assertEqual(db.get_setting("foo.path"), "/proj/mod")
+        db.set_setting("foo.name", "runtime")
+        self.assertEqual(db.pop_overlay(), {"foo.list": ["b"], "foo.list_meta": "append"})
+        self.assertEqual(db.get_setting("foo.list"), ["a"])
+        self.assertEqual(db.get_setting("foo.path"), "/proj/runtime")
+        db.update_tools([{"foo.tool": 1}])
+        self.assertEqual(db.get_setting("foo.path"), "/proj/runtime")
+        db.pop_overlay()
+        self.assertEqual(db.get_setting("foo.tool"), 1)
+        with self.assertRaises(ValueError):
+            db.pop_overlay()
+
+    def test_nested_overlays(self) -> None:
+        """
+        Test that nested overlays which are popped in order are undone without
+        recombining the database.
+        """
+        from hammer_config import config_src
+        db = hammer_config.HammerDatabase()
+        db.update_core([hammer_config.load_config_from_string("""
+foo.name: "chip"
+foo.dir: "/tmp"
+foo.path: "${foo.dir}/${foo.name}"
+foo.path_meta: lazysubst
+""", is_yaml=True)])
+        before = copy.deepcopy(db.get_config())
+
+        calls = [0]
+        update_and_expand_meta = config_src.update_and_expand_meta
+
+        def counting_update_and_expand_meta(config_dict: dict, meta_dict: dict) -> dict:
+            calls[0] += 1
+            return update_and_expand_meta(config_dict, meta_dict)
+
+        config_src.update_and_expand_meta = counting_update_and_expand_meta
+        try:
+            with db.overlay({"foo.name": "a"}):
+                self.assertEqual(db.get_setting("foo.path"), "/tmp/a")
+                with db.overlay({"foo.dir": "/b"}):
+                    self.assertEqual(db.get_setting("foo.path"), "/b/a")
+                version = db.version
+                self.assertEqual(db.get_setting("foo.path"), "/tmp/a")
+            self.assertGreater(db.version, version)
+            self.assertEqual(db.get_config(), before)
+        finally:
+            config_src.update_and_expand_meta = update_and_expand_meta
+        self.assertEqual(calls[0], 0)
+
+    def test_combine_configs_no_sharing(self) -> None:
+        """
+        Test that combining configs doesn't modify the input configs and that
+        the result doesn't share any values with them.
+        """
+        base = {"foo.list": ["a"], "foo.dict": {"x": [1]}}
+        meta = {"foo.list": ["b"], "foo.list_meta": "append"}
+        lazy = {"foo.list": ["c"], "foo.list_meta": "lazyappend"}
+        combined = hammer_config.combine_configs([base, meta, lazy])
+        self.assertEqual(combined["foo.list"], ["a", "b", "c"])
+        self.assertEqual(base, {"foo.list": ["a"], "foo.dict": {"x": [1]}})
+        self.assertEqual(meta, {"foo.list": ["b"], "foo.list_meta": "append"})
+        self.assertEqual(lazy, {"foo.list": ["c"], "foo.list_meta": "lazyappend"})
+
+        combined["foo.dict"]["x"].append(2)
+        self.assertEqual(base["foo.dict"], {"x": [1]})
+        self.assertEqual(hammer_config.combine_configs([base, meta, lazy])["foo.dict"], {"x": [1]})
+
+        db = hammer_config.HammerDatabase()
+        db.update_core([base])
+        db.update_project([meta])
+        db.get_setting("foo.list").append("z")
+        self.assertEqual(base["foo.list"], ["a"])
+        db.update_technology([])
+        self.assertEqual(db.get_setting("foo.list"), ["a", "b"])
+
+    def test_config_cache(self) -> None:
+        """
+        Test that parsed config files are cached on disk and that the cache
+        picks up changes to the files.
+        """
+        old_cache_dir = hammer_config.ConfigCache.cache_dir
+        old_enabled = hammer_config.ConfigCache.enabled
+        tmpdir = tempfile.mkdtemp()
+        try:
+            hammer_config.ConfigCache.cache_dir = os.path.join(tmpdir, "cache")
+            hammer_config.ConfigCache.enabled = True
+            filename = os.path.join(tmpdir, "config.yml")
+            with open(filename, "w") as f:
+                f.write("foo:\n  bar: 1\n")
+
+            hits = hammer_config.ConfigCache.hits
+            misses = hammer_config.ConfigCache.misses
+            config = hammer_config.load_config_from_file(filename)
+            self.assertEqual(config, {"foo.bar": 1, "_config_path": tmpdir})
+            self.assertEqual(hammer_config.ConfigCache.misses, misses + 1)
+            config["foo.bar"] = 2
+            self.assertEqual(hammer_config.load_config_from_file(filename), {"foo.bar": 1, "_config_path": tmpdir})
+            self.assertEqual(hammer_config.ConfigCache.hits, hits + 1)
+
+            # Changed contents get re-parsed.
+            with open(filename, "w") as f:
+                f.write("foo:\n  bar: 3\n  baz: 4\n")
+            self.assertEqual(hammer_config.load_config_from_file(filename),
+                             {"foo.bar": 3, "foo.baz": 4, "_config_path": tmpdir})
+            self.assertEqual(hammer_config.ConfigCache.misses, misses + 2)
+
+            # Empty files are still blank dictionaries.
+            with open(filename, "w") as f:
+                f.write("\n")
+            self.assertEqual(hammer_config.load_config_from_file(filename), {})
+            self.assertEqual(hammer_config.load_config_from_file(filename), {})
+
+            # Old entries get evicted.
+            hammer_config.ConfigCache.max_size = 0
+            with open(filename, "w") as f:
+                f.write("foo: 6\n")
+            self.assertEqual(hammer_config.load_config_from_file(filename), {"foo": 6, "_config_path": tmpdir})
+            self.assertEqual(os.listdir(hammer_config.ConfigCache.cache_dir), [])
+
+            hammer_config.ConfigCache.enabled = False
+            with open(filename, "w") as f:
+                f.write("foo: 5\n")
+            self.assertEqual(hammer_config.load_config_from_file(filename), {"foo": 5, "_config_path": tmpdir})
+            self.assertEqual(os.listdir(hammer_config.ConfigCache.cache_dir), [])
+        finally:
+            hammer_config.ConfigCache.cache_dir = old_cache_dir
+            hammer_config.ConfigCache.enabled = old_enabled
+            hammer_config.ConfigCache.max_size = 64 * 1024 * 1024
+            shutil.rmtree(tmpdir)
+
+    def test_lazy_loop(self) -> None:
+        """
+        Test that loops of lazy settings are reported with the settings involved.
+        """
+        db = hammer_config.HammerDatabase()
+        db.update_core([hammer_config.load_config_from_string("""
+foo.start: "${foo.a}"
+foo.start_meta: lazysubst
+foo.a: "${foo.b}"
+foo.a_meta: lazysubst
+foo.b: ["foo.c", "foo.start_base"]
+foo.b_meta: lazycrossref
+foo.c: "${foo.a}"
+foo.c_meta: lazysubst
+foo.start_base: "x"
+""", is_yaml=True)])
+        with self.assertRaises(ValueError) as cm:
+            db.get_config()
+        self.assertIn("foo.a -> foo.b -> foo.c -> foo.a", cm.exception.args[0])
+
+    def test_many_lazy_settings(self) -> None:
+        """
+        Test that long chains of lazy settings get resolved.
+        """
+        n = 20000
+        config = {"chain.0": "x"}
+        for i in range(1, n):
+            config["chain.{}".format(i)] = "${chain." + str(i - 1) + "}"
+            config["chain.{}_meta".format(i)] = "lazysubst"
+        db = hammer_config.HammerDatabase()
+        db.update_core([config])
+        self.assertEqual(db.get_setting("chain.{}".format(n - 1)), "x")
+        db.set_setting("chain.0", "y")
+        self.assertEqual(db.get_setting("chain.{}".format(n - 1)), "y")
+
+    def test_setting_access_tracer(self) -> None:
+        """
+        Test that setting accesses are only recorded during steps and that manifests can be compared.
+        """
+        db = hammer_config.HammerDatabase()
+        db.update_project([{"a": 1, "b": [2], "c": "3"}])
+        tracer = hammer_config.SettingAccessTracer()
+        tracer.record_get("a", 1)
+        tracer.current_step = "first"
+        tracer.record_get("a", 1)
+        tracer.record_has(db, "d")
+        tracer.current_step = "second"
+        tracer.record_has(db, "b")
+        old = tracer.manifest()
+        self.assertEqual(list(old["steps"].keys()), ["first", "second"])
+        self.assertEqual(old["steps"]["first"]["d"], hammer_config.MISSING_SETTING_HASH)
+        self.assertEqual(old["steps"]["second"]["b"], hammer_config.setting_hash(db, "b"))
+        self.assertEqual(hammer_config.SettingAccessTracer.stale_steps(old, db), [])
+        self.assertEqual(hammer_config.SettingAccessTracer.unread_settings([old], db), ["c"])
+
+        db.set_setting("b", [3])
+        self.assertEqual(hammer_config.SettingAccessTracer.stale_steps(old, db), ["second"])
+        tracer = hammer_config.SettingAccessTracer()
+        tracer.current_step = "second"
+        tracer.record_get("b", [3])
+        tracer.current_step = "third"
+        diff = hammer_config.SettingAccessTracer.diff(old, tracer.manifest())
+        self.assertEqual(diff.added_steps, [])
+        self.assertEqual(diff.removed_steps, ["first"])
+        self.assertEqual(diff.changed_steps, ["second"])
+        self.assertFalse(diff.is_empty())
+        self.assertTrue(hammer_config.SettingAccessTracer.diff(old, old).is_empty())
+
+    def test_compiled_database(self) -> None:
+        """
+        Test that compiled databases contain the resolved settings.
+        """
+        db = hammer_config.HammerDatabase()
+        db.update_project([{"a.b": "x", "a.c": "${a.b}y", "a.c_meta": "lazysubst", "a.d": None, "a.e": [1, {"f": 2}],
+                            "ключ": "значение"}])
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, "db")
+        db.write_compiled(path)
+        self.assertTrue(hammer_config.is_compiled_database(path))
+        with hammer_config.HammerDatabase.open_compiled(path) as compiled:
+            self.assertEqual(list(compiled.keys()), sorted(db.get_config().keys()))
+            self.assertEqual(len(compiled), len(db.get_config()))
+            self.assertEqual(compiled.get_setting("a.c"), "xy")
+            self.assertEqual(compiled.get_setting("a.d", "null"), "null")
+            self.assertEqual(compiled.get_setting("ключ"), "значение")
+            self.assertEqual(compiled.get_settings(["a.b", "a.e"]), {"a.b": "x", "a.e": [1, {"f": 2}]})
+            self.assertTrue("a.b" in compiled)
+            self.assertFalse(compiled.has_setting("a.a"))
+            self.assertFalse(compiled.has_setting("z"))
+            with self.assertRaises(KeyError):
+                compiled.get_setting("a.f")
+
+        json_path = os.path.join(tmpdir, "db.json")
+        with open(json_path, "w") as f:
+            f.write(db.get_database_json())
+        self.assertFalse(hammer_config.is_compiled_database(json_path))
+        with self.assertRaises(ValueError):
+            hammer_config.HammerDatabase.open_compiled(json_path)
+        shutil.rmtree(tmpdir)
+
+    def test_snapshot(self) -> None:
+        """
+        Test that a database restored from a marshalled snapshot has the same state as the original.
+        """
+        import marshal
+        db = hammer_config.HammerDatabase()
+        db.update_core([{"a.b": "x", "a.c": "${a.b}y", "a.c_meta": "lazysubst"}])
+        db.update_project([{"a.b": "z", "a.d": [1, 2]}])
+        db.set_setting("a.e", True)
+
+        restored = hammer_config.HammerDatabase.from_snapshot(marshal.loads(marshal.dumps(db.get_snapshot())))
+        self.assertEqual(restored.get_config(), db.get_config())
+        self.assertEqual(restored.project, db.project)
+        # The resolved layers and lazy settings are restored too.
+        restored.set_setting("a.b", "w")
+        self.assertEqual(restored.get_setting("a.c"), "wy")
+        restored.update_tools([{"a.f": 1}])
+        self.assertEqual(restored.get_setting("a.f"), 1)
+        self.assertEqual(restored.get_setting("a.c"), "wy")
+        self.assertEqual(db.get_setting("a.c"), "zy")
+
 if __name__ == '__main__':
     unittest.main()
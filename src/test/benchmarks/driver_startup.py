@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  driver_startup.py
+#  Benchmark creating a HammerDriver for a generated technology with many
+#  libraries and a large project config, loading everything from the config
+#  files and restoring it from a driver snapshot. Run it after sourcing
+#  sourceme.sh.
+#
+#  See LICENSE for licence details.
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from hammer_logging import HammerVLSILogging
+from hammer_vlsi import DriverSnapshot, HammerDriver, HammerVLSISettings
+
+
+def make_tech(tech_dir: str, num_libs: int) -> None:
+    """
+    Generate a technology with the given number of libraries.
+    :param tech_dir: Directory of the technology plugin
+    :param num_libs: Number of libraries
+    """
+    os.makedirs(tech_dir)
+    tech = {
+        "name": "bench technology",
+        "grid_unit": "0.001",
+        "installs": [{"path": "bench", "base var": ""}],
+        "libraries": [{
+            "name": "lib{i}".format(i=i),
+            "nldm liberty file": "bench/lib{i}.lib".format(i=i),
+            "lef file": "bench/lib{i}.lef".format(i=i),
+            "corner": {"nmos": "typical", "pmos": "typical", "temperature": "{t} C".format(t=i % 3 * 50)},
+            "supplies": {"VDD": "0.{v} V".format(v=7 + i % 3), "GND": "0 V"},
+            "provides": [{"lib_type": "stdcell"}]
+        } for i in range(num_libs)]
+    }
+    with open(os.path.join(tech_dir, "bench.tech.json"), "w") as f:
+        f.write(json.dumps(tech, indent=4))
+    with open(os.path.join(tech_dir, "defaults.yml"), "w") as f:
+        f.write("# bench technology has no settings\n")
+
+
+def make_project(path: str, work_dir: str, num_settings: int) -> None:
+    """
+    Generate a project config with the given number of settings, half of them lazy substitutions.
+    """
+    config = {
+        "vlsi.core.technology": "bench",
+        "vlsi.core.technology_path": [os.path.join(work_dir, "technology")],
+        "vlsi.core.technology_path_meta": "append",
+        "bench.base": "base"
+    }
+    for i in range(num_settings // 2):
+        config["bench.plain{i}".format(i=i)] = "value{i}".format(i=i)
+        config["bench.lazy{i}".format(i=i)] = "${bench.base}/${bench.plain" + str(i) + "}"
+        config["bench.lazy{i}_meta".format(i=i)] = "lazysubst"
+    with open(path, "w") as f:
+        f.write(json.dumps(config))
+
+
+def best_time(options, repeat: int) -> float:
+    """
+    Create a driver several times.
+    :return: Shortest time in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        HammerDriver(options)
+        times.append(time.perf_counter() - start)
+        # Don't keep the file logger of every driver.
+        HammerVLSILogging.callbacks = HammerVLSILogging.callbacks[:2]
+    return min(times)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--libs", type=int, default=2000,
+                        help="Number of libraries in the generated technology. (default: 2000)")
+    parser.add_argument("-s", "--settings", type=int, default=5000,
+                        help="Number of settings in the generated project config. (default: 5000)")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Number of drivers created for each case; the fastest one counts. (default: 5)")
+    args = parser.parse_args()
+
+    if not HammerVLSISettings.set_hammer_vlsi_path_from_environment():
+        raise ValueError("HAMMER_VLSI is not set; source sourceme.sh first")
+    HammerVLSILogging.enable_colour = False
+    work_dir = tempfile.mkdtemp()
+    try:
+        make_tech(os.path.join(work_dir, "technology", "bench"), args.libs)
+        config_path = os.path.join(work_dir, "project.json")
+        make_project(config_path, work_dir, args.settings)
+        options = HammerDriver.get_default_driver_options()._replace(
+            project_configs=[config_path], obj_dir=os.path.join(work_dir, "obj"),
+            log_file=os.path.join(work_dir, "hammer.log"))
+
+        DriverSnapshot.enabled = False
+        load = best_time(options, args.repeat)
+        DriverSnapshot.enabled = True
+        # Write the snapshot.
+        HammerDriver(options)
+        restore = best_time(options, args.repeat)
+
+        print("HammerDriver with {n} libraries and {s} project settings, best of {r}:".format(
+            n=args.libs, s=args.settings, r=args.repeat))
+        print("  load from configs:     {t:.3f} s".format(t=load))
+        print("  restore from snapshot: {t:.3f} s ({x:.1f}x)".format(t=restore, x=load / restore))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  dump_macrosizes.py
+#  Benchmark the dump_macrosizes action of the CLI driver on a generated
+#  technology with many LEF libraries, serially, in parallel and with a warm
+#  macro size cache. Run it after sourcing sourceme.sh.
+#
+#  See LICENSE for licence details.
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from hammer_vlsi import CLIDriver
+
+
+def make_tech(tech_dir: str, install_dir: str, num_lefs: int, num_macros: int) -> None:
+    """
+    Generate a technology with the given number of LEF libraries.
+    :param tech_dir: Directory of the technology plugin
+    :param install_dir: Directory of the LEF files
+    :param num_lefs: Number of LEF libraries
+    :param num_macros: Number of macros per LEF
+    """
+    os.makedirs(tech_dir)
+    os.makedirs(os.path.join(install_dir, "lef"))
+    tech = {
+        "name": "bench LEF technology",
+        "grid_unit": "0.001",
+        "installs": [{"path": "bench", "base var": "technology.bench.install_dir"}],
+        "libraries": []
+    }
+    macro = """MACRO {name}
+  CLASS BLOCK ;
+  SIZE {w} BY {h} ;
+  PIN A
+    DIRECTION INPUT ;
+    USE SIGNAL ;
+    PORT
+      LAYER M1 ;
+        RECT 0.1 0.1 0.2 0.2 ;
+    END
+  END A
+  OBS
+    LAYER M1 ;
+      RECT 0 0 {w} {h} ;
+  END
+END {name}
+"""
+    for i in range(num_lefs):
+        with open(os.path.join(install_dir, "lef", "lib{i}.lef".format(i=i)), "w") as f:
+            f.write("VERSION 5.8 ;\n")
+            for j in range(num_macros):
+                f.write(macro.format(name="macro_{i}_{j}".format(i=i, j=j), w=10 + j, h=20 + i))
+            f.write("END LIBRARY\n")
+        tech["libraries"].append({"name": "lib{i}".format(i=i), "lef file": "bench/lef/lib{i}.lef".format(i=i)})
+    with open(os.path.join(tech_dir, "bench.tech.json"), "w") as f:
+        f.write(json.dumps(tech, indent=4))
+    with open(os.path.join(tech_dir, "defaults.yml"), "w") as f:
+        f.write("# bench technology has no settings\n")
+
+
+def dump_macrosizes(work_dir: str, obj_dir: str, jobs: int) -> float:
+    """
+    Run the dump_macrosizes action.
+    :return: Run time in seconds
+    """
+    config_path = os.path.join(work_dir, "config.json")
+    with open(config_path, "w") as f:
+        f.write(json.dumps({
+            "vlsi.core.technology": "bench",
+            "vlsi.core.technology_path": [os.path.join(work_dir, "technology")],
+            "vlsi.core.technology_path_meta": "append",
+            "technology.bench.install_dir": os.path.join(work_dir, "install"),
+            "vlsi.technology.macro_size_jobs": jobs
+        }))
+    start = time.perf_counter()
+    try:
+        CLIDriver().main(args=["dump_macrosizes", "-p", config_path, "--obj_dir", obj_dir,
+                               "-o", os.path.join(work_dir, "macrosizes.json"),
+                               "-l", os.path.join(work_dir, "hammer.log")])
+    except SystemExit as e:
+        if e.code != 0:
+            raise
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--lefs", type=int, default=500,
+                        help="Number of LEF libraries in the generated technology. (default: 500)")
+    parser.add_argument("-m", "--macros", type=int, default=200,
+                        help="Number of macros per LEF. (default: 200)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="Number of processes for the parallel run. (default: number of CPUs)")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        make_tech(os.path.join(work_dir, "technology", "bench"), os.path.join(work_dir, "install"),
+                  args.lefs, args.macros)
+        serial = dump_macrosizes(work_dir, os.path.join(work_dir, "obj-serial"), 1)
+        with open(os.path.join(work_dir, "macrosizes.json")) as f:
+            serial_output = f.read()
+        parallel = dump_macrosizes(work_dir, os.path.join(work_dir, "obj-parallel"), args.jobs)
+        with open(os.path.join(work_dir, "macrosizes.json")) as f:
+            assert f.read() == serial_output, "Parallel output differs from serial output"
+        warm = dump_macrosizes(work_dir, os.path.join(work_dir, "obj-parallel"), args.jobs)
+
+        print("dump_macrosizes on {n} LEFs with {m} macros each:".format(n=args.lefs, m=args.macros))
+        print("  serial:              {t:.3f} s".format(t=serial))
+        print("  parallel ({j} jobs): {t:.3f} s ({s:.1f}x)".format(j=args.jobs, t=parallel, s=serial / parallel))
+        print("  warm cache:          {t:.3f} s ({s:.1f}x)".format(t=warm, s=serial / warm))
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
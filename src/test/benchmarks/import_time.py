@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  import_time.py
+#  Benchmark the cold start of hammer-vlsi: importing hammer_vlsi and running
+#  the dump action in a fresh interpreter. Exits with an error if either one
+#  is over its time budget or if importing hammer_vlsi imports one of the
+#  modules which should only be imported when needed. Run it after sourcing
+#  sourceme.sh.
+#
+#  See LICENSE for licence details.
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+# Modules which hammer_vlsi only imports when an action needs them.
+DEFERRED_MODULES = ["yaml", "multiprocessing", "concurrent.futures", "tarfile"]
+
+
+def best_time(cmd: List[str], repeat: int, cwd: str) -> float:
+    """
+    Run the given command several times.
+    :return: Shortest run time in seconds
+    """
+    times = []  # type: List[float]
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.check_call(cmd, cwd=cwd, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="Number of runs of each command; the fastest one counts. (default: 5)")
+    parser.add_argument("--import-budget", type=float, default=0.5,
+                        help="Maximum time in seconds to import hammer_vlsi, on top of the interpreter start. (default: 0.5)")
+    parser.add_argument("--dump-budget", type=float, default=1.0,
+                        help="Maximum time in seconds of hammer-vlsi dump, on top of the interpreter start. (default: 1.0)")
+    args = parser.parse_args()
+
+    hammer_vlsi_script = shutil.which("hammer-vlsi")
+    if hammer_vlsi_script is None:
+        print("hammer-vlsi is not on the path; source sourceme.sh first", file=sys.stderr)
+        return 1
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(work_dir, "project.json"), "w") as f:
+            f.write(json.dumps({"vlsi.core.technology": "nop"}))
+        dump_cmd = [sys.executable, hammer_vlsi_script, "dump", "-p", "project.json", "--obj_dir", "obj",
+                    "-o", "output.json", "-l", "hammer.log", "--config_cache"]
+        # Fill the parsed config cache, as it would be in a make-based flow (in the work dir, not in ~/.cache).
+        os.environ["HAMMER_CONFIG_CACHE_DIR"] = os.path.join(work_dir, "config_cache")
+        subprocess.check_call(dump_cmd, cwd=work_dir, stdout=subprocess.DEVNULL)
+
+        check_deferred = "import sys, hammer_vlsi; print(','.join(m for m in {mods} if m in sys.modules))".format(
+            mods=repr(DEFERRED_MODULES))
+        imported = subprocess.check_output([sys.executable, "-c", check_deferred], cwd=work_dir).decode().strip()
+
+        interpreter = best_time([sys.executable, "-c", "pass"], args.repeat, work_dir)
+        import_time = best_time([sys.executable, "-c", "import hammer_vlsi"], args.repeat, work_dir) - interpreter
+        dump_time = best_time(dump_cmd, args.repeat, work_dir) - interpreter
+    finally:
+        shutil.rmtree(work_dir)
+
+    print("hammer-vlsi cold start, best of {r} (interpreter start of {i:.3f} s excluded):".format(
+        r=args.repeat, i=interpreter))
+    print("  import hammer_vlsi: {t:.3f} s (budget {b:.3f} s)".format(t=import_time, b=args.import_budget))
+    print("  hammer-vlsi dump:   {t:.3f} s (budget {b:.3f} s)".format(t=dump_time, b=args.dump_budget))
+
+    failed = False
+    if imported != "":
+        print("Importing hammer_vlsi imported deferred modules: " + imported, file=sys.stderr)
+        failed = True
+    if import_time > args.import_budget:
+        print("Importing hammer_vlsi is over budget", file=sys.stderr)
+        failed = True
+    if dump_time > args.dump_budget:
+        print("hammer-vlsi dump is over budget", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
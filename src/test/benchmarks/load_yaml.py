@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  load_yaml.py
+#  Benchmark the fast and original YAML loading paths of hammer_config on a
+#  large generated tech YAML.
+#
+#  See LICENSE for licence details.
+
+import argparse
+import timeit
+
+import yaml
+
+import hammer_config
+
+
+def make_tech_yaml(num_libraries: int) -> str:
+    """
+    Generate a large tech YAML with the given number of libraries.
+    :param num_libraries: Number of libraries
+    :return: Contents of the tech YAML
+    """
+    tech = {
+        "name": "bench28",
+        "grid_unit": "0.001",
+        "installs": [{"path": "bench", "base var": "technology.bench28.install_dir"}],
+        "libraries": []
+    }
+    for i in range(num_libraries):
+        tech["libraries"].append({
+            "nldm liberty file": "bench/lib/lib{i}_tt_0p85v_25c.lib.gz".format(i=i),
+            "lef file": "bench/lef/lib{i}.lef".format(i=i),
+            "gds file": "bench/gds/lib{i}.gds".format(i=i),
+            "verilog sim": "bench/verilog/lib{i}.v".format(i=i),
+            "corner": {"nmos": "typical", "pmos": "typical", "temperature": "25 C"},
+            "supplies": {"VDD": "0.85 V", "GND": "0 V"},
+            "provides": [{"lib_type": "stdcell", "vt": "svt"}],
+            "dont use": ["CELL{j}_{i}".format(i=i, j=j) for j in range(4)]
+        })
+    return yaml.safe_dump(tech)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--libraries", type=int, default=2000,
+                        help="Number of libraries in the generated tech YAML. (default: 2000)")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="Number of times to load the YAML with each loader. (default: 3)")
+    args = parser.parse_args()
+
+    contents = make_tech_yaml(args.libraries)
+    assert hammer_config.load_yaml(contents, fast=True) == hammer_config.load_yaml(contents, fast=False)
+
+    print("Loading {size:.1f} kB of YAML ({n} libraries), best of {r}:".format(
+        size=len(contents) / 1024, n=args.libraries, r=args.repeat))
+    original = min(timeit.repeat(lambda: hammer_config.load_yaml(contents, fast=False), number=1, repeat=args.repeat))
+    fast = min(timeit.repeat(lambda: hammer_config.load_yaml(contents, fast=True), number=1, repeat=args.repeat))
+    print("  original: {t:.3f} s".format(t=original))
+    print("  fast:     {t:.3f} s ({libyaml})".format(
+        t=fast, libyaml="libyaml" if hasattr(yaml, "CSafeLoader") else "pure-Python loader, libyaml not available"))
+    print("  speedup:  {s:.1f}x".format(s=original / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+#  logging_throughput.py
+#  Benchmark synchronous and asynchronous dispatch of HammerVLSILogging
+#  messages to a log file.
+#
+#  See LICENSE for licence details.
+
+import argparse
+import os
+import tempfile
+import time
+
+from hammer_logging import HammerVLSIFileLogger, HammerVLSILogging
+
+
+def log_messages(num_messages: int) -> float:
+    """
+    Log the given number of messages through a nested context.
+    :param num_messages: Number of messages
+    :return: Time spent in the logging calls, in seconds
+    """
+    log = HammerVLSILogging.context("bench").context("par").context("step")
+    start = time.perf_counter()
+    for i in range(num_messages):
+        log.info("Tool output line {i}".format(i=i))
+    return time.perf_counter() - start
+
+
+def run(num_messages: int, use_async: bool, log_path: str) -> tuple:
+    """
+    Log to a fresh log file, synchronously or asynchronously.
+    :return: (time spent in the logging calls, total time until everything was written) in seconds
+    """
+    file_logger = HammerVLSIFileLogger(log_path)
+    HammerVLSILogging.clear_callbacks()
+    HammerVLSILogging.add_callback(file_logger.callback, file_logger.batch_callback)
+    if use_async:
+        HammerVLSILogging.start_async()
+    start = time.perf_counter()
+    call_time = log_messages(num_messages)
+    HammerVLSILogging.stop_async()
+    total_time = time.perf_counter() - start
+    file_logger.close()
+    return call_time, total_time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--messages", type=int, default=200000,
+                        help="Number of messages to log. (default: 200000)")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="Number of runs in each mode. (default: 3)")
+    args = parser.parse_args()
+
+    enable_buffering = HammerVLSILogging.enable_buffering
+    HammerVLSILogging.enable_buffering = False
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "bench.log")
+        results = {}
+        for use_async in (False, True):
+            results[use_async] = min(run(args.messages, use_async, log_path) for _ in range(args.repeat))
+    HammerVLSILogging.enable_buffering = enable_buffering
+
+    print("Logging {n} messages to a file, best of {r}:".format(n=args.messages, r=args.repeat))
+    for use_async, name in ((False, "sync: "), (True, "async:")):
+        call_time, total_time = results[use_async]
+        print("  {name} {rate:,.0f} messages/s in the logging calls, {total_rate:,.0f} messages/s end to end".format(
+            name=name, rate=args.messages / call_time, total_rate=args.messages / total_time))
+    print("  speedup of the logging calls: {s:.1f}x".format(s=results[False][0] / results[True][0]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,13 @@
+#!/bin/sh
+trap "rm -f _tmp_tech_schema.txt" EXIT
+
+../hammer-tech/generate_tech_schema.py -d > _tmp_tech_schema.txt
+
+if cmp --silent "../hammer-tech/tech_schema.py" "_tmp_tech_schema.txt"; then
+    # Files have the same content
+    exit 0
+else
+    echo "generate_tech_schema.py is inconsistent with the generated files"
+    diff -u "../hammer-tech/tech_schema.py" "_tmp_tech_schema.txt"
+    exit 1
+fi
@@ -0,0 +1,10 @@
+#!/bin/bash
+# Mock of "bjobs -noheader -o 'stat exit_code' <job id>" for jobs submitted with mock_bsub.sh.
+
+JOB="${@: -1}"
+if [ -f ".mock_bsub_$JOB.exit" ]; then
+    CODE=$(cat ".mock_bsub_$JOB.exit")
+    if [ "$CODE" == "0" ]; then echo "DONE -"; else echo "EXIT $CODE"; fi
+else
+    echo "RUN -"
+fi
@@ -43,4 +43,10 @@ if [ ! -z "$NUMCPU" ]; then echo "NUMCPU is: $NUMCPU"; fi
 if [ ! -z "$OUTPUT" ]; then echo "OUTPUT is: $OUTPUT"; fi
 if [ ! -z "$RESOURCE" ]; then echo "RESOURCE is: $RESOURCE"; fi
 echo "COMMAND is: ${POSITIONAL[@]}"
+if [ -z "$BLOCKING" ]; then
+    # Run the job in the background like LSF would and record its exit status for mock_bjobs.sh.
+    ( ${POSITIONAL[@]} > "$OUTPUT" 2>&1; echo $? > ".mock_bsub_$$.tmp"; mv ".mock_bsub_$$.tmp" ".mock_bsub_$$.exit" ) > /dev/null 2>&1 &
+    echo "Job <$$> is submitted to queue <$QUEUE>."
+    exit 0
+fi
 exec ${POSITIONAL[@]}
@@ -5,6 +5,11 @@
 err=0
 trap 'err=1' ERR
 
+# Keep the on-disk config cache out of the user's home directory.
+export HAMMER_CONFIG_CACHE=0
+export HAMMER_CONFIG_CACHE_DIR="$(mktemp -d)"
+trap 'rm -rf "$HAMMER_CONFIG_CACHE_DIR"' EXIT
+
 python3 ../hammer-vlsi/test.py
 python3 ../hammer-vlsi/tech_test.py
 python3 ../hammer-vlsi/constraints_test.py